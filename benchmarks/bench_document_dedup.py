@@ -0,0 +1,149 @@
+"""Compare per-document storage with content-addressed blobs for shared files.
+
+Every employee uploads the same policy PDF, one in ten also a file of their
+own. The files are stored once per document (the original layout) and then
+through BlobStore. Prints objects and bytes in the bucket and bytes sent to
+S3. It then deletes every document the way ``delete_document`` does
+(DeleteObject per document, or a reference release) and purges what the
+versioned bucket still holds (every noncurrent version, or the collection of
+unreferenced blobs), with S3 requests and time for each step.
+
+Runs against moto; set S3_ENDPOINT/DYNAMODB_ENDPOINT to use local
+stand-ins instead.
+
+Run with: python benchmarks/bench_document_dedup.py
+"""
+import io
+import os
+import sys
+import time
+from contextlib import nullcontext, redirect_stdout
+from io import StringIO
+
+import boto3
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+sys.path.insert(0, os.path.join(ROOT, 'infrastructure'))
+
+EMPLOYEES = 200
+SHARED_BYTES = 256 * 1024
+OWN_BYTES = 16 * 1024
+OWN_EVERY = 10
+BUCKET = 'hrms-bench-documents'
+
+
+def backend():
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    if os.getenv('DYNAMODB_ENDPOINT') and os.getenv('S3_ENDPOINT'):
+        os.environ.setdefault('AWS_ENDPOINT_URL_DYNAMODB', os.environ['DYNAMODB_ENDPOINT'])
+        os.environ.setdefault('AWS_ENDPOINT_URL_S3', os.environ['S3_ENDPOINT'])
+        return nullcontext()
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'bench')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'bench')
+    from moto import mock_aws
+    return mock_aws()
+
+
+class S3Counter:
+    def __init__(self, client):
+        self.sent = 0
+        self.calls = 0
+        client.meta.events.register('before-send.s3.PutObject', self._count_bytes)
+        client.meta.events.register('before-send.s3.UploadPart', self._count_bytes)
+        client.meta.events.register('before-call.s3', self._count_call)
+
+    def _count_bytes(self, request, **kwargs):
+        self.sent += int(request.headers.get('Content-Length') or 0)
+
+    def _count_call(self, **kwargs):
+        self.calls += 1
+
+
+def bucket_usage(s3):
+    objects = size = 0
+    for page in s3.get_paginator('list_object_versions').paginate(Bucket=BUCKET):
+        for version in page.get('Versions', []):
+            objects += 1
+            size += version['Size']
+    return objects, size
+
+
+def files():
+    shared = os.urandom(SHARED_BYTES)
+    uploads = []
+    for i in range(EMPLOYEES):
+        uploads.append((i, 'policy.pdf', shared))
+        if i % OWN_EVERY == 0:
+            uploads.append((i, 'id.png', os.urandom(OWN_BYTES)))
+    return uploads
+
+
+def timed(counter, fn):
+    calls = counter.calls
+    began = time.perf_counter()
+    fn()
+    return counter.calls - calls, (time.perf_counter() - began) * 1000
+
+
+def report(label, s3, counter, delete, purge):
+    objects, size = bucket_usage(s3)
+    print(f'  {label:<14} {objects:5d} objects {size / 2**20:7.1f} MiB stored {counter.sent / 2**20:7.1f} MiB sent')
+    calls, elapsed = timed(counter, delete)
+    print(f'  {"":<14} delete {calls:5d} S3 requests {elapsed:7.0f} ms')
+    calls, elapsed = timed(counter, purge)
+    left, _ = bucket_usage(s3)
+    print(f'  {"":<14} purge  {calls:5d} S3 requests {elapsed:7.0f} ms ({left} objects left)')
+
+
+def main():
+    with backend():
+        from infrastructure import HRMSInfrastructure
+        from common.blobs import BLOB_TABLE, BlobStore
+
+        infra = HRMSInfrastructure(region=os.environ['AWS_DEFAULT_REGION'])
+        infra.dynamodb = boto3.client('dynamodb')
+        with redirect_stdout(StringIO()):
+            infra.create_dynamodb_tables()
+        s3 = boto3.client('s3')
+        s3.create_bucket(Bucket=BUCKET)
+        s3.put_bucket_versioning(Bucket=BUCKET, VersioningConfiguration={'Status': 'Enabled'})
+        uploads = files()
+        print(f'{EMPLOYEES} employees share a {SHARED_BYTES // 1024} KiB file, every {OWN_EVERY}th adds '
+              f'a {OWN_BYTES // 1024} KiB file of their own')
+
+        counter = S3Counter(s3)
+        keys = [f'E{i}/doc-{i}-{name}/{name}' for i, name, _ in uploads]
+        for key, (_, _, body) in zip(keys, uploads):
+            s3.upload_fileobj(io.BytesIO(body), BUCKET, key)
+
+        def delete_per_document():
+            for key in keys:
+                s3.delete_object(Bucket=BUCKET, Key=key)
+
+        def purge_per_document():
+            # The deletes only added markers; the bytes stay until every version
+            # is gone. One listing of the whole bucket is the cheapest case.
+            versions = [
+                {'Key': v['Key'], 'VersionId': v['VersionId']}
+                for page in s3.get_paginator('list_object_versions').paginate(Bucket=BUCKET)
+                for v in page.get('Versions', []) + page.get('DeleteMarkers', [])
+            ]
+            for start in range(0, len(versions), 1000):
+                s3.delete_objects(Bucket=BUCKET, Delete={'Objects': versions[start:start + 1000], 'Quiet': True})
+
+        report('per document', s3, counter, delete_per_document, purge_per_document)
+
+        counter.sent = 0
+        store = BlobStore(boto3.resource('dynamodb').Table(BLOB_TABLE), s3, BUCKET)
+        documents = [store.acquire(io.BytesIO(body), 'default') for _, _, body in uploads]
+
+        def release_blobs():
+            for document in documents:
+                store.release(document)
+
+        report('deduplicated', s3, counter, release_blobs, store.sweep)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""Compare one Lambda invocation per operation with one batched invocation.
+
+Creates synthetic employees and leave requests through the handlers, then
+fetches and updates them once as single-operation events and once as an
+``operations`` envelope. Prints DynamoDB calls and handler wall time; a real
+deployment also saves the per-invocation overhead (request routing, cold
+containers, billing rounding) that this in-process run does not show.
+
+Runs against DynamoDB Local when DYNAMODB_ENDPOINT is set, otherwise
+against moto if it is installed.
+
+Run with: python benchmarks/bench_lambda_batch.py
+"""
+import importlib.util
+import os
+import sys
+import time
+from contextlib import nullcontext, redirect_stdout
+from io import StringIO
+
+import boto3
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'src'))
+sys.path.insert(0, os.path.join(ROOT, 'infrastructure'))
+
+EMPLOYEES = 200
+REQUESTS = 300
+
+
+def backend():
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    if os.getenv('DYNAMODB_ENDPOINT'):
+        os.environ.setdefault('AWS_ENDPOINT_URL_DYNAMODB', os.environ['DYNAMODB_ENDPOINT'])
+        return nullcontext()
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'bench')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'bench')
+    from moto import mock_aws
+    return mock_aws()
+
+
+def load_handler(name):
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, 'src', 'lambda', name, 'handler.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+class CallCounter:
+    def __init__(self, client):
+        self.calls = 0
+        client.meta.events.register('before-call.dynamodb', self._count)
+
+    def _count(self, **kwargs):
+        self.calls += 1
+
+
+def measure(label, counter, fn):
+    before = counter.calls
+    began = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - began
+    print(f'  {label:<36} {counter.calls - before:6d} calls  {elapsed * 1000:9.1f} ms')
+
+
+def main():
+    with backend():
+        from infrastructure import HRMSInfrastructure
+        infra = HRMSInfrastructure(region=os.environ['AWS_DEFAULT_REGION'])
+        infra.dynamodb = boto3.client('dynamodb')
+        with redirect_stdout(StringIO()):
+            infra.create_dynamodb_tables()
+
+        employees = load_handler('employee_handler')
+        leave = load_handler('leave_handler')
+        employees.lambda_handler({'operations': [
+            {'operation': 'create', 'employee': {'email': f'emp{i}@example.com', 'name': f'Employee {i}'}}
+            for i in range(EMPLOYEES)
+        ]}, None)
+        employee_ids = [e['employee_id'] for e in boto3.resource('dynamodb').Table('Employees').scan()['Items']]
+        leave.lambda_handler({'operations': [
+            {'operation': 'request', 'request': {'employee_id': employee_ids[i % EMPLOYEES], 'department': 'Eng',
+                                                 'start_date': '2030-01-02', 'end_date': '2030-01-03'}}
+            for i in range(REQUESTS)
+        ]}, None)
+        request_ids = [r['request_id'] for r in boto3.resource('dynamodb').Table('LeaveRequests').scan()['Items']]
+
+        counter = CallCounter(employees.dynamodb.meta.client)
+        if leave.dynamodb.meta.client is not employees.dynamodb.meta.client:
+            leave.dynamodb.meta.client.meta.events.register('before-call.dynamodb', counter._count)
+
+        gets = [{'operation': 'get', 'request_id': r} for r in request_ids]
+        updates = [{'operation': 'update_status', 'request_id': r, 'status': 'APPROVED'} for r in request_ids]
+        lookups = [{'operation': 'get', 'employee_id': e, 'fields': ['name']} for e in employee_ids]
+        print(f'{REQUESTS} leave requests, {EMPLOYEES} employees')
+        measure('leave gets, one per invocation', counter, lambda: [leave.lambda_handler(g, None) for g in gets])
+        measure('leave gets, one batch', counter, lambda: leave.lambda_handler({'operations': gets}, None))
+        measure('status updates, one per invocation', counter,
+                lambda: [leave.lambda_handler(u, None) for u in updates])
+        measure('status updates, one batch', counter, lambda: leave.lambda_handler({'operations': updates}, None))
+        measure('employee gets, one per invocation', counter,
+                lambda: [employees.lambda_handler(e, None) for e in lookups])
+        measure('employee gets, one batch', counter, lambda: employees.lambda_handler({'operations': lookups}, None))
+        # Warm container: ids already map to emails, so only BatchGetItem is left
+        measure('employee gets, one batch (warm)', counter,
+                lambda: employees.lambda_handler({'operations': lookups}, None))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""Time the vectorized leave analytics on 1M synthetic leave intervals.
+
+Run with: python benchmarks/bench_leave_analytics.py
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'web'))
+from leave_analytics import LeaveIntervals
+
+INTERVALS = 1000000
+EMPLOYEES = 50000
+DEPARTMENTS = 40
+
+
+def make_intervals():
+    rng = np.random.default_rng(7)
+    start = np.datetime64('2020-01-01') + rng.integers(0, 5 * 365, INTERVALS).astype('timedelta64[D]')
+    end = start + rng.integers(0, 10, INTERVALS).astype('timedelta64[D]')
+    employee = rng.integers(0, EMPLOYEES, INTERVALS)
+    department = employee % DEPARTMENTS
+    return LeaveIntervals(
+        start, end, employee, department,
+        np.array([f'emp-{i}' for i in range(EMPLOYEES)]),
+        np.array([f'dept-{i}' for i in range(DEPARTMENTS)])
+    )
+
+
+def timed(label, fn):
+    began = time.perf_counter()
+    result = fn()
+    print(f'  {label:<34} {(time.perf_counter() - began) * 1000:8.1f} ms')
+    return result
+
+
+def main():
+    intervals = make_intervals()
+    print(f'{INTERVALS} intervals, {EMPLOYEES} employees, {DEPARTMENTS} departments')
+    timed('absent per day, 5 years, all', lambda: intervals.absent_per_day('2020-01-01', '2024-12-31'))
+    timed('absent per day, 1 month, one dept', lambda: intervals.absent_per_day('2024-03-01', '2024-03-31', 'dept-3'))
+    timed('working-day durations', lambda: intervals.working_day_durations())
+    overlaps = timed('per-employee overlaps', intervals.overlapping)
+    print(f'  ({int(overlaps.sum())} overlapping intervals)')
+
+
+if __name__ == '__main__':
+    main()
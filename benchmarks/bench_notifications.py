@@ -0,0 +1,112 @@
+"""Measure what notifications cost the approval path and how fast they drain.
+
+First compares ``Notifier.enqueue`` (what approve/reject now pay) with a
+synchronous outbox ``put_item`` per notification. Then queues leave decisions
+for a set of employees and runs delivery passes with a counting channel,
+printing notifications per second and how many messages were sent after
+coalescing per recipient. Channel latency is simulated with CHANNEL_DELAY_MS;
+a real SMTP relay or webhook adds its own round trips per message, which is
+exactly what coalescing saves.
+
+Runs against DynamoDB Local when DYNAMODB_ENDPOINT is set, otherwise
+against moto if it is installed.
+
+Run with: python benchmarks/bench_notifications.py
+"""
+import os
+import sys
+import time
+from contextlib import nullcontext, redirect_stdout
+from io import StringIO
+
+import boto3
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.join(ROOT, 'src', 'web'))
+sys.path.insert(0, os.path.join(ROOT, 'infrastructure'))
+
+EMPLOYEES = 100
+NOTIFICATIONS = 2000
+CHANNEL_DELAY_MS = float(os.getenv('CHANNEL_DELAY_MS', '2'))
+
+
+def backend():
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    if os.getenv('DYNAMODB_ENDPOINT'):
+        os.environ.setdefault('AWS_ENDPOINT_URL_DYNAMODB', os.environ['DYNAMODB_ENDPOINT'])
+        return nullcontext()
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'bench')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'bench')
+    from moto import mock_aws
+    return mock_aws()
+
+
+def main():
+    with backend():
+        from infrastructure import HRMSInfrastructure
+        import notifications
+        from common.tenancy import DEFAULT_TENANT, stamp
+
+        class CountingChannel(notifications.Channel):
+            def __init__(self):
+                self.messages = 0
+
+            def send(self, address, batch):
+                time.sleep(CHANNEL_DELAY_MS / 1000)
+                self.messages += 1
+
+        infra = HRMSInfrastructure(region=os.environ['AWS_DEFAULT_REGION'])
+        infra.dynamodb = boto3.client('dynamodb')
+        with redirect_stdout(StringIO()):
+            infra.create_dynamodb_tables()
+        dynamodb = boto3.resource('dynamodb')
+        outbox = dynamodb.Table(notifications.OUTBOX_TABLE)
+        with dynamodb.Table('Employees').batch_writer() as batch:
+            for i in range(EMPLOYEES):
+                batch.put_item(Item=stamp('Employees', {
+                    'email': f'emp{i}@example.com', 'employee_id': f'E{i:04d}', 'name': f'Employee {i}'
+                }, DEFAULT_TENANT))
+
+        def decision(i):
+            return ('leave.approved', DEFAULT_TENANT, notifications.employee_recipient(f'E{i % EMPLOYEES:04d}'),
+                    {'request_id': f'R{i}', 'start_date': '2030-01-02', 'end_date': '2030-01-03'})
+
+        samples = 200
+        began = time.perf_counter()
+        for i in range(samples):
+            kind, tenant_id, recipient, data = decision(i)
+            outbox.put_item(Item=notifications.outbox_item(kind, tenant_id, recipient, data))
+        synchronous = (time.perf_counter() - began) / samples
+        for item in outbox.scan()['Items']:
+            outbox.delete_item(Key={'notification_id': item['notification_id']})
+
+        notifier = notifications.Notifier(outbox, start=False)
+        began = time.perf_counter()
+        for i in range(NOTIFICATIONS):
+            notifier.enqueue(*decision(i))
+        buffered = (time.perf_counter() - began) / NOTIFICATIONS
+        began = time.perf_counter()
+        notifier.flush()
+        flushed = time.perf_counter() - began
+        print(f'Producer cost per notification, {NOTIFICATIONS} queued for {EMPLOYEES} employees')
+        print(f'  {"put_item in the request":<36} {synchronous * 1e6:9.1f} us')
+        print(f'  {"Notifier.enqueue":<36} {buffered * 1e6:9.1f} us')
+        print(f'  {"background batch flush (total)":<36} {flushed * 1000:9.1f} ms')
+
+        channel = CountingChannel()
+        worker = notifications.DeliveryWorker(dynamodb, channels={'smtp': channel}, batch=NOTIFICATIONS)
+        began = time.perf_counter()
+        while worker.run_once():
+            pass
+        elapsed = time.perf_counter() - began
+        delivered = worker.stats['notifications']
+        print(f'Delivery with {CHANNEL_DELAY_MS:g} ms per message')
+        print(f'  {"notifications delivered":<36} {delivered:9d}')
+        print(f'  {"messages sent after coalescing":<36} {channel.messages:9d}')
+        print(f'  {"throughput":<36} {delivered / elapsed:9.0f} notifications/s')
+        print(f'  {"time in channels":<36} {channel.messages * CHANNEL_DELAY_MS:9.0f} ms '
+              f'(one message each: {delivered * CHANNEL_DELAY_MS:.0f} ms)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""Render the admin leave list with 5k rows, with and without fragment caching.
+
+Run with: python benchmarks/bench_render.py
+The app module is imported with placeholder AWS settings; no AWS calls are made.
+"""
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+os.environ.setdefault('AWS_REGION', 'us-east-1')
+os.environ.setdefault('FLASK_SECRET_KEY', 'benchmark')
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src', 'web'))
+
+from flask import render_template
+
+import app as hrms
+
+ROWS = 5000
+ROUNDS = 5
+
+
+def make_requests():
+    now = datetime.now()
+    return [{
+        'request_id': str(uuid.uuid4()),
+        'employee_name': f'Employee {i}',
+        'department': 'Engineering',
+        'position': 'Developer',
+        'employee_email': f'employee{i}@hrms.com',
+        'start_date': '2024-03-04',
+        'end_date': '2024-03-08',
+        'reason': 'Family trip',
+        'status': 'PENDING' if i % 3 else 'APPROVED',
+        'created_at': (now - timedelta(minutes=i)).isoformat(),
+    } for i in range(ROWS)]
+
+
+def render(requests):
+    for leave_req in requests:
+        leave_req['duration'] = hrms.leave_durations.get(leave_req['request_id'], leave_req)
+    return render_template('admin/leave_requests.html', requests=requests,
+                           pending_count=0, approved_count=0, leave_balance=0)
+
+
+def timed(label, fn):
+    began = time.perf_counter()
+    for _ in range(ROUNDS):
+        fn()
+    print(f'  {label:<36} {(time.perf_counter() - began) / ROUNDS * 1000:8.1f} ms')
+
+
+def main():
+    requests = make_requests()
+    cache = hrms.app.jinja_env.fragment_cache
+    with hrms.app.test_request_context('/admin/leave-requests'):
+        def cold():
+            cache.clear()
+            hrms.rendering.format_date.cache_clear()
+            hrms.rendering.parse_timestamp.cache_clear()
+            hrms.leave_durations._entries.clear()
+            render(requests)
+
+        print(f'{ROWS} rows, mean of {ROUNDS} renders')
+        timed('cold (no cached fragments)', cold)
+        render(requests)
+        timed('warm (fragments cached)', lambda: render(requests))
+
+
+if __name__ == '__main__':
+    main()
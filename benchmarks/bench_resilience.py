@@ -0,0 +1,148 @@
+"""Fault-injection runs of the resilience layer against a throttling stand-in.
+
+A FaultyTable answers get_item/put_item locally and injects throttling,
+outages and slow responses on demand. Each scenario prints what callers
+saw with and without the layer and asserts the behaviour it relies on.
+
+Run with: python benchmarks/bench_resilience.py
+"""
+import os
+import random
+import sys
+import threading
+import time
+
+from botocore.exceptions import ClientError
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from common import resilience
+from common.resilience import CircuitOpenError, Resilience
+
+CALLS = 1000
+
+
+def _error(code, status):
+    return ClientError({'Error': {'Code': code, 'Message': code},
+                        'ResponseMetadata': {'HTTPStatusCode': status}}, 'GetItem')
+
+
+class FaultyTable:
+    """Local stand-in for a DynamoDB table with switchable faults."""
+
+    def __init__(self):
+        self.name = 'Faulty'
+        self.throttle_rate = 0.0
+        self.outage = False
+        self.slow_rate = 0.0
+        self.slow_seconds = 0.2
+        self.calls = 0
+        self._lock = threading.Lock()
+        self._rng = random.Random(7)
+
+    def _roll(self):
+        with self._lock:
+            self.calls += 1
+            return self._rng.random()
+
+    def get_item(self, Key):
+        roll = self._roll()
+        if self.outage:
+            raise _error('InternalServerError', 500)
+        if roll < self.throttle_rate:
+            raise _error('ProvisionedThroughputExceededException', 400)
+        if roll > 1 - self.slow_rate:
+            time.sleep(self.slow_seconds)
+        else:
+            time.sleep(0.001)
+        return {'Item': dict(Key)}
+
+    def put_item(self, Item):
+        if self._roll() < self.throttle_rate:
+            raise _error('ProvisionedThroughputExceededException', 400)
+        return {}
+
+
+def guarded(table, layer):
+    return resilience._Guarded(table, layer, resilience.DYNAMODB_POLICIES, lambda kwargs: 'dynamodb:Faulty')
+
+
+def run(fn, calls=CALLS):
+    ok, failed, latencies = 0, 0, []
+    for i in range(calls):
+        began = time.perf_counter()
+        try:
+            fn(i)
+            ok += 1
+        except Exception:
+            failed += 1
+        latencies.append(time.perf_counter() - began)
+    latencies.sort()
+    return ok, failed, latencies[int(len(latencies) * 0.5)], latencies[int(len(latencies) * 0.99)]
+
+
+def report(label, result):
+    ok, failed, p50, p99 = result
+    print(f'  {label:<28} ok={ok:<5} failed={failed:<5} p50={p50 * 1000:6.1f} ms  p99={p99 * 1000:6.1f} ms')
+
+
+def throttling():
+    print('20% throttled get_item/put_item')
+    table = FaultyTable()
+    table.throttle_rate = 0.2
+    layer = Resilience(hedge_after=0)
+    raw = run(lambda i: table.get_item(Key={'id': i}))
+    safe = guarded(table, layer)
+    reads = run(lambda i: safe.get_item(Key={'id': i}))
+    writes = run(lambda i: safe.put_item(Item={'id': i}))
+    report('raw reads', raw)
+    report('resilient reads', reads)
+    report('resilient writes', writes)
+    assert reads[1] < raw[1] / 25, 'retries should absorb nearly all throttling'
+    assert layer.breaker('dynamodb:Faulty').state == 'closed'
+
+
+def outage():
+    print('hard outage, then recovery')
+    table = FaultyTable()
+    table.outage = True
+    layer = Resilience(hedge_after=0)
+    layer.breaker('dynamodb:Faulty').reset_timeout = 0.2
+    safe = guarded(table, layer)
+    short_circuited = 0
+    for i in range(200):
+        try:
+            safe.get_item(Key={'id': i})
+        except CircuitOpenError:
+            short_circuited += 1
+        except ClientError:
+            pass
+    print(f'  backend calls={table.calls} short-circuited={short_circuited} of 200')
+    assert table.calls <= resilience.BREAKER_FAILURES * resilience.READ_POLICY.max_attempts
+    table.outage = False
+    time.sleep(0.25)
+    safe.get_item(Key={'id': 'probe'})
+    assert layer.breaker('dynamodb:Faulty').state == 'closed'
+    print('  breaker closed again after one successful probe')
+
+
+def slow_tail():
+    print('5% of get_item take 200 ms')
+    table = FaultyTable()
+    table.slow_rate = 0.05
+    plain = run(lambda i: guarded(table, Resilience(hedge_after=0)).get_item(Key={'id': i}), calls=400)
+    layer = Resilience(hedge_after=0.02)
+    hedged = run(lambda i: guarded(table, layer).get_item(Key={'id': i}), calls=400)
+    report('no hedging', plain)
+    report('hedged after 20 ms', hedged)
+    assert hedged[3] < plain[3] / 2, 'hedging should cut the tail'
+
+
+def main():
+    throttling()
+    outage()
+    slow_tail()
+    print('all fault-injection scenarios passed')
+
+
+if __name__ == '__main__':
+    main()
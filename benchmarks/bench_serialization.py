@@ -0,0 +1,54 @@
+"""Compare stdlib json against common.serialization's orjson path on a 10k-item list.
+
+Both encoders get the same ``default`` hook for DynamoDB types. Without
+orjson installed the comparison is meaningless, so the benchmark says so
+and stops.
+
+Run with: python benchmarks/bench_serialization.py
+"""
+import json
+import os
+import sys
+import timeit
+import uuid
+from decimal import Decimal
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from common import serialization
+from common.serialization import dumps, _default
+
+ITEMS = 10000
+ROUNDS = 5
+
+
+def make_items():
+    return [{
+        'request_id': str(uuid.uuid4()),
+        'employee_id': str(uuid.uuid4()),
+        'employee_name': f'Employee {i}',
+        'start_date': '2024-03-01',
+        'end_date': '2024-03-05',
+        'days_requested': Decimal(5),
+        'reason': 'Family trip',
+        'status': 'APPROVED',
+        'created_at': '2024-02-20T10:15:00',
+        'tags': {'annual', 'planned'},
+    } for i in range(ITEMS)]
+
+
+def main():
+    if serialization.orjson is None:
+        sys.exit('orjson is not installed; serialization.dumps falls back to json (pip install orjson)')
+    items = make_items()
+
+    stdlib = timeit.timeit(lambda: json.dumps(items, default=_default), number=ROUNDS) / ROUNDS
+    fast = timeit.timeit(lambda: dumps(items), number=ROUNDS) / ROUNDS
+
+    print(f'{ITEMS} items, mean of {ROUNDS} rounds, orjson {serialization.orjson.__version__}')
+    print(f'  json.dumps(default=...):      {stdlib * 1000:8.1f} ms')
+    print(f'  serialization.dumps (orjson): {fast * 1000:8.1f} ms  ({len(dumps(items)) / 1024:.0f} KiB, '
+          f'{stdlib / fast:.1f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,165 @@
+"""Compare the dashboard read path on the three-table and single-table layouts.
+
+Loads synthetic employees, leave requests and documents into both layouts
+and, for a sample of employees, fetches "profile + leave + documents" three
+ways: the scans the dashboard does today, the per-table GSI queries the
+three-table layout allows at best, and one Query on the single table.
+Prints round trips, items DynamoDB had to read, and wall time.
+
+Runs against DynamoDB Local when DYNAMODB_ENDPOINT is set (e.g.
+http://localhost:8000), otherwise against moto if it is installed. Absolute
+times from either are not AWS latencies; round trips and items read are the
+numbers that carry over.
+
+Run with: python benchmarks/bench_single_table.py
+"""
+import os
+import random
+import sys
+import time
+import uuid
+from contextlib import nullcontext, redirect_stdout
+from io import StringIO
+
+import boto3
+from boto3.dynamodb.conditions import Key
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'infrastructure'))
+from common.single_table import TABLE_DEFINITION, SingleTableStore, document_item, employee_item, leave_item
+
+EMPLOYEES = 300
+LEAVES_PER_EMPLOYEE = 12
+DOCUMENTS_PER_EMPLOYEE = 6
+SAMPLE = 50
+
+
+def backend():
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    if os.getenv('DYNAMODB_ENDPOINT'):
+        return nullcontext(), {'endpoint_url': os.environ['DYNAMODB_ENDPOINT']}
+    os.environ.setdefault('AWS_ACCESS_KEY_ID', 'bench')
+    os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'bench')
+    from moto import mock_aws
+    return mock_aws(), {}
+
+
+class CallCounter:
+    def __init__(self, client):
+        self.calls = 0
+        client.meta.events.register('before-call.dynamodb', self._count)
+
+    def _count(self, **kwargs):
+        self.calls += 1
+
+
+def create_tables(client):
+    from infrastructure import HRMSInfrastructure
+    infra = HRMSInfrastructure(region=client.meta.region_name)
+    infra.dynamodb = client
+    with redirect_stdout(StringIO()):
+        infra.create_dynamodb_tables()
+    client.create_table(**TABLE_DEFINITION)
+
+
+def load(dynamodb):
+    rng = random.Random(3)
+    employees = []
+    tables = {name: dynamodb.Table(name) for name in ('Employees', 'LeaveRequests', 'Documents')}
+    single = dynamodb.Table(TABLE_DEFINITION['TableName'])
+    with tables['Employees'].batch_writer() as emp_batch, \
+            tables['LeaveRequests'].batch_writer() as leave_batch, \
+            tables['Documents'].batch_writer() as doc_batch, \
+            single.batch_writer() as single_batch:
+        for i in range(EMPLOYEES):
+            employee = {'employee_id': str(uuid.uuid4()), 'email': f'emp{i}@example.com',
+                        'name': f'Employee {i}', 'department': f'dept-{i % 12}', 'position': 'Engineer'}
+            employees.append(employee)
+            emp_batch.put_item(Item=employee)
+            single_batch.put_item(Item=employee_item(employee))
+            for j in range(LEAVES_PER_EMPLOYEE):
+                day = rng.randint(1, 27)
+                leave = {'request_id': str(uuid.uuid4()), 'employee_id': employee['employee_id'],
+                         'department': employee['department'],
+                         'start_date': f'2024-{j % 12 + 1:02d}-{day:02d}',
+                         'end_date': f'2024-{j % 12 + 1:02d}-{day + 1:02d}',
+                         'status': rng.choice(['APPROVED', 'REJECTED', 'PENDING']),
+                         'reason': 'bench', 'created_at': f'2024-{j % 12 + 1:02d}-01T09:{j:02d}:00'}
+                leave_batch.put_item(Item=leave)
+                single_batch.put_item(Item=leave_item(leave))
+            for j in range(DOCUMENTS_PER_EMPLOYEE):
+                doc = {'document_id': str(uuid.uuid4()), 'employee_id': employee['employee_id'],
+                       'filename': f'file-{j}.pdf', 's3_key': f"{employee['employee_id']}/{j}",
+                       'created_at': f'2024-{j + 1:02d}-02T10:00:00', 'is_public': j == 0}
+                doc_batch.put_item(Item=doc)
+                single_batch.put_item(Item=document_item(doc))
+    return employees
+
+
+def scanned(response):
+    return response.get('ScannedCount', response.get('Count', 0))
+
+
+def three_table_scans(dynamodb, employee):
+    """What dashboard() does today: filtered scans of whole tables."""
+    read = 0
+    # Documents, leave activity, then the leave balance scan
+    for table in ('Documents', 'LeaveRequests', 'LeaveRequests'):
+        params = {'FilterExpression': Key('employee_id').eq(employee['employee_id'])}
+        while True:
+            response = dynamodb.Table(table).scan(**params)
+            read += scanned(response)
+            if 'LastEvaluatedKey' not in response:
+                break
+            params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    return read
+
+
+def three_table_indexed(dynamodb, employee):
+    """Best case for three tables: a get plus one GSI query per child table."""
+    response = dynamodb.Table('Employees').get_item(Key={'email': employee['email']})
+    read = 1 if 'Item' in response else 0
+    for table, index in (('LeaveRequests', 'EmployeeLeaveIndex'), ('Documents', 'EmployeeDocumentIndex')):
+        response = dynamodb.Table(table).query(
+            IndexName=index, KeyConditionExpression=Key('employee_id').eq(employee['employee_id'])
+        )
+        read += scanned(response)
+    return read
+
+
+def single_table_query(store, employee):
+    overview = store.employee_overview(employee['employee_id'])
+    return 1 + len(overview['leave_requests']) + len(overview['documents'])
+
+
+def measure(label, counter, fn, employees):
+    before = counter.calls
+    read = 0
+    began = time.perf_counter()
+    for employee in employees:
+        read += fn(employee)
+    elapsed = time.perf_counter() - began
+    calls = (counter.calls - before) / len(employees)
+    print(f'  {label:<30} {calls:6.1f} calls  {read / len(employees):9.1f} items read  '
+          f'{elapsed / len(employees) * 1000:8.2f} ms per dashboard')
+
+
+def main():
+    mock, kwargs = backend()
+    with mock:
+        client = boto3.client('dynamodb', **kwargs)
+        dynamodb = boto3.resource('dynamodb', **kwargs)
+        create_tables(client)
+        employees = load(dynamodb)
+        counter = CallCounter(dynamodb.meta.client)
+        store = SingleTableStore(dynamodb.Table(TABLE_DEFINITION['TableName']))
+        sample = random.Random(5).sample(employees, SAMPLE)
+        total = EMPLOYEES * (1 + LEAVES_PER_EMPLOYEE + DOCUMENTS_PER_EMPLOYEE)
+        print(f'{EMPLOYEES} employees, {total} items, {SAMPLE} dashboards per layout')
+        measure('three tables, scans (today)', counter, lambda e: three_table_scans(dynamodb, e), sample)
+        measure('three tables, GSI queries', counter, lambda e: three_table_indexed(dynamodb, e), sample)
+        measure('single table, one query', counter, lambda e: single_table_query(store, e), sample)
+
+
+if __name__ == '__main__':
+    main()
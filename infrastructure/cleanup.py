@@ -19,7 +19,8 @@ class HRMSCleanup:
         return confirm.lower() == 'yes'
 
     def delete_dynamodb_tables(self):
-        tables = ['Employees', 'LeaveRequests', 'Documents']
+        tables = ['Employees', 'LeaveRequests', 'Documents', 'Sessions', 'RateLimits', 'LeaveReports',
+                  'AuditLog', 'NotificationOutbox', 'DocumentBlobs', 'HRMS']
         
         print("\n🗑️  Cleaning up DynamoDB tables...")
         for table_name in tables:
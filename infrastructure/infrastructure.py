@@ -8,6 +8,10 @@ from dotenv import load_dotenv
 from datetime import datetime
 import uuid
 import bcrypt
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from common.tenancy import DEFAULT_TENANT, stamp
 
 class HRMSInfrastructure:
     def __init__(self, region='ap-south-1'):
@@ -49,16 +53,21 @@ FLASK_DEBUG=1"""
             print(f"\nError generating .env file: {str(e)}")
             raise
 
-    def create_dynamodb_tables(self):
-        tables = {
+    def table_definitions(self):
+        return {
             'Employees': {
                 'TableName': 'Employees',
+                'StreamSpecification': {
+                    'StreamEnabled': True,
+                    'StreamViewType': 'NEW_AND_OLD_IMAGES'
+                },
                 'KeySchema': [
                     {'AttributeName': 'email', 'KeyType': 'HASH'}
                 ],
                 'AttributeDefinitions': [
                     {'AttributeName': 'email', 'AttributeType': 'S'},
-                    {'AttributeName': 'employee_id', 'AttributeType': 'S'}
+                    {'AttributeName': 'employee_id', 'AttributeType': 'S'},
+                    {'AttributeName': 'tenant_shard', 'AttributeType': 'S'}
                 ],
                 'GlobalSecondaryIndexes': [
                     {
@@ -69,18 +78,36 @@ FLASK_DEBUG=1"""
                         'Projection': {
                             'ProjectionType': 'ALL'
                         }
+                    },
+                    # One company's employees, spread over <tenant>#<n> write shards
+                    {
+                        'IndexName': 'TenantEmployeeIndex',
+                        'KeySchema': [
+                            {'AttributeName': 'tenant_shard', 'KeyType': 'HASH'},
+                            {'AttributeName': 'email', 'KeyType': 'RANGE'}
+                        ],
+                        'Projection': {
+                            'ProjectionType': 'ALL'
+                        }
                     }
                 ]
             },
             'LeaveRequests': {
                 'TableName': 'LeaveRequests',
+                'StreamSpecification': {
+                    'StreamEnabled': True,
+                    'StreamViewType': 'NEW_AND_OLD_IMAGES'
+                },
                 'KeySchema': [
                     {'AttributeName': 'request_id', 'KeyType': 'HASH'}
                 ],
                 'AttributeDefinitions': [
                     {'AttributeName': 'request_id', 'AttributeType': 'S'},
                     {'AttributeName': 'employee_id', 'AttributeType': 'S'},
-                    {'AttributeName': 'created_at', 'AttributeType': 'S'}
+                    {'AttributeName': 'created_at', 'AttributeType': 'S'},
+                    {'AttributeName': 'start_date', 'AttributeType': 'S'},
+                    {'AttributeName': 'tenant_shard', 'AttributeType': 'S'},
+                    {'AttributeName': 'tenant_department', 'AttributeType': 'S'}
                 ],
                 'GlobalSecondaryIndexes': [
                     {
@@ -92,18 +119,47 @@ FLASK_DEBUG=1"""
                         'Projection': {
                             'ProjectionType': 'ALL'
                         }
+                    },
+                    {
+                        'IndexName': 'TenantLeaveIndex',
+                        'KeySchema': [
+                            {'AttributeName': 'tenant_shard', 'KeyType': 'HASH'},
+                            {'AttributeName': 'created_at', 'KeyType': 'RANGE'}
+                        ],
+                        'Projection': {
+                            'ProjectionType': 'ALL'
+                        }
+                    },
+                    {
+                        # Department names repeat across companies
+                        'IndexName': 'TenantDepartmentLeaveIndex',
+                        'KeySchema': [
+                            {'AttributeName': 'tenant_department', 'KeyType': 'HASH'},
+                            {'AttributeName': 'start_date', 'KeyType': 'RANGE'}
+                        ],
+                        'Projection': {
+                            'ProjectionType': 'INCLUDE',
+                            'NonKeyAttributes': ['request_id', 'end_date', 'status', 'employee_id']
+                        }
                     }
-                ]
+                ],
+                # Replaced by TenantDepartmentLeaveIndex; dropped from existing tables
+                'RetiredIndexes': ['DepartmentLeaveIndex']
             },
             'Documents': {
                 'TableName': 'Documents',
+                'StreamSpecification': {
+                    'StreamEnabled': True,
+                    'StreamViewType': 'NEW_AND_OLD_IMAGES'
+                },
                 'KeySchema': [
                     {'AttributeName': 'document_id', 'KeyType': 'HASH'}
                 ],
                 'AttributeDefinitions': [
                     {'AttributeName': 'document_id', 'AttributeType': 'S'},
                     {'AttributeName': 'employee_id', 'AttributeType': 'S'},
-                    {'AttributeName': 'created_at', 'AttributeType': 'S'}
+                    {'AttributeName': 'created_at', 'AttributeType': 'S'},
+                    {'AttributeName': 'tenant_shard', 'AttributeType': 'S'}
                 ],
                 'GlobalSecondaryIndexes': [
                     {
@@ -115,11 +171,130 @@ FLASK_DEBUG=1"""
                         'Projection': {
                             'ProjectionType': 'ALL'
                         }
+                    },
+                    {
+                        'IndexName': 'TenantDocumentIndex',
+                        'KeySchema': [
+                            {'AttributeName': 'tenant_shard', 'KeyType': 'HASH'},
+                            {'AttributeName': 'created_at', 'KeyType': 'RANGE'}
+                        ],
+                        'Projection': {
+                            'ProjectionType': 'ALL'
+                        }
+                    }
+                ]
+            },
+            'Sessions': {
+                'TableName': 'Sessions',
+                'KeySchema': [
+                    {'AttributeName': 'session_id', 'KeyType': 'HASH'}
+                ],
+                'AttributeDefinitions': [
+                    {'AttributeName': 'session_id', 'AttributeType': 'S'}
+                ],
+                'TimeToLiveAttribute': 'expires_at'
+            },
+            'RateLimits': {
+                'TableName': 'RateLimits',
+                'KeySchema': [
+                    {'AttributeName': 'limiter_key', 'KeyType': 'HASH'}
+                ],
+                'AttributeDefinitions': [
+                    {'AttributeName': 'limiter_key', 'AttributeType': 'S'}
+                ],
+                'TimeToLiveAttribute': 'expires_at'
+            },
+            'LeaveReports': {
+                'TableName': 'LeaveReports',
+                'KeySchema': [
+                    {'AttributeName': 'period', 'KeyType': 'HASH'},
+                    {'AttributeName': 'bucket', 'KeyType': 'RANGE'}
+                ],
+                'AttributeDefinitions': [
+                    {'AttributeName': 'period', 'AttributeType': 'S'},
+                    {'AttributeName': 'bucket', 'AttributeType': 'S'}
+                ]
+            },
+            'AuditLog': {
+                'TableName': 'AuditLog',
+                'KeySchema': [
+                    {'AttributeName': 'period', 'KeyType': 'HASH'},
+                    {'AttributeName': 'sort', 'KeyType': 'RANGE'}
+                ],
+                'AttributeDefinitions': [
+                    {'AttributeName': 'period', 'AttributeType': 'S'},
+                    {'AttributeName': 'sort', 'AttributeType': 'S'},
+                    {'AttributeName': 'actor', 'AttributeType': 'S'}
+                ],
+                'GlobalSecondaryIndexes': [
+                    {
+                        'IndexName': 'ActorIndex',
+                        'KeySchema': [
+                            {'AttributeName': 'actor', 'KeyType': 'HASH'},
+                            {'AttributeName': 'sort', 'KeyType': 'RANGE'}
+                        ],
+                        'Projection': {'ProjectionType': 'ALL'}
+                    }
+                ]
+            },
+            'NotificationOutbox': {
+                'TableName': 'NotificationOutbox',
+                'KeySchema': [
+                    {'AttributeName': 'notification_id', 'KeyType': 'HASH'}
+                ],
+                'AttributeDefinitions': [
+                    {'AttributeName': 'notification_id', 'AttributeType': 'S'},
+                    {'AttributeName': 'queue_shard', 'AttributeType': 'S'},
+                    {'AttributeName': 'due_at', 'AttributeType': 'S'}
+                ],
+                'GlobalSecondaryIndexes': [
+                    {
+                        # Sparse: dead notifications drop their queue_shard and leave the index
+                        'IndexName': 'DueIndex',
+                        'KeySchema': [
+                            {'AttributeName': 'queue_shard', 'KeyType': 'HASH'},
+                            {'AttributeName': 'due_at', 'KeyType': 'RANGE'}
+                        ],
+                        'Projection': {'ProjectionType': 'ALL'}
+                    }
+                ]
+            },
+            'DocumentBlobs': {
+                'TableName': 'DocumentBlobs',
+                'KeySchema': [
+                    {'AttributeName': 'blob_id', 'KeyType': 'HASH'}
+                ],
+                'AttributeDefinitions': [
+                    {'AttributeName': 'blob_id', 'AttributeType': 'S'},
+                    {'AttributeName': 'gc_state', 'AttributeType': 'S'},
+                    {'AttributeName': 'orphaned_at', 'AttributeType': 'S'}
+                ],
+                'GlobalSecondaryIndexes': [
+                    {
+                        # Sparse: only blobs whose last reference is gone
+                        'IndexName': 'OrphanBlobIndex',
+                        'KeySchema': [
+                            {'AttributeName': 'gc_state', 'KeyType': 'HASH'},
+                            {'AttributeName': 'orphaned_at', 'KeyType': 'RANGE'}
+                        ],
+                        'Projection': {'ProjectionType': 'KEYS_ONLY'}
                     }
                 ]
             }
         }
 
+    def wait_until_active(self, table_name):
+        # DynamoDB takes one index or stream change per table at a time
+        while True:
+            table = self.dynamodb.describe_table(TableName=table_name)['Table']
+            if table['TableStatus'] == 'ACTIVE' and all(
+                gsi['IndexStatus'] == 'ACTIVE' for gsi in table.get('GlobalSecondaryIndexes', [])
+            ):
+                return
+            time.sleep(5)
+
+    def create_dynamodb_tables(self):
+        tables = self.table_definitions()
         for table_name, table_config in tables.items():
             try:
                 create_params = {
@@ -132,6 +307,9 @@ FLASK_DEBUG=1"""
                 if 'GlobalSecondaryIndexes' in table_config:
                     create_params['GlobalSecondaryIndexes'] = table_config['GlobalSecondaryIndexes']
                 
+                if 'StreamSpecification' in table_config:
+                    create_params['StreamSpecification'] = table_config['StreamSpecification']
+                
                 self.dynamodb.create_table(**create_params)
                 print(f"Creating table {table_name}...")
                 
@@ -142,6 +320,16 @@ FLASK_DEBUG=1"""
                 )
                 print(f"✅ Table {table_name} created successfully")
                 
+                if 'TimeToLiveAttribute' in table_config:
+                    self.dynamodb.update_time_to_live(
+                        TableName=table_name,
+                        TimeToLiveSpecification={
+                            'Enabled': True,
+                            'AttributeName': table_config['TimeToLiveAttribute']
+                        }
+                    )
+                    print(f"✅ Enabled TTL on {table_name}.{table_config['TimeToLiveAttribute']}")
+                
             except ClientError as e:
                 if e.response['Error']['Code'] == 'ResourceInUseException':
                     print(f"Table {table_name} already exists")
@@ -154,8 +342,20 @@ FLASK_DEBUG=1"""
                                 for gsi in existing_table['Table'].get('GlobalSecondaryIndexes', [])
                             }
                             
+                            for index_name in table_config.get('RetiredIndexes', []):
+                                if index_name in existing_gsis:
+                                    self.wait_until_active(table_name)
+                                    print(f"Dropping GSI {index_name} from {table_name}")
+                                    self.dynamodb.update_table(
+                                        TableName=table_name,
+                                        GlobalSecondaryIndexUpdates=[{
+                                            'Delete': {'IndexName': index_name}
+                                        }]
+                                    )
+                            
                             for gsi in table_config['GlobalSecondaryIndexes']:
                                 if gsi['IndexName'] not in existing_gsis:
+                                    self.wait_until_active(table_name)
                                     print(f"Adding GSI {gsi['IndexName']} to {table_name}")
                                     self.dynamodb.update_table(
                                         TableName=table_name,
@@ -166,6 +366,20 @@ FLASK_DEBUG=1"""
                                     )
                     except Exception as gsi_error:
                         print(f"Error updating GSIs for {table_name}: {str(gsi_error)}")
+                    
+                    # Enable change streams on tables created before they were used
+                    try:
+                        if 'StreamSpecification' in table_config:
+                            existing_table = self.dynamodb.describe_table(TableName=table_name)
+                            if not existing_table['Table'].get('StreamSpecification', {}).get('StreamEnabled'):
+                                self.wait_until_active(table_name)
+                                print(f"Enabling stream on {table_name}")
+                                self.dynamodb.update_table(
+                                    TableName=table_name,
+                                    StreamSpecification=table_config['StreamSpecification']
+                                )
+                    except Exception as stream_error:
+                        print(f"Error enabling stream for {table_name}: {str(stream_error)}")
                 else:
                     raise e
 
@@ -226,6 +440,25 @@ FLASK_DEBUG=1"""
                                 'NoncurrentDays': 30
                             },
                             'Filter': {}
+                        },
+                        {
+                            # Archive partitions are read rarely once their year is closed
+                            'ID': 'TierArchive',
+                            'Status': 'Enabled',
+                            'Filter': {'Prefix': 'archive/'},
+                            'Transitions': [
+                                {'Days': 30, 'StorageClass': 'STANDARD_IA'},
+                                {'Days': 180, 'StorageClass': 'GLACIER_IR'}
+                            ]
+                        },
+                        {
+                            # Files whose metadata was archived; still downloadable
+                            'ID': 'TierArchivedDocuments',
+                            'Status': 'Enabled',
+                            'Filter': {'Tag': {'Key': 'archived', 'Value': 'true'}},
+                            'Transitions': [
+                                {'Days': 30, 'StorageClass': 'GLACIER_IR'}
+                            ]
                         }
                     ]
                 }
@@ -272,6 +505,9 @@ FLASK_DEBUG=1"""
                 'created_by': 'system'
             }
             
+            stamp('Employees', admin_data, DEFAULT_TENANT)
+            stamp('Employees', super_admin_data, DEFAULT_TENANT)
+
             # Check if admin exists
             response = table.get_item(Key={'email': 'admin@hrms.com'})
             if 'Item' not in response:
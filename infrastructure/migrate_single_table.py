@@ -0,0 +1,117 @@
+import argparse
+import os
+import sys
+
+import boto3
+from botocore.exceptions import ClientError
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from common.scan import ScanCheckpoint, parallel_scan
+from common.single_table import CONVERTERS, TABLE_DEFINITION, SingleTableStore
+
+
+class SingleTableMigration:
+    """Copy Employees, LeaveRequests and Documents into the single table.
+
+    Source tables are read with a segmented parallel scan and written in
+    batches; items are overwritten by key, so the copy can be re-run
+    or resumed from its per-table checkpoint. Writes made while it runs are
+    picked up by the change feed once SingleTableStore.apply_changes is
+    subscribed, which is what keeps the two layouts in step afterwards.
+    """
+
+    def __init__(self, region, table_name=TABLE_DEFINITION['TableName']):
+        self.client = boto3.client('dynamodb', region_name=region)
+        self.dynamodb = boto3.resource('dynamodb', region_name=region)
+        self.table_name = table_name
+
+    def create_table(self):
+        try:
+            self.client.create_table(**dict(TABLE_DEFINITION, TableName=self.table_name))
+            print(f"Creating table {self.table_name}...")
+            self.client.get_waiter('table_exists').wait(TableName=self.table_name)
+            print(f"✅ Table {self.table_name} created successfully")
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ResourceInUseException':
+                raise
+            print(f"Table {self.table_name} already exists")
+
+    def copy(self, source, checkpoint_dir=None):
+        converter, required = CONVERTERS[source]
+        checkpoint = None
+        if checkpoint_dir:
+            checkpoint = ScanCheckpoint(os.path.join(checkpoint_dir, f'migrate-{source}.json'))
+        target = self.dynamodb.Table(self.table_name)
+        pending = []
+
+        # A page is checkpointed only once everything taken from it is written
+        def flush():
+            with target.batch_writer(overwrite_by_pkeys=['PK', 'SK']) as batch:
+                for converted in pending:
+                    batch.put_item(Item=converted)
+            pending.clear()
+
+        copied = skipped = 0
+        for item in parallel_scan(self.dynamodb.Table(source), checkpoint=checkpoint, before_checkpoint=flush):
+            if any(not item.get(name) for name in required):
+                skipped += 1
+                continue
+            pending.append(converter(item))
+            copied += 1
+            if len(pending) >= 25:
+                flush()
+        flush()
+        if checkpoint:
+            checkpoint.clear()
+        print(f"  ✓ {source}: {copied} items copied, {skipped} skipped (missing key attributes)")
+        return copied
+
+    def count(self, table_name):
+        params = {'TableName': table_name, 'Select': 'COUNT'}
+        total = 0
+        while True:
+            response = self.client.scan(**params)
+            total += response['Count']
+            if 'LastEvaluatedKey' not in response:
+                return total
+            params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    def verify(self):
+        """Compare item counts per entity between the layouts."""
+        store = SingleTableStore(self.dynamodb.Table(self.table_name))
+        counts = {}
+        for item in parallel_scan(store.table, ProjectionExpression='entity'):
+            counts[item.get('entity')] = counts.get(item.get('entity'), 0) + 1
+        ok = True
+        for source, entity in (('Employees', 'employee'), ('LeaveRequests', 'leave_request'),
+                               ('Documents', 'document')):
+            expected = self.count(source)
+            found = counts.get(entity, 0)
+            ok = ok and found >= expected
+            print(f"  {'✓' if found >= expected else '✗'} {entity}: {found} / {expected}")
+        return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Migrate HRMS data to the single-table layout')
+    parser.add_argument('--region', default=os.getenv('AWS_REGION', 'ap-south-1'))
+    parser.add_argument('--table', default=TABLE_DEFINITION['TableName'])
+    parser.add_argument('--checkpoint-dir', help='Directory for resumable scan checkpoints')
+    parser.add_argument('--verify-only', action='store_true')
+    args = parser.parse_args()
+
+    migration = SingleTableMigration(args.region, args.table)
+    if not args.verify_only:
+        print("\n🗄️ Preparing single table...")
+        migration.create_table()
+        print("\n📦 Copying items...")
+        for source in CONVERTERS:
+            migration.copy(source, args.checkpoint_dir)
+    print("\n🔍 Verifying...")
+    if not migration.verify():
+        sys.exit(1)
+    print("\n✨ Single-table migration completed successfully!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import argparse
+import os
+import sys
+import time
+
+import boto3
+from boto3.dynamodb.conditions import Attr
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+from common.scan import ScanCheckpoint, parallel_scan
+from common.tenancy import DEFAULT_TENANT, TENANT_INDEXES, stamp, tenant_of
+from infrastructure import HRMSInfrastructure
+
+TENANT_ATTRIBUTES = ('tenant_id', 'tenant_shard', 'tenant_department')
+
+
+class TenantMigration:
+    """Bring tables created before tenancy onto the tenant indexes.
+
+    Adds the missing tenant GSIs one at a time (DynamoDB builds one index
+    creation per table at a time), then stamps every item that has no
+    ``tenant_shard`` yet. Items without a ``tenant_id`` go to the tenant
+    given on the command line; items that already name a tenant keep it.
+    Stamping only sets attributes, so the job can be re-run or resumed from
+    its per-table checkpoint.
+    """
+
+    def __init__(self, region):
+        self.region = region
+        self.client = boto3.client('dynamodb', region_name=region)
+        self.dynamodb = boto3.resource('dynamodb', region_name=region)
+
+    def _wait_for_indexes(self, table_name):
+        while True:
+            table = self.client.describe_table(TableName=table_name)['Table']
+            if all(gsi['IndexStatus'] == 'ACTIVE' for gsi in table.get('GlobalSecondaryIndexes', [])):
+                return
+            time.sleep(10)
+
+    def create_indexes(self):
+        infra = HRMSInfrastructure(region=self.region)
+        definitions = infra.table_definitions()
+        for table_name in TENANT_INDEXES:
+            config = definitions[table_name]
+            existing = {
+                gsi['IndexName']
+                for gsi in self.client.describe_table(TableName=table_name)['Table'].get('GlobalSecondaryIndexes', [])
+            }
+            for gsi in config['GlobalSecondaryIndexes']:
+                if gsi['IndexName'] in existing or not gsi['IndexName'].startswith('Tenant'):
+                    continue
+                self._wait_for_indexes(table_name)
+                print(f"  Adding {gsi['IndexName']} to {table_name}...")
+                self.client.update_table(
+                    TableName=table_name,
+                    AttributeDefinitions=config['AttributeDefinitions'],
+                    GlobalSecondaryIndexUpdates=[{'Create': gsi}]
+                )
+            self._wait_for_indexes(table_name)
+            print(f"  ✓ {table_name} tenant indexes active")
+
+    def stamp_items(self, table_name, tenant_id, checkpoint_dir=None):
+        checkpoint = None
+        if checkpoint_dir:
+            checkpoint = ScanCheckpoint(os.path.join(checkpoint_dir, f'tenants-{table_name}.json'))
+        table = self.dynamodb.Table(table_name)
+        key_names = [k['AttributeName'] for k in table.key_schema]
+        stamped = 0
+        for item in parallel_scan(table, checkpoint=checkpoint, FilterExpression=Attr('tenant_shard').not_exists()):
+            attributes = stamp(table_name, dict(item), item.get('tenant_id') or tenant_id)
+            changes = {name: attributes[name] for name in TENANT_ATTRIBUTES if name in attributes}
+            table.update_item(
+                Key={name: item[name] for name in key_names},
+                UpdateExpression='SET ' + ', '.join(f'#a{i} = :v{i}' for i in range(len(changes))),
+                ExpressionAttributeNames={f'#a{i}': name for i, name in enumerate(changes)},
+                ExpressionAttributeValues={f':v{i}': value for i, value in enumerate(changes.values())}
+            )
+            stamped += 1
+        if checkpoint:
+            checkpoint.clear()
+        print(f"  ✓ {table_name}: {stamped} items stamped")
+        return stamped
+
+    def verify(self):
+        """Count items per tenant and any still missing from the tenant indexes."""
+        ok = True
+        for table_name in TENANT_INDEXES:
+            counts = {}
+            missing = 0
+            for item in parallel_scan(self.dynamodb.Table(table_name),
+                                      ProjectionExpression='tenant_id, tenant_shard'):
+                if not item.get('tenant_shard'):
+                    missing += 1
+                counts[tenant_of(item)] = counts.get(tenant_of(item), 0) + 1
+            ok = ok and not missing
+            summary = ', '.join(f'{tenant}: {count}' for tenant, count in sorted(counts.items())) or 'empty'
+            print(f"  {'✓' if not missing else '✗'} {table_name}: {summary}; {missing} not stamped")
+        return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Move HRMS tables onto per-tenant partitioning')
+    parser.add_argument('--region', default=os.getenv('AWS_REGION', 'ap-south-1'))
+    parser.add_argument('--tenant', default=DEFAULT_TENANT, help='Tenant for items that name none')
+    parser.add_argument('--checkpoint-dir', help='Directory for resumable scan checkpoints')
+    parser.add_argument('--verify-only', action='store_true')
+    args = parser.parse_args()
+
+    migration = TenantMigration(args.region)
+    if not args.verify_only:
+        print("\n🗂️ Creating tenant indexes...")
+        migration.create_indexes()
+        print("\n🏷️ Stamping items...")
+        for table_name in TENANT_INDEXES:
+            migration.stamp_items(table_name, args.tenant, args.checkpoint_dir)
+    print("\n🔍 Verifying...")
+    if not migration.verify():
+        sys.exit(1)
+    print("\n✨ Tenant migration completed successfully!")
+
+
+if __name__ == "__main__":
+    main()
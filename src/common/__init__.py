@@ -0,0 +1,2 @@
+# Shared data-layer helpers used by the web app and the Lambda handlers.
+# The Lambda functions get this package through a layer (python/common).
@@ -0,0 +1,275 @@
+import base64
+import hashlib
+import os
+import tempfile
+import threading
+import uuid
+from datetime import datetime
+
+from boto3.dynamodb.conditions import Attr, Key
+from botocore.exceptions import ClientError
+
+from common.conditions import condition_failed
+from common.scan import query_all
+from common.tenancy import s3_prefix, scoped
+
+BLOB_TABLE = os.getenv('DOCUMENT_BLOB_TABLE', 'DocumentBlobs')
+# Sparse index of blobs whose last reference is gone
+ORPHAN_INDEX = 'OrphanBlobIndex'
+ORPHANED = 'orphaned'
+SWEEP_SECONDS = float(os.getenv('BLOB_SWEEP_SECONDS', '300'))
+HASH_CHUNK_BYTES = 1024 * 1024
+# Uploads that cannot seek are copied aside while hashing, in memory up to this size
+SPOOL_BYTES = 8 * 1024 * 1024
+MAX_DELETE_OBJECTS = 1000
+
+
+def hash_stream(fileobj):
+    """SHA-256 and size of a file object, read once in chunks.
+
+    Returns ``(hexdigest, size, source)`` where ``source`` is positioned to
+    read the same bytes again: the file object itself when it can seek,
+    otherwise a spooled copy made while hashing.
+    """
+    sha = hashlib.sha256()
+    size = 0
+    seekable = getattr(fileobj, 'seekable', lambda: False)()
+    if seekable:
+        start = fileobj.tell()
+        source = fileobj
+    else:
+        source = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES)
+    while True:
+        chunk = fileobj.read(HASH_CHUNK_BYTES)
+        if not chunk:
+            break
+        sha.update(chunk)
+        size += len(chunk)
+        if not seekable:
+            source.write(chunk)
+    source.seek(start if seekable else 0)
+    return sha.hexdigest(), size, source
+
+
+class BlobStore:
+    """Document bytes stored once per tenant and content, shared by reference count.
+
+    A DocumentBlobs record (``blob_id`` = tenant scoped SHA-256) counts the
+    Documents items pointing at it and carries the generation that names its
+    S3 key. A blob whose count drops to zero is marked in OrphanBlobIndex
+    and collected: record first, then the object versions it recorded. An upload
+    of the same content after that starts a new record with a new generation,
+    so collection can never take a fresh upload's object with it.
+    """
+
+    def __init__(self, table, s3_client, bucket, background=False, sweep_seconds=SWEEP_SECONDS):
+        self.table = table
+        self.s3 = s3_client
+        self.bucket = bucket
+        self.sweep_seconds = sweep_seconds
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._pending = set()
+        self._closed = False
+        self._counters = {'uploaded': 0, 'deduplicated': 0, 'bytes_saved': 0, 'released': 0,
+                          'collected': 0, 'collect_errors': 0}
+        self._thread = None
+        if background:
+            self._thread = threading.Thread(target=self._run, name='blob-collector', daemon=True)
+            self._thread.start()
+
+    def _count(self, name, value=1):
+        with self._lock:
+            self._counters[name] += value
+
+    def key(self, tenant_id, digest, generation):
+        return f'{s3_prefix(tenant_id)}blobs/sha256/{digest[:2]}/{digest}/{generation}'
+
+    def acquire(self, fileobj, tenant_id, content_type=None):
+        """Take a reference on the blob holding the file's bytes.
+
+        The bytes go to S3 only when no stored copy exists yet. Returns the
+        attributes the Documents item records; the caller owns one reference
+        and must ``release`` it if that item is never written.
+        """
+        digest, size, source = hash_stream(fileobj)
+        blob_id = scoped(tenant_id, digest)
+        try:
+            record = self.table.update_item(
+                Key={'blob_id': blob_id},
+                UpdateExpression='ADD refs :one '
+                                 'SET generation = if_not_exists(generation, :generation), '
+                                 'tenant_id = :tenant_id, content_sha256 = :digest, size_bytes = :size, '
+                                 'created_at = if_not_exists(created_at, :now) '
+                                 'REMOVE gc_state, orphaned_at',
+                ExpressionAttributeValues={
+                    ':one': 1, ':generation': uuid.uuid4().hex, ':tenant_id': tenant_id,
+                    ':digest': digest, ':size': size, ':now': datetime.now().isoformat()
+                },
+                ReturnValues='ALL_NEW'
+            )['Attributes']
+            s3_key = self.key(tenant_id, digest, record['generation'])
+            try:
+                if record.get('object_stored'):
+                    self._count('deduplicated')
+                    self._count('bytes_saved', size)
+                else:
+                    # First copy, or one whose upload never finished. A single PUT
+                    # returns the version id that collection deletes later, and
+                    # S3 refuses a body that does not match the digest.
+                    response = self.s3.put_object(
+                        Bucket=self.bucket,
+                        Key=s3_key,
+                        Body=source,
+                        ChecksumSHA256=base64.b64encode(bytes.fromhex(digest)).decode('ascii'),
+                        ServerSideEncryption='AES256',
+                        ContentType=content_type or 'application/octet-stream'
+                    )
+                    update = 'SET object_stored = :stored'
+                    values = {':stored': True}
+                    if response.get('VersionId'):
+                        update += ' ADD version_ids :version'
+                        values[':version'] = {response['VersionId']}
+                    self.table.update_item(
+                        Key={'blob_id': blob_id},
+                        UpdateExpression=update,
+                        ExpressionAttributeValues=values
+                    )
+                    self._count('uploaded')
+            except Exception:
+                self.release({'blob_id': blob_id})
+                raise
+        finally:
+            if source is not fileobj:
+                source.close()
+        return {'s3_key': s3_key, 'blob_id': blob_id, 'content_sha256': digest, 'size_bytes': size}
+
+    def release(self, document):
+        """Drop the reference a deleted Documents item held; True if that was the last one.
+
+        Items stored before deduplication own their object outright and
+        return False, so the caller deletes it as before.
+        """
+        blob_id = (document or {}).get('blob_id')
+        if not blob_id:
+            return False
+        try:
+            record = self.table.update_item(
+                Key={'blob_id': blob_id},
+                UpdateExpression='ADD refs :minus',
+                ConditionExpression=Attr('blob_id').exists(),
+                ExpressionAttributeValues={':minus': -1},
+                ReturnValues='ALL_NEW'
+            )['Attributes']
+        except ClientError as e:
+            if not condition_failed(e):
+                raise
+            return False
+        self._count('released')
+        if record['refs'] > 0:
+            return False
+        # Marked in the orphan index first, so a sweep finds it if this process dies
+        try:
+            self.table.update_item(
+                Key={'blob_id': blob_id},
+                UpdateExpression='SET gc_state = :orphaned, orphaned_at = :now',
+                ConditionExpression=Attr('refs').lte(0),
+                ExpressionAttributeValues={':orphaned': ORPHANED, ':now': datetime.now().isoformat()}
+            )
+        except ClientError as e:
+            if not condition_failed(e):
+                raise
+            return False
+        if self._thread:
+            with self._lock:
+                self._pending.add(blob_id)
+                self._wake.notify()
+        return True
+
+    def collect(self, blob_ids):
+        """Delete unreferenced blobs and every stored version of their objects.
+
+        Blobs referenced again since they were orphaned are skipped. The
+        versions were recorded at upload, so the objects go in batched
+        DeleteObjects calls without listing the bucket. Returns how many
+        blobs were collected.
+        """
+        objects = []
+        for blob_id in blob_ids:
+            try:
+                record = self.table.delete_item(
+                    Key={'blob_id': blob_id},
+                    ConditionExpression=Attr('refs').lte(0),
+                    ReturnValues='ALL_OLD'
+                ).get('Attributes')
+            except ClientError as e:
+                if not condition_failed(e):
+                    print(f'Error collecting blob {blob_id}: {e}')
+                    self._count('collect_errors')
+                continue
+            if not record:
+                continue
+            key = self.key(record['tenant_id'], record['content_sha256'], record['generation'])
+            # Unversioned buckets report no version ids; the key alone removes the object
+            objects.extend([{'Key': key, 'VersionId': v} for v in record.get('version_ids', ())] or [{'Key': key}])
+            self._count('collected')
+        for start in range(0, len(objects), MAX_DELETE_OBJECTS):
+            try:
+                response = self.s3.delete_objects(Bucket=self.bucket, Delete={
+                    'Objects': objects[start:start + MAX_DELETE_OBJECTS], 'Quiet': True
+                })
+            except Exception as e:
+                print(f'Error deleting blob objects: {e}')
+                self._count('collect_errors')
+                continue
+            for error in response.get('Errors', []):
+                print(f"Error deleting blob object {error.get('Key')}: {error.get('Message')}")
+                self._count('collect_errors')
+        return len({o['Key'] for o in objects})
+
+    def sweep(self):
+        """Collect every blob left in the orphan index, e.g. by Lambda deletes or a crash."""
+        orphans = query_all(
+            self.table,
+            IndexName=ORPHAN_INDEX,
+            KeyConditionExpression=Key('gc_state').eq(ORPHANED),
+            ProjectionExpression='blob_id'
+        )
+        return self.collect(orphan['blob_id'] for orphan in orphans)
+
+    def _run(self):
+        last_sweep = 0.0
+        while True:
+            with self._lock:
+                if not self._pending and not self._closed:
+                    self._wake.wait(self.sweep_seconds)
+                pending, self._pending = self._pending, set()
+                closed = self._closed
+            if pending:
+                self.collect(pending)
+            now = datetime.now().timestamp()
+            if not pending and now - last_sweep >= self.sweep_seconds:
+                last_sweep = now
+                try:
+                    self.sweep()
+                except Exception as e:
+                    print(f'Error sweeping orphaned blobs: {e}')
+                    self._count('collect_errors')
+            if closed:
+                return
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._wake.notify()
+        if self._thread:
+            self._thread.join(timeout=30)
+
+    def render(self):
+        with self._lock:
+            counters = dict(self._counters, pending=len(self._pending))
+        lines = ['# HELP hrms_document_blobs Deduplicated document storage counters',
+                 '# TYPE hrms_document_blobs gauge']
+        for name, value in sorted(counters.items()):
+            lines.append(f'hrms_document_blobs{{state="{name}"}} {value}')
+        return '\n'.join(lines) + '\n'
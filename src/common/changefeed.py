@@ -0,0 +1,277 @@
+import json
+import os
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
+
+# Stream ARNs and shard lists are described again after this long, or when a shard closes
+REFRESH_SECONDS = float(os.getenv('CHANGEFEED_REFRESH_SECONDS', '60'))
+_deserializer = TypeDeserializer()
+
+
+def _deserialize(image):
+    return {k: _deserializer.deserialize(v) for k, v in (image or {}).items()}
+
+
+class ChangeEvent:
+    """One item-level change from a DynamoDB stream."""
+
+    __slots__ = ('table', 'event_name', 'keys', 'old_image', 'new_image', 'sequence_number')
+
+    def __init__(self, table, event_name, keys, old_image, new_image, sequence_number):
+        self.table = table
+        self.event_name = event_name
+        self.keys = keys
+        self.old_image = old_image
+        self.new_image = new_image
+        self.sequence_number = sequence_number
+
+    @classmethod
+    def from_record(cls, table, record):
+        change = record['dynamodb']
+        return cls(
+            table,
+            record['eventName'],
+            _deserialize(change.get('Keys')),
+            _deserialize(change.get('OldImage')) or None,
+            _deserialize(change.get('NewImage')) or None,
+            change.get('SequenceNumber')
+        )
+
+    @property
+    def key(self):
+        return tuple(sorted((k, str(v)) for k, v in self.keys.items()))
+
+    @property
+    def image(self):
+        """The latest known state: the new image, or the old one for REMOVE."""
+        return self.new_image or self.old_image
+
+
+class ChangeConsumer:
+    """Dispatches batches of change events to subscribed handlers.
+
+    Events are split into lanes by a hash of their item key. Each lane runs
+    its handlers on its events in stream order, so changes to one item are
+    never reordered while different items are handled in parallel. A handler
+    receives a list of events and should be idempotent, since a batch is
+    redelivered when its checkpoint was not written.
+    """
+
+    def __init__(self, lanes=4):
+        self.lanes = lanes
+        self._handlers = {}
+        self._pool = ThreadPoolExecutor(max_workers=lanes)
+
+    def subscribe(self, table, handler):
+        self._handlers.setdefault(table, []).append(handler)
+
+    def tables(self):
+        return list(self._handlers)
+
+    def _run_lane(self, events):
+        by_table = {}
+        for event in events:
+            by_table.setdefault(event.table, []).append(event)
+        for table, table_events in by_table.items():
+            for handler in self._handlers.get(table, []):
+                handler(table_events)
+
+    def dispatch(self, events):
+        lanes = [[] for _ in range(self.lanes)]
+        for event in events:
+            if event.table in self._handlers:
+                lane = zlib.crc32(repr(event.key).encode('utf-8')) % self.lanes
+                lanes[lane].append(event)
+        futures = [self._pool.submit(self._run_lane, lane) for lane in lanes if lane]
+        for future in futures:
+            future.result()
+
+    def handle_lambda_event(self, event):
+        """Entry point for a DynamoDB Streams Lambda trigger."""
+        events = []
+        for record in event.get('Records', []):
+            table = record['eventSourceARN'].split(':table/')[1].split('/')[0]
+            events.append(ChangeEvent.from_record(table, record))
+        self.dispatch(events)
+        return {'processed': len(events)}
+
+
+class MemoryCheckpointStore:
+    def __init__(self):
+        self._positions = {}
+
+    def get(self, shard_id):
+        return self._positions.get(shard_id)
+
+    def save(self, shard_id, sequence_number):
+        self._positions[shard_id] = sequence_number
+
+
+class FileCheckpointStore:
+    """Shard positions in a JSON file, rewritten atomically after each batch."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._positions = {}
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                self._positions = json.load(f)
+
+    def get(self, shard_id):
+        return self._positions.get(shard_id)
+
+    def save(self, shard_id, sequence_number):
+        with self._lock:
+            self._positions[shard_id] = sequence_number
+            tmp_path = f'{self.path}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self._positions, f)
+            os.replace(tmp_path, self.path)
+
+
+class StreamPoller:
+    """Polls the streams of the consumer's tables and feeds it in batches.
+
+    Parent shards are read before their children so per-key order holds
+    across shard splits. ``start_position`` applies to shards without a
+    checkpoint: TRIM_HORIZON replays the last 24 hours, LATEST only sees new
+    changes (what in-process caches want). Stream ARNs and shard lists are
+    cached for ``refresh_seconds``, since every web process runs a poller and
+    DescribeStream is limited per account. A change whose handler fails on
+    its own is logged and skipped, so it cannot hold up the feed.
+    """
+
+    def __init__(self, consumer, checkpoints=None, region=None, batch_size=1000,
+                 idle_sleep=1.0, start_position='TRIM_HORIZON', refresh_seconds=REFRESH_SECONDS):
+        self.consumer = consumer
+        self.checkpoints = checkpoints or MemoryCheckpointStore()
+        self.batch_size = batch_size
+        self.idle_sleep = idle_sleep
+        self.start_position = start_position
+        self.refresh_seconds = refresh_seconds
+        self.dynamodb = boto3.client('dynamodb', region_name=region)
+        self.streams = boto3.client('dynamodbstreams', region_name=region)
+        self.skipped = 0
+        self._iterators = {}
+        self._finished = set()
+        self._stream_arns = {}
+        self._shard_lists = {}
+        self._refreshed_at = None
+        self._stop = threading.Event()
+
+    def _describe_shards(self, stream_arn):
+        shards = []
+        params = {'StreamArn': stream_arn}
+        while True:
+            description = self.streams.describe_stream(**params)['StreamDescription']
+            shards.extend(description.get('Shards', []))
+            last = description.get('LastEvaluatedShardId')
+            if not last:
+                break
+            params['ExclusiveStartShardId'] = last
+        return shards
+
+    def _refresh(self):
+        stream_arns = {}
+        for table in self.consumer.tables():
+            stream_arn = self.dynamodb.describe_table(TableName=table)['Table'].get('LatestStreamArn')
+            if stream_arn:
+                stream_arns[table] = stream_arn
+        self._shard_lists = {arn: self._describe_shards(arn) for arn in stream_arns.values()}
+        self._stream_arns = stream_arns
+        self._refreshed_at = time.monotonic()
+
+    def _shards(self, stream_arn):
+        shards = self._shard_lists.get(stream_arn, [])
+        ids = {s['ShardId'] for s in shards}
+        # A shard is readable once its parent is finished or expired
+        return [
+            s for s in shards
+            if s['ShardId'] not in self._finished
+            and (s.get('ParentShardId') not in ids or s.get('ParentShardId') in self._finished)
+        ]
+
+    def _dispatch(self, table, records):
+        events = [ChangeEvent.from_record(table, r) for r in records]
+        try:
+            self.consumer.dispatch(events)
+        except Exception as e:
+            # Handlers are idempotent: find the change that fails and skip only that one
+            print(f"Error handling {len(events)} changes to {table}, retrying one at a time: {e}")
+            for event in events:
+                try:
+                    self.consumer.dispatch([event])
+                except Exception as e:
+                    print(f"Skipping change {event.sequence_number} to {table} {event.keys}: {e}")
+                    self.skipped += 1
+
+    def _iterator(self, stream_arn, shard_id):
+        if shard_id in self._iterators:
+            return self._iterators[shard_id]
+        position = self.checkpoints.get(shard_id)
+        params = {'StreamArn': stream_arn, 'ShardId': shard_id}
+        if position:
+            params.update(ShardIteratorType='AFTER_SEQUENCE_NUMBER', SequenceNumber=position)
+        else:
+            params['ShardIteratorType'] = self.start_position
+        iterator = self.streams.get_shard_iterator(**params)['ShardIterator']
+        self._iterators[shard_id] = iterator
+        return iterator
+
+    def poll_once(self):
+        """Read one batch from every readable shard; returns the events handled."""
+        handled = 0
+        if self._refreshed_at is None or time.monotonic() - self._refreshed_at >= self.refresh_seconds:
+            self._refresh()
+        for table, stream_arn in self._stream_arns.items():
+            for shard in self._shards(stream_arn):
+                shard_id = shard['ShardId']
+                try:
+                    response = self.streams.get_records(
+                        ShardIterator=self._iterator(stream_arn, shard_id),
+                        Limit=self.batch_size
+                    )
+                except ClientError as e:
+                    if e.response['Error']['Code'] == 'ExpiredIteratorException':
+                        self._iterators.pop(shard_id, None)
+                        continue
+                    raise
+                records = response.get('Records', [])
+                if records:
+                    self._dispatch(table, records)
+                    self.checkpoints.save(shard_id, records[-1]['dynamodb']['SequenceNumber'])
+                    handled += len(records)
+
+                next_iterator = response.get('NextShardIterator')
+                if next_iterator:
+                    self._iterators[shard_id] = next_iterator
+                else:
+                    # Closed shard fully read; its children become readable
+                    self._iterators.pop(shard_id, None)
+                    self._finished.add(shard_id)
+                    self._refreshed_at = None
+        return handled
+
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                if not self.poll_once():
+                    self._stop.wait(self.idle_sleep)
+            except Exception as e:
+                print(f"Error polling change streams: {e}")
+                self._stop.wait(self.idle_sleep * 5)
+
+    def start(self):
+        thread = threading.Thread(target=self.run, name='changefeed-poller', daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self._stop.set()
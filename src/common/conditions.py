@@ -0,0 +1,37 @@
+import uuid
+
+from boto3.dynamodb.types import TypeDeserializer
+
+_deserializer = TypeDeserializer()
+
+# Fixed namespace so the same idempotency key always names the same item
+IDEMPOTENCY_NAMESPACE = uuid.UUID('6f1d3a52-8a4e-4c1e-9a57-2f0b3c9d7e41')
+
+
+def condition_failed(error):
+    return getattr(error, 'response', {}).get('Error', {}).get('Code') == 'ConditionalCheckFailedException'
+
+
+def failed_item(error):
+    """The item a conditional write was refused for, or None if there was none.
+
+    Needs ``ReturnValuesOnConditionCheckFailure='ALL_OLD'`` on the write, so
+    telling "missing" from "not allowed" from "already done" costs no read.
+    """
+    item = getattr(error, 'response', {}).get('Item')
+    if not item:
+        return None
+    return {k: _deserializer.deserialize(v) for k, v in item.items()}
+
+
+def idempotent_id(key, *scope):
+    """Id for an item created on behalf of a client request.
+
+    With an idempotency key the id is derived from it and its scope (who
+    asked, for what), so a retried submission writes the same item and a
+    ``attribute_not_exists`` condition recognises the replay. Without one
+    every call gets a fresh id.
+    """
+    if not key:
+        return str(uuid.uuid4())
+    return str(uuid.uuid5(IDEMPOTENCY_NAMESPACE, '\x1f'.join([*map(str, scope), str(key)])))
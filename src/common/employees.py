@@ -0,0 +1,128 @@
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from boto3.dynamodb.conditions import Key
+
+from common.projection import projection_kwargs
+from common.tenancy import tenant_of
+
+# ALL when EmployeeIdIndex projects every attribute (the default schema),
+# KEYS_ONLY when it only carries employee_id and the email table key
+INDEX_PROJECTION = os.getenv('EMPLOYEE_ID_INDEX_PROJECTION', 'ALL')
+MAX_BATCH_GET = 100
+LOOKUP_WORKERS = 8
+
+
+class EmployeeResolver:
+    """Resolve employee_id to Employees items without scanning the table.
+
+    Employees is keyed by email, so an id is first mapped to its email
+    through EmployeeIdIndex. That mapping never changes and is kept in a
+    bounded process-wide cache; the employee details themselves are read
+    fresh with one BatchGetItem per 100 ids. Ids seen for the first time
+    are looked up with concurrent index queries, and with an ALL-projection
+    index that query already returns the details. Passing the same ``memo``
+    dict for the length of a request makes repeated lookups free.
+
+    Older leave requests stored the email in ``employee_id``; such values
+    are used as the table key directly. With ``tenant_id`` given, employees
+    of other tenants resolve to {} like unknown ids.
+    """
+
+    def __init__(self, dynamodb, table_name='Employees', index_projection=INDEX_PROJECTION,
+                 max_cached_ids=100000):
+        self.dynamodb = dynamodb
+        self.table_name = table_name
+        self.index_projection = index_projection
+        self.max_cached_ids = max_cached_ids
+        self._emails = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _remember(self, employee_id, email):
+        with self._lock:
+            self._emails[employee_id] = email
+            self._emails.move_to_end(employee_id)
+            while len(self._emails) > self.max_cached_ids:
+                self._emails.popitem(last=False)
+
+    def forget(self, employee_id):
+        with self._lock:
+            self._emails.pop(employee_id, None)
+
+    def _query_index(self, employee_id):
+        kwargs = {
+            'IndexName': 'EmployeeIdIndex',
+            'KeyConditionExpression': Key('employee_id').eq(employee_id),
+            'Limit': 1
+        }
+        items = self.dynamodb.Table(self.table_name).query(**kwargs).get('Items', [])
+        return employee_id, items[0] if items else None
+
+    def _batch_get(self, emails, fields):
+        found = {}
+        emails = list(emails)
+        for start in range(0, len(emails), MAX_BATCH_GET):
+            request = {self.table_name: {'Keys': [{'email': e} for e in emails[start:start + MAX_BATCH_GET]]}}
+            if fields:
+                request[self.table_name].update(
+                    projection_kwargs(fields, required=('email', 'employee_id', 'tenant_id'))
+                )
+            while request:
+                response = self.dynamodb.batch_get_item(RequestItems=request)
+                for item in response.get('Responses', {}).get(self.table_name, []):
+                    found[item['email']] = item
+                request = response.get('UnprocessedKeys') or None
+        return found
+
+    def _project(self, item, fields):
+        if not fields:
+            return item
+        keep = set(fields) | {'email', 'employee_id', 'tenant_id'}
+        return {k: v for k, v in item.items() if k in keep}
+
+    def resolve_many(self, employee_ids, fields=None, memo=None, tenant_id=None):
+        """Map each id to its employee item, or to {} when there is none."""
+        memo = {} if memo is None else memo
+        wanted = {eid for eid in employee_ids if eid and eid not in memo}
+        if wanted:
+            emails = {}
+            unknown = []
+            with self._lock:
+                for eid in wanted:
+                    if '@' in eid:
+                        emails[eid] = eid
+                    elif eid in self._emails:
+                        emails[eid] = self._emails[eid]
+                    else:
+                        unknown.append(eid)
+
+            if unknown:
+                with ThreadPoolExecutor(max_workers=min(LOOKUP_WORKERS, len(unknown))) as pool:
+                    for eid, item in pool.map(self._query_index, unknown):
+                        if item is None:
+                            memo[eid] = {}
+                            continue
+                        self._remember(eid, item['email'])
+                        if self.index_projection == 'ALL':
+                            memo[eid] = self._project(item, fields)
+                        else:
+                            emails[eid] = item['email']
+
+            if emails:
+                found = self._batch_get(set(emails.values()), fields)
+                for eid, email in emails.items():
+                    item = found.get(email)
+                    if item is None or ('@' not in eid and item.get('employee_id') != eid):
+                        # Deleted, or the email now belongs to someone else
+                        self.forget(eid)
+                        item = {}
+                    memo[eid] = item
+        resolved = {eid: memo.get(eid, {}) for eid in employee_ids if eid}
+        if tenant_id is not None:
+            resolved = {eid: item if item and tenant_of(item) == tenant_id else {} for eid, item in resolved.items()}
+        return resolved
+
+    def resolve(self, employee_id, fields=None, memo=None, tenant_id=None):
+        return self.resolve_many([employee_id], fields, memo, tenant_id).get(employee_id, {})
@@ -0,0 +1,37 @@
+def projection_kwargs(fields, required=()):
+    """Build ProjectionExpression arguments for a list of attribute names.
+
+    ``fields`` may be a list or a comma separated string. ``required`` names
+    attributes the caller itself needs (keys, filter attributes) and is only
+    added when a projection is requested. Every name goes through a
+    placeholder so reserved words such as ``name`` and ``status`` need no
+    special casing. Returns an empty dict when no fields are given, which
+    means "read the full item".
+    """
+    if not fields:
+        return {}
+    if isinstance(fields, str):
+        fields = [f.strip() for f in fields.split(',') if f.strip()]
+    fields = list(dict.fromkeys(list(fields) + list(required)))
+    return {
+        'ProjectionExpression': ', '.join(f'#f{i}' for i in range(len(fields))),
+        'ExpressionAttributeNames': {f'#f{i}': field for i, field in enumerate(fields)}
+    }
+
+
+def with_projection(fields, required=(), **kwargs):
+    """Merge a projection into existing read arguments.
+
+    Callers that already use ExpressionAttributeNames for a filter or key
+    condition keep their placeholders; the projection's names are added.
+    """
+    projection = projection_kwargs(fields, required)
+    if not projection:
+        return kwargs
+    names = dict(kwargs.get('ExpressionAttributeNames') or {})
+    names.update(projection['ExpressionAttributeNames'])
+    return dict(
+        kwargs,
+        ProjectionExpression=projection['ProjectionExpression'],
+        ExpressionAttributeNames=names
+    )
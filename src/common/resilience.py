@@ -0,0 +1,336 @@
+import os
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import boto3
+from botocore.config import Config
+from botocore.exceptions import (
+    ClientError,
+    ConnectionClosedError,
+    ConnectTimeoutError,
+    EndpointConnectionError,
+    ReadTimeoutError
+)
+
+THROTTLING_CODES = {
+    'ProvisionedThroughputExceededException',
+    'ThrottlingException',
+    'Throttling',
+    'RequestLimitExceeded',
+    'TooManyRequestsException',
+    'SlowDown',
+    '503'
+}
+TRANSIENT_CODES = {
+    'InternalServerError',
+    'InternalError',
+    'ServiceUnavailable',
+    'RequestTimeout',
+    'RequestTimeoutException',
+    'TransactionInProgressException'
+}
+# Errors where the request never reached the service, so any call may retry
+_NOT_SENT = (EndpointConnectionError, ConnectTimeoutError)
+# Errors where the service may or may not have applied the call
+_AMBIGUOUS = (ReadTimeoutError, ConnectionClosedError)
+
+HEDGE_AFTER = float(os.getenv('HEDGE_GET_ITEM_MS', '50')) / 1000
+BREAKER_FAILURES = int(os.getenv('CIRCUIT_BREAKER_FAILURES', '5'))
+BREAKER_RESET_SECONDS = float(os.getenv('CIRCUIT_BREAKER_RESET_SECONDS', '30'))
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling AWS while a dependency's breaker is open."""
+
+    def __init__(self, name, retry_after):
+        super().__init__(f'{name} is unavailable, retry in {retry_after:.0f}s')
+        self.name = name
+        self.retry_after = retry_after
+
+
+def classify(error):
+    """'throttle', 'transient', 'not_sent' or None for errors not worth retrying."""
+    if isinstance(error, _NOT_SENT):
+        return 'not_sent'
+    if isinstance(error, _AMBIGUOUS):
+        return 'transient'
+    if isinstance(error, ClientError):
+        code = error.response.get('Error', {}).get('Code')
+        if code in THROTTLING_CODES:
+            return 'throttle'
+        status = error.response.get('ResponseMetadata', {}).get('HTTPStatusCode') or 0
+        if code in TRANSIENT_CODES or status >= 500:
+            return 'transient'
+    return None
+
+
+def describe_error(error):
+    """A message fit to show users in place of the raw exception text."""
+    if isinstance(error, CircuitOpenError):
+        return 'The service is temporarily unavailable, please try again shortly'
+    kind = classify(error)
+    if kind == 'throttle':
+        return 'The service is busy right now, please try again in a moment'
+    if kind:
+        return 'The service did not respond, please try again'
+    return str(error)
+
+
+class RetryPolicy:
+    """Capped exponential backoff with full jitter.
+
+    Throttling and never-sent errors are always retried since the call was
+    not applied. Other transient errors are only retried when the operation
+    is safe to repeat (``retry_transient``).
+    """
+
+    def __init__(self, max_attempts=4, base_delay=0.05, max_delay=2.0, retry_transient=True):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_transient = retry_transient
+
+    def should_retry(self, kind):
+        return kind in ('throttle', 'not_sent') or (kind == 'transient' and self.retry_transient)
+
+    def delay(self, attempt):
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+READ_POLICY = RetryPolicy(max_attempts=4)
+WRITE_POLICY = RetryPolicy(max_attempts=3, retry_transient=False)
+
+DYNAMODB_POLICIES = {
+    'get_item': READ_POLICY,
+    'query': READ_POLICY,
+    'scan': READ_POLICY,
+    'batch_get_item': READ_POLICY,
+    'put_item': WRITE_POLICY,
+    'update_item': WRITE_POLICY,
+    'delete_item': WRITE_POLICY,
+    'batch_write_item': WRITE_POLICY
+}
+S3_POLICIES = {
+    'get_object': READ_POLICY,
+    'head_object': READ_POLICY,
+    'list_objects_v2': READ_POLICY,
+    'put_object': WRITE_POLICY,
+    'delete_object': WRITE_POLICY
+}
+HEDGED_OPERATIONS = {'get_item'}
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker with a single half-open probe.
+
+    Only throttling and availability failures that survived their retries
+    count; client errors such as a failed condition mean the service is up.
+    """
+
+    def __init__(self, name, failure_threshold=BREAKER_FAILURES, reset_timeout=BREAKER_RESET_SECONDS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == 'closed':
+                return
+            waited = time.monotonic() - self._opened_at
+            if self.state == 'open' and waited >= self.reset_timeout:
+                self.state = 'half_open'
+            if self.state == 'half_open' and not self._probing:
+                self._probing = True
+                return
+            raise CircuitOpenError(self.name, max(self.reset_timeout - waited, 1))
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self.state == 'half_open' or self._failures >= self.failure_threshold:
+                self.state = 'open'
+                self._opened_at = time.monotonic()
+
+
+class Resilience:
+    """Runs AWS calls under retry policies, per-dependency breakers and hedging."""
+
+    def __init__(self, hedge_after=HEDGE_AFTER, hedge_workers=16):
+        self.hedge_after = hedge_after
+        self._breakers = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=hedge_workers, thread_name_prefix='hedge')
+        self._counters = defaultdict(int)
+
+    def breaker(self, name):
+        with self._lock:
+            breaker = self._breakers.get(name)
+            if breaker is None:
+                breaker = self._breakers[name] = CircuitBreaker(name)
+            return breaker
+
+    def _count(self, name, event):
+        with self._lock:
+            self._counters[(name, event)] += 1
+
+    def _hedged(self, name, fn, kwargs):
+        """Send a second identical read if the first is slower than hedge_after."""
+        first = self._pool.submit(fn, **kwargs)
+        done, _ = wait([first], timeout=self.hedge_after)
+        if done:
+            return first.result()
+        self._count(name, 'hedged')
+        pending = {first, self._pool.submit(fn, **kwargs)}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def call(self, name, operation, fn, policy, **kwargs):
+        breaker = self.breaker(name)
+        try:
+            breaker.allow()
+        except CircuitOpenError:
+            self._count(name, 'short_circuited')
+            raise
+        hedge = operation in HEDGED_OPERATIONS and self.hedge_after > 0
+        attempt = 0
+        while True:
+            try:
+                result = self._hedged(name, fn, kwargs) if hedge else fn(**kwargs)
+            except Exception as e:
+                kind = classify(e)
+                if kind is None:
+                    breaker.record_success()
+                    raise
+                attempt += 1
+                if attempt < policy.max_attempts and policy.should_retry(kind):
+                    self._count(name, 'retried')
+                    time.sleep(policy.delay(attempt))
+                    continue
+                self._count(name, 'failed')
+                breaker.record_failure()
+                raise
+            breaker.record_success()
+            return result
+
+    def render(self):
+        """Retry, hedge and breaker state in Prometheus text format."""
+        with self._lock:
+            lines = [
+                '# HELP hrms_aws_calls_total AWS call events by dependency',
+                '# TYPE hrms_aws_calls_total counter'
+            ]
+            for (name, event), count in sorted(self._counters.items()):
+                lines.append(f'hrms_aws_calls_total{{dependency="{name}",event="{event}"}} {count}')
+            lines += [
+                '# HELP hrms_circuit_open Whether a dependency breaker is open',
+                '# TYPE hrms_circuit_open gauge'
+            ]
+            for name, breaker in sorted(self._breakers.items()):
+                lines.append(f'hrms_circuit_open{{dependency="{name}"}} {int(breaker.state != "closed")}')
+        return '\n'.join(lines) + '\n'
+
+
+class _Guarded:
+    """Proxy whose listed operations run through ``Resilience.call``.
+
+    Listed operations are sent through ``single``, a twin of the target
+    built on a single-attempt client so RetryPolicy alone decides retries.
+    Everything else (batch writers, transfers, unlisted calls) goes to the
+    target and keeps botocore's own retries.
+    """
+
+    def __init__(self, target, resilience, policies, name_for, single=None):
+        self._target = target
+        self._single = target if single is None else single
+        self._resilience = resilience
+        self._policies = policies
+        self._name_for = name_for
+
+    def __getattr__(self, attr):
+        value = getattr(self._target, attr)
+        policy = self._policies.get(attr)
+        if policy is None or not callable(value):
+            return value
+        value = getattr(self._single, attr)
+
+        def guarded(**kwargs):
+            return self._resilience.call(self._name_for(kwargs), attr, value, policy, **kwargs)
+        return guarded
+
+    def rewrap(self, wrap):
+        """The same guard around ``wrap`` applied to the target and its twin."""
+        return _Guarded(wrap(self._target), self._resilience, self._policies, self._name_for,
+                        wrap(self._single))
+
+
+class ResilientDynamoDB(_Guarded):
+    """DynamoDB service resource whose tables each get their own breaker."""
+
+    def __init__(self, resource, resilience, single=None):
+        super().__init__(resource, resilience, DYNAMODB_POLICIES, lambda kwargs: 'dynamodb', single)
+        self._tables = {}
+
+    def Table(self, name):
+        table = self._tables.get(name)
+        if table is None:
+            table = self._tables[name] = _Guarded(
+                self._target.Table(name), self._resilience, DYNAMODB_POLICIES,
+                lambda kwargs: f'dynamodb:{name}', self._single.Table(name)
+            )
+        return table
+
+
+def client_config(max_attempts=None):
+    """botocore config: adaptive client-side rate limiting and retries.
+
+    Adaptive mode slows the client down after throttling responses. Guarded
+    operations use a twin client with ``max_attempts=1`` so RetryPolicy owns
+    their retry schedule; the rest keep AWS_MAX_ATTEMPTS botocore attempts.
+    The connection pool is sized for the thread pools that share a client
+    (parallel lookups, batched Lambda operations).
+    """
+    if max_attempts is None:
+        max_attempts = int(os.getenv('AWS_MAX_ATTEMPTS', '5'))
+    return Config(
+        retries={'mode': 'adaptive', 'total_max_attempts': max_attempts},
+        connect_timeout=float(os.getenv('AWS_CONNECT_TIMEOUT', '2')),
+        read_timeout=float(os.getenv('AWS_READ_TIMEOUT', '10')),
+        max_pool_connections=int(os.getenv('AWS_MAX_POOL_CONNECTIONS', '32'))
+    )
+
+
+default = Resilience()
+
+
+def dynamodb_resource(region_name=None, resilience=None):
+    resource = boto3.resource('dynamodb', region_name=region_name, config=client_config())
+    single = boto3.resource('dynamodb', region_name=region_name, config=client_config(max_attempts=1))
+    return ResilientDynamoDB(resource, resilience or default, single)
+
+
+def s3_client(region_name=None, resilience=None):
+    client = boto3.client('s3', region_name=region_name, config=client_config())
+    single = boto3.client('s3', region_name=region_name, config=client_config(max_attempts=1))
+    return _Guarded(client, resilience or default, S3_POLICIES,
+                    lambda kwargs: f"s3:{kwargs.get('Bucket', '')}", single)
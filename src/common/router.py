@@ -0,0 +1,142 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from common.serialization import dumps, finalize_response
+from common.tenancy import tenant_from_event
+
+# Sub-operations accepted in one ``operations`` envelope
+MAX_BATCH_OPERATIONS = int(os.getenv('MAX_BATCH_OPERATIONS', '500'))
+# Sub-operations in flight at once; keep within the client connection pool
+BATCH_WORKERS = int(os.getenv('BATCH_WORKERS', '16'))
+
+
+class OperationError(Exception):
+    """Raised by an operation to answer with a non-200 status."""
+
+    def __init__(self, status_code, message):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class Router:
+    """Dispatch Lambda events to declaratively registered operations.
+
+    An event names one ``operation`` and carries its arguments, as before::
+
+        {"operation": "get", "employee_id": "..."}
+
+    or carries a list of them, which run concurrently in one invocation::
+
+        {"operations": [{"id": "1", "operation": "get", "employee_id": "..."},
+                        {"id": "2", "operation": "update", ...}]}
+
+    Batched sub-operations must be independent of each other; pass
+    ``"ordered": true`` to run them one after another instead. The batch
+    answers 200 with one result per sub-operation, in request order, each
+    with its own ``statusCode``. An operation with a ``bulk`` counterpart
+    gets all of its batched calls in one go, so e.g. hundreds of gets cost
+    a few BatchGetItem calls.
+
+    Handlers receive ``(event, tenant_id)`` and return the response body.
+    The tenant comes from the authorizer claims of the outer event (see
+    ``tenant_from_event``), never from a sub-operation, so a caller cannot
+    name another tenant.
+    """
+
+    def __init__(self, max_batch=MAX_BATCH_OPERATIONS, workers=BATCH_WORKERS):
+        self.max_batch = max_batch
+        self.workers = workers
+        self._operations = {}
+        self._bulk = {}
+
+    def operation(self, name):
+        def register(fn):
+            self._operations[name] = fn
+            return fn
+        return register
+
+    def bulk(self, name):
+        """Register ``fn(events, tenant_id)`` returning one body or OperationError per event."""
+        def register(fn):
+            self._bulk[name] = fn
+            return fn
+        return register
+
+    def _run(self, event, tenant_id):
+        handler = self._operations.get(event.get('operation'))
+        if handler is None:
+            return 400, {'error': 'Invalid operation'}
+        try:
+            return 200, handler(event, tenant_id)
+        except OperationError as e:
+            return e.status_code, {'error': str(e)}
+        except Exception as e:
+            return 500, {'error': str(e)}
+
+    def _run_bulk(self, name, events, tenant_id):
+        try:
+            bodies = self._bulk[name](events, tenant_id)
+        except Exception as e:
+            return [(500, {'error': str(e)})] * len(events)
+        return [
+            (body.status_code, {'error': str(body)}) if isinstance(body, OperationError) else (200, body)
+            for body in bodies
+        ]
+
+    def _run_batch(self, operations, tenant_id, ordered):
+        results = [None] * len(operations)
+        singles = []
+        grouped = {}
+        for position, sub in enumerate(operations):
+            if not isinstance(sub, dict):
+                results[position] = (400, {'error': 'Invalid operation'})
+            elif not ordered and sub.get('operation') in self._bulk:
+                grouped.setdefault(sub['operation'], []).append(position)
+            else:
+                singles.append(position)
+
+        if ordered:
+            for position in singles:
+                results[position] = self._run(operations[position], tenant_id)
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(operations))) as pool:
+                bulk_runs = {
+                    name: pool.submit(self._run_bulk, name, [operations[p] for p in positions], tenant_id)
+                    for name, positions in grouped.items()
+                }
+                for position, result in zip(singles, pool.map(
+                        lambda p: self._run(operations[p], tenant_id), singles)):
+                    results[position] = result
+                for name, future in bulk_runs.items():
+                    for position, result in zip(grouped[name], future.result()):
+                        results[position] = result
+
+        return [
+            {
+                'id': sub.get('id', str(position)) if isinstance(sub, dict) else str(position),
+                'operation': sub.get('operation') if isinstance(sub, dict) else None,
+                'statusCode': status,
+                'body': body
+            }
+            for position, (sub, (status, body)) in enumerate(zip(operations, results))
+        ]
+
+    def handle(self, event, context):
+        tenant_id = tenant_from_event(event)
+        operations = event.get('operations')
+        if operations is None:
+            status, body = self._run(event, tenant_id)
+            return {'statusCode': status, 'body': dumps(body)}
+
+        if not isinstance(operations, list) or not operations:
+            return {'statusCode': 400, 'body': dumps({'error': 'operations must be a non-empty list'})}
+        if len(operations) > self.max_batch:
+            return {
+                'statusCode': 400,
+                'body': dumps({'error': f'At most {self.max_batch} operations per batch'})
+            }
+        results = self._run_batch(operations, tenant_id, bool(event.get('ordered')))
+        return {'statusCode': 200, 'body': dumps({'results': results})}
+
+    def lambda_handler(self, event, context):
+        return finalize_response(self.handle(event, context), event)
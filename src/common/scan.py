@@ -0,0 +1,219 @@
+import json
+import os
+import queue
+import threading
+from decimal import Decimal
+
+import boto3
+
+_DONE = object()
+
+
+def _encode_key(obj):
+    if isinstance(obj, Decimal):
+        return {'__decimal__': str(obj)}
+    raise TypeError(f'Unsupported key type: {type(obj)}')
+
+
+def _decode_key(obj):
+    if '__decimal__' in obj:
+        return Decimal(obj['__decimal__'])
+    return obj
+
+
+class ScanCheckpoint:
+    """Remembers how far each scan segment got so an interrupted job can resume.
+
+    The state file maps segment number to the LastEvaluatedKey of the last page
+    the consumer finished with, or to true once the segment is exhausted.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._state = {}
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                self._state = json.load(f, object_hook=_decode_key)
+
+    def start_key(self, segment):
+        value = self._state.get(str(segment))
+        return None if value is True else value
+
+    def is_done(self, segment):
+        return self._state.get(str(segment)) is True
+
+    def save(self, segment, last_key):
+        with self._lock:
+            self._state[str(segment)] = last_key if last_key else True
+            tmp_path = f'{self.path}.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump(self._state, f, default=_encode_key)
+            os.replace(tmp_path, self.path)
+
+    def clear(self):
+        with self._lock:
+            self._state = {}
+            if os.path.exists(self.path):
+                os.remove(self.path)
+
+
+def _segment_table(table):
+    # boto3 resources are not thread safe but their clients are: every worker
+    # gets its own resource around the caller's client, which keeps its
+    # endpoint, credentials and botocore config. Guarded tables (see
+    # common.resilience) are rebuilt behind the same guard.
+    if hasattr(table, 'rewrap'):
+        return table.rewrap(_segment_table)
+    client = table.meta.client
+    resource = boto3.session.Session().resource('dynamodb', region_name=client.meta.region_name)
+    resource.meta.client = client
+    return resource.Table(table.name)
+
+
+def _scan_segment(table, segment, total_segments, start_key, scan_kwargs, pages, stop, table_factory):
+    try:
+        worker_table = table_factory(table)
+        params = dict(scan_kwargs, Segment=segment, TotalSegments=total_segments)
+        if start_key:
+            params['ExclusiveStartKey'] = start_key
+
+        while not stop.is_set():
+            response = worker_table.scan(**params)
+            last_key = response.get('LastEvaluatedKey')
+            page = (segment, response.get('Items', []), last_key)
+
+            # Blocks while the consumer is behind; re-checks stop so an
+            # abandoned generator does not leave workers hanging forever.
+            while not stop.is_set():
+                try:
+                    pages.put(page, timeout=0.5)
+                    break
+                except queue.Full:
+                    continue
+
+            if not last_key:
+                break
+            params['ExclusiveStartKey'] = last_key
+    except Exception as e:
+        pages.put((segment, e, None))
+    finally:
+        pages.put((segment, _DONE, None))
+
+
+def parallel_scan(table, total_segments=None, max_buffered_pages=8, checkpoint=None, table_factory=None,
+                  before_checkpoint=None, **scan_kwargs):
+    """Yield every item of a table using a segmented parallel scan.
+
+    One worker thread scans each segment. Pages are handed over through a
+    bounded queue, so workers stop reading when the consumer falls behind.
+    Extra keyword arguments (FilterExpression, ProjectionExpression, ...) are
+    passed through to every Scan call. ``table_factory(table)`` builds the
+    table each worker scans; by default a resource sharing the caller's
+    client and behind the same resilience guard. ``before_checkpoint()``
+    runs before each page is checkpointed, so a consumer that buffers writes
+    can flush them first.
+    """
+    if total_segments is None:
+        total_segments = int(os.getenv('SCAN_SEGMENTS', '4'))
+
+    pages = queue.Queue(maxsize=max_buffered_pages)
+    stop = threading.Event()
+    workers = []
+
+    for segment in range(total_segments):
+        if checkpoint and checkpoint.is_done(segment):
+            continue
+        start_key = checkpoint.start_key(segment) if checkpoint else None
+        worker = threading.Thread(
+            target=_scan_segment,
+            args=(table, segment, total_segments, start_key, scan_kwargs, pages, stop,
+                  table_factory or _segment_table),
+            daemon=True
+        )
+        worker.start()
+        workers.append(worker)
+
+    remaining = len(workers)
+    try:
+        while remaining:
+            segment, items, last_key = pages.get()
+            if items is _DONE:
+                remaining -= 1
+                continue
+            if isinstance(items, Exception):
+                raise items
+
+            for item in items:
+                yield item
+
+            # Only checkpoint once the consumer has taken the whole page
+            if checkpoint:
+                if before_checkpoint:
+                    before_checkpoint()
+                checkpoint.save(segment, last_key)
+    finally:
+        stop.set()
+        # Drain so workers blocked on a full queue can notice the stop flag
+        while any(w.is_alive() for w in workers):
+            try:
+                pages.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+
+def iter_pages(table, **scan_kwargs):
+    """Yield a table one scan page at a time without holding earlier pages."""
+    response = table.scan(**scan_kwargs)
+    yield response.get('Items', [])
+    while 'LastEvaluatedKey' in response:
+        response = table.scan(ExclusiveStartKey=response['LastEvaluatedKey'], **scan_kwargs)
+        yield response.get('Items', [])
+
+
+def scan_all(table, **scan_kwargs):
+    """Paginated single-threaded scan, for callers that only need a list."""
+    response = table.scan(**scan_kwargs)
+    items = response.get('Items', [])
+    while 'LastEvaluatedKey' in response:
+        response = table.scan(ExclusiveStartKey=response['LastEvaluatedKey'], **scan_kwargs)
+        items.extend(response.get('Items', []))
+    return items
+
+
+def query_all(table, **query_kwargs):
+    """Every page of a Query, for callers that only need a list."""
+    response = table.query(**query_kwargs)
+    items = response.get('Items', [])
+    while 'LastEvaluatedKey' in response:
+        response = table.query(ExclusiveStartKey=response['LastEvaluatedKey'], **query_kwargs)
+        items.extend(response.get('Items', []))
+    return items
+
+
+def batch_get(dynamodb, table_name, keys, **projection):
+    """Fetch items by key with BatchGetItem, 100 keys per call.
+
+    Returns the items found in no particular order; unprocessed keys are
+    sent again until DynamoDB has answered for all of them.
+    """
+    items = []
+    keys = list(keys)
+    for start in range(0, len(keys), 100):
+        request = {table_name: dict(projection, Keys=keys[start:start + 100])}
+        while request:
+            response = dynamodb.batch_get_item(RequestItems=request)
+            items.extend(response.get('Responses', {}).get(table_name, []))
+            request = response.get('UnprocessedKeys') or None
+    return items
+
+
+def read_all(table, parallel=False, total_segments=None, **scan_kwargs):
+    """Read a whole table, optionally through the parallel scan engine.
+
+    Offline paths (exports, reconciliation) pass parallel=True; interactive
+    paths keep the cheaper single-threaded pagination.
+    """
+    if parallel:
+        return list(parallel_scan(table, total_segments=total_segments, **scan_kwargs))
+    return scan_all(table, **scan_kwargs)
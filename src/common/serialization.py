@@ -0,0 +1,66 @@
+import base64
+import gzip
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Bodies smaller than this are not worth the gzip CPU time
+GZIP_MIN_BYTES = 1024
+
+
+def _default(obj):
+    if isinstance(obj, Decimal):
+        # DynamoDB returns every number as Decimal
+        return int(obj) if obj == obj.to_integral_value() else float(obj)
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, bytes):
+        return base64.b64encode(obj).decode('ascii')
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+if orjson is not None:
+    def dumps(obj):
+        """Compact JSON encoding that understands DynamoDB value types."""
+        return orjson.dumps(obj, default=_default).decode('utf-8')
+else:
+    _encoder = json.JSONEncoder(separators=(',', ':'), default=_default)
+
+    def dumps(obj):
+        """Compact JSON encoding that understands DynamoDB value types."""
+        return _encoder.encode(obj)
+
+
+def wants_gzip(event):
+    if event.get('gzip'):
+        return True
+    headers = event.get('headers') or {}
+    accept = headers.get('Accept-Encoding') or headers.get('accept-encoding') or ''
+    return 'gzip' in accept
+
+
+def finalize_response(response, event):
+    """Gzip a handler response body when the caller asked for it."""
+    body = response.get('body')
+    if not isinstance(body, str) or not wants_gzip(event):
+        return response
+    raw = body.encode('utf-8')
+    if len(raw) < GZIP_MIN_BYTES:
+        return response
+
+    headers = dict(response.get('headers') or {})
+    headers['Content-Encoding'] = 'gzip'
+    headers.setdefault('Content-Type', 'application/json')
+    return dict(
+        response,
+        headers=headers,
+        body=base64.b64encode(gzip.compress(raw, compresslevel=5)).decode('ascii'),
+        isBase64Encoded=True
+    )
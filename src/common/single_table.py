@@ -0,0 +1,193 @@
+import os
+
+from boto3.dynamodb.conditions import Key
+
+from common.tenancy import DEFAULT_TENANT, scoped, tenant_of
+
+SINGLE_TABLE_NAME = os.getenv('SINGLE_TABLE_NAME', 'HRMS')
+
+# Entity lookups by natural id (EMAIL#, LEAVE#, DOC#) and by state within a
+# tenant (STATUS#<leave status>, DOC#PUBLIC), newest first through the sort key
+TABLE_DEFINITION = {
+    'TableName': SINGLE_TABLE_NAME,
+    'KeySchema': [
+        {'AttributeName': 'PK', 'KeyType': 'HASH'},
+        {'AttributeName': 'SK', 'KeyType': 'RANGE'}
+    ],
+    'AttributeDefinitions': [
+        {'AttributeName': 'PK', 'AttributeType': 'S'},
+        {'AttributeName': 'SK', 'AttributeType': 'S'},
+        {'AttributeName': 'GSI1PK', 'AttributeType': 'S'},
+        {'AttributeName': 'GSI1SK', 'AttributeType': 'S'},
+        {'AttributeName': 'GSI2PK', 'AttributeType': 'S'},
+        {'AttributeName': 'GSI2SK', 'AttributeType': 'S'}
+    ],
+    'GlobalSecondaryIndexes': [
+        {
+            'IndexName': 'GSI1',
+            'KeySchema': [
+                {'AttributeName': 'GSI1PK', 'KeyType': 'HASH'},
+                {'AttributeName': 'GSI1SK', 'KeyType': 'RANGE'}
+            ],
+            'Projection': {'ProjectionType': 'ALL'}
+        },
+        {
+            'IndexName': 'GSI2',
+            'KeySchema': [
+                {'AttributeName': 'GSI2PK', 'KeyType': 'HASH'},
+                {'AttributeName': 'GSI2SK', 'KeyType': 'RANGE'}
+            ],
+            'Projection': {'ProjectionType': 'ALL'}
+        }
+    ],
+    'BillingMode': 'PAY_PER_REQUEST',
+    'StreamSpecification': {'StreamEnabled': True, 'StreamViewType': 'NEW_AND_OLD_IMAGES'}
+}
+
+_KEY_ATTRIBUTES = ('PK', 'SK', 'GSI1PK', 'GSI1SK', 'GSI2PK', 'GSI2SK', 'entity')
+
+
+def employee_item(employee):
+    return dict(
+        employee,
+        PK=f"EMP#{employee['employee_id']}",
+        SK='PROFILE',
+        GSI1PK=f"EMAIL#{employee['email']}",
+        GSI1SK='PROFILE',
+        entity='employee'
+    )
+
+
+def leave_item(leave_request):
+    return dict(
+        leave_request,
+        PK=f"EMP#{leave_request['employee_id']}",
+        SK=f"LEAVE#{leave_request['created_at']}#{leave_request['request_id']}",
+        GSI1PK=f"LEAVE#{leave_request['request_id']}",
+        GSI1SK='LEAVE',
+        GSI2PK=scoped(tenant_of(leave_request), f"STATUS#{leave_request.get('status', 'PENDING')}"),
+        GSI2SK=leave_request['created_at'],
+        entity='leave_request'
+    )
+
+
+def document_item(document):
+    item = dict(
+        document,
+        PK=f"EMP#{document['employee_id']}",
+        SK=f"DOC#{document['created_at']}#{document['document_id']}",
+        GSI1PK=f"DOC#{document['document_id']}",
+        GSI1SK='DOC',
+        entity='document'
+    )
+    if document.get('is_public'):
+        item.update(GSI2PK=scoped(tenant_of(document), 'DOC#PUBLIC'), GSI2SK=document['created_at'])
+    return item
+
+
+# Source table -> (converter, attributes the converter needs)
+CONVERTERS = {
+    'Employees': (employee_item, ('employee_id', 'email')),
+    'LeaveRequests': (leave_item, ('employee_id', 'request_id', 'created_at')),
+    'Documents': (document_item, ('employee_id', 'document_id', 'created_at'))
+}
+
+
+def strip(item):
+    """Drop the storage keys, leaving the attributes the app works with."""
+    return {k: v for k, v in item.items() if k not in _KEY_ATTRIBUTES}
+
+
+class SingleTableStore:
+    """Employees, leave requests and documents in one table.
+
+    Everything that belongs to an employee shares the partition
+    ``EMP#<employee_id>``: the profile under ``PROFILE`` and leave requests
+    and documents under ``LEAVE#<created_at>#<id>`` and
+    ``DOC#<created_at>#<id>``. One Query therefore returns an employee with
+    their whole leave and document history, in creation order. GSI1 finds a
+    single entity by email or id, GSI2 lists a tenant's leave by status and
+    public documents.
+    """
+
+    def __init__(self, table):
+        self.table = table
+
+    def _query(self, **kwargs):
+        response = self.table.query(**kwargs)
+        items = response.get('Items', [])
+        while 'LastEvaluatedKey' in response:
+            response = self.table.query(ExclusiveStartKey=response['LastEvaluatedKey'], **kwargs)
+            items.extend(response.get('Items', []))
+        return items
+
+    def _lookup(self, gsi1pk):
+        items = self.table.query(
+            IndexName='GSI1', KeyConditionExpression=Key('GSI1PK').eq(gsi1pk), Limit=1
+        ).get('Items', [])
+        return strip(items[0]) if items else None
+
+    def put_employee(self, employee):
+        self.table.put_item(Item=employee_item(employee))
+
+    def put_leave_request(self, leave_request):
+        self.table.put_item(Item=leave_item(leave_request))
+
+    def put_document(self, document):
+        self.table.put_item(Item=document_item(document))
+
+    def employee_overview(self, employee_id):
+        """The employee plus their leave requests and documents, newest first."""
+        overview = {'employee': None, 'leave_requests': [], 'documents': []}
+        for item in self._query(
+            KeyConditionExpression=Key('PK').eq(f'EMP#{employee_id}'),
+            ScanIndexForward=False
+        ):
+            entity = item.get('entity')
+            if entity == 'employee':
+                overview['employee'] = strip(item)
+            elif entity == 'leave_request':
+                overview['leave_requests'].append(strip(item))
+            elif entity == 'document':
+                overview['documents'].append(strip(item))
+        return overview
+
+    def employee_by_email(self, email):
+        return self._lookup(f'EMAIL#{email}')
+
+    def leave_request(self, request_id):
+        return self._lookup(f'LEAVE#{request_id}')
+
+    def document(self, document_id):
+        return self._lookup(f'DOC#{document_id}')
+
+    def leave_requests_by_status(self, status, limit=None, tenant_id=DEFAULT_TENANT):
+        kwargs = {
+            'IndexName': 'GSI2',
+            'KeyConditionExpression': Key('GSI2PK').eq(scoped(tenant_id, f'STATUS#{status}')),
+            'ScanIndexForward': False
+        }
+        if limit:
+            response = self.table.query(Limit=limit, **kwargs)
+            return [strip(i) for i in response.get('Items', [])]
+        return [strip(i) for i in self._query(**kwargs)]
+
+    def public_documents(self, tenant_id=DEFAULT_TENANT):
+        return [strip(i) for i in self._query(
+            IndexName='GSI2', KeyConditionExpression=Key('GSI2PK').eq(scoped(tenant_id, 'DOC#PUBLIC')),
+            ScanIndexForward=False
+        )]
+
+    def apply_changes(self, events):
+        """Change-feed handler mirroring the three source tables."""
+        with self.table.batch_writer(overwrite_by_pkeys=['PK', 'SK']) as batch:
+            for event in events:
+                converter, required = CONVERTERS[event.table]
+                image = event.image or {}
+                if any(not image.get(name) for name in required):
+                    continue
+                item = converter(image)
+                if event.event_name == 'REMOVE':
+                    batch.delete_item(Key={'PK': item['PK'], 'SK': item['SK']})
+                else:
+                    batch.put_item(Item=item)
@@ -0,0 +1,141 @@
+import os
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+from boto3.dynamodb.conditions import Attr, Key
+
+DEFAULT_TENANT = os.getenv('DEFAULT_TENANT_ID', 'default')
+# Write shards per tenant in the tenant indexes; changing it needs a re-stamp
+TENANT_SHARDS = int(os.getenv('TENANT_SHARDS', '4'))
+
+# Table -> (sharded tenant index, attribute whose hash picks the shard)
+TENANT_INDEXES = {
+    'Employees': ('TenantEmployeeIndex', 'email'),
+    'LeaveRequests': ('TenantLeaveIndex', 'request_id'),
+    'Documents': ('TenantDocumentIndex', 'document_id')
+}
+DEPARTMENT_INDEX = 'TenantDepartmentLeaveIndex'
+# Direct Lambda invocations (IAM authorized) may name their tenant in the event
+TRUST_EVENT_TENANT = os.getenv('TRUST_EVENT_TENANT') == '1'
+
+
+def tenant_of(item):
+    """Tenant of a stored item; items written before tenancy belong to the default."""
+    return (item or {}).get('tenant_id') or DEFAULT_TENANT
+
+
+def belongs_to(item, tenant_id):
+    return item is not None and tenant_of(item) == tenant_id
+
+
+def tenant_condition(tenant_id):
+    """ConditionExpression that the item being written belongs to the tenant."""
+    condition = Attr('tenant_id').eq(tenant_id)
+    if tenant_id == DEFAULT_TENANT:
+        condition = condition | Attr('tenant_id').not_exists()
+    return condition
+
+
+def scoped(tenant_id, value):
+    """Qualify a name that is only unique within a tenant.
+
+    The default tenant keeps the bare value, so a single-company deployment
+    keeps its existing report periods, S3 keys and archive paths.
+    """
+    return str(value) if tenant_id == DEFAULT_TENANT else f'{tenant_id}#{value}'
+
+
+def s3_prefix(tenant_id):
+    return '' if tenant_id == DEFAULT_TENANT else f'tenants/{tenant_id}/'
+
+
+def shard_key(tenant_id, value, shards=TENANT_SHARDS):
+    return f'{tenant_id}#{zlib.crc32(str(value).encode("utf-8")) % shards}'
+
+
+def stamp(table_name, item, tenant_id):
+    """Add the tenant attributes the tenant indexes are keyed on."""
+    _, shard_attribute = TENANT_INDEXES[table_name]
+    item['tenant_id'] = tenant_id
+    item['tenant_shard'] = shard_key(tenant_id, item[shard_attribute])
+    if table_name == 'LeaveRequests' and item.get('department'):
+        item['tenant_department'] = scoped(tenant_id, item['department'])
+    return item
+
+
+def _query_shard(table, index_name, shard, key_condition, query_kwargs):
+    condition = Key('tenant_shard').eq(shard)
+    if key_condition is not None:
+        condition = condition & key_condition
+    params = dict(query_kwargs, IndexName=index_name, KeyConditionExpression=condition)
+    response = table.query(**params)
+    yield response
+    while 'LastEvaluatedKey' in response:
+        response = table.query(ExclusiveStartKey=response['LastEvaluatedKey'], **params)
+        yield response
+
+
+def iter_tenant_pages(table, tenant_id, key_condition=None, shards=TENANT_SHARDS, **query_kwargs):
+    """Yield one tenant's items a page at a time, shard after shard.
+
+    ``key_condition`` may add a condition on the index sort key; other
+    keyword arguments (FilterExpression, ProjectionExpression, Limit, ...)
+    are passed through to every Query.
+    """
+    index_name, _ = TENANT_INDEXES[table.name]
+    for shard in range(shards):
+        for response in _query_shard(table, index_name, f'{tenant_id}#{shard}', key_condition, query_kwargs):
+            yield response.get('Items', [])
+
+
+def query_tenant(table, tenant_id, key_condition=None, shards=TENANT_SHARDS, **query_kwargs):
+    """All of one tenant's items in a table, with the shards queried concurrently.
+
+    Every tenant's items live in the table's tenant index under
+    ``<tenant_id>#<shard>`` keys, so the cost of a listing follows the
+    tenant's size rather than the table's, and a large tenant's writes are
+    spread over TENANT_SHARDS index partitions instead of heating one.
+    """
+    index_name, _ = TENANT_INDEXES[table.name]
+
+    def read(shard):
+        return [
+            item
+            for response in _query_shard(table, index_name, f'{tenant_id}#{shard}', key_condition, query_kwargs)
+            for item in response.get('Items', [])
+        ]
+
+    with ThreadPoolExecutor(max_workers=shards) as pool:
+        return [item for items in pool.map(read, range(shards)) for item in items]
+
+
+def count_tenant(table, tenant_id, shards=TENANT_SHARDS, **query_kwargs):
+    index_name, _ = TENANT_INDEXES[table.name]
+
+    def count(shard):
+        return sum(
+            response.get('Count', 0)
+            for response in _query_shard(table, index_name, f'{tenant_id}#{shard}', None,
+                                         dict(query_kwargs, Select='COUNT'))
+        )
+
+    with ThreadPoolExecutor(max_workers=shards) as pool:
+        return sum(pool.map(count, range(shards)))
+
+
+def tenant_from_event(event):
+    """Tenant of a Lambda invocation, from the API Gateway authorizer.
+
+    The event body is client controlled, so its ``tenant_id`` is only used
+    for direct invocations (no ``requestContext``) when TRUST_EVENT_TENANT=1,
+    i.e. callers already authorized by IAM. It never overrides a claim.
+    """
+    context = event.get('requestContext')
+    authorizer = (context or {}).get('authorizer') or {}
+    claims = authorizer.get('claims') or (authorizer.get('jwt') or {}).get('claims') or {}
+    claimed = authorizer.get('tenant_id') or claims.get('custom:tenant_id')
+    if claimed:
+        return claimed
+    if context is None and TRUST_EVENT_TENANT and event.get('tenant_id'):
+        return event['tenant_id']
+    return DEFAULT_TENANT
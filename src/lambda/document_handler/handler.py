@@ -1,118 +1,142 @@
-import json
-import boto3
-import uuid
 from datetime import datetime
+from boto3.dynamodb.conditions import Attr, Key
+from botocore.exceptions import ClientError
+from common import resilience
+from common.blobs import BLOB_TABLE, BlobStore
+from common.conditions import condition_failed, idempotent_id
+from common.scan import batch_get, query_all
+from common.projection import projection_kwargs, with_projection
+from common.router import Router
+from common.tenancy import belongs_to, query_tenant, s3_prefix, stamp, tenant_condition
 
-def lambda_handler(event, context):
-    dynamodb = boto3.resource('dynamodb')
-    s3 = boto3.client('s3')
-    table = dynamodb.Table('Documents')
-    bucket_name = 'hrms-documents-bucket'
-    
+# Created once per container and shared by every invocation and batch worker
+dynamodb = resilience.dynamodb_resource()
+s3 = resilience.s3_client()
+table = dynamodb.Table('Documents')
+bucket_name = 'hrms-documents-bucket'
+# Orphaned blobs are left in the orphan index for the web app's collector
+blob_store = BlobStore(dynamodb.Table(BLOB_TABLE), s3, bucket_name)
+router = Router()
+lambda_handler = router.lambda_handler
+
+def download_url(document):
+    return s3.generate_presigned_url(
+        'get_object',
+        Params={
+            'Bucket': bucket_name,
+            'Key': document['s3_key']
+        },
+        ExpiresIn=3600
+    )
+
+@router.operation('upload')
+def upload(event, tenant_id):
+    document_data = dict(event.get('document', {}))
+    # A retry with the same idempotency_key gets the same record and a fresh upload URL
+    document_data['document_id'] = idempotent_id(
+        event.get('idempotency_key'), tenant_id, document_data.get('employee_id'), document_data.get('filename')
+    )
+    document_data['created_at'] = datetime.now().isoformat()
+
+    # Generate pre-signed URL for upload
+    s3_key = (f"{s3_prefix(tenant_id)}{document_data['employee_id']}/"
+              f"{document_data['document_id']}/{document_data['filename']}")
+    upload_url = s3.generate_presigned_url(
+        'put_object',
+        Params={
+            'Bucket': bucket_name,
+            'Key': s3_key
+        },
+        ExpiresIn=3600
+    )
+
+    document_data['s3_key'] = s3_key
+    stamp('Documents', document_data, tenant_id)
     try:
-        operation = event.get('operation')
-        
-        if operation == 'upload':
-            document_data = event.get('document', {})
-            document_data['document_id'] = str(uuid.uuid4())
-            document_data['created_at'] = datetime.now().isoformat()
-            
-            # Generate pre-signed URL for upload
-            s3_key = f"{document_data['employee_id']}/{document_data['document_id']}/{document_data['filename']}"
-            upload_url = s3.generate_presigned_url(
-                'put_object',
-                Params={
-                    'Bucket': bucket_name,
-                    'Key': s3_key
-                },
-                ExpiresIn=3600
-            )
-            
-            document_data['s3_key'] = s3_key
-            table.put_item(Item=document_data)
-            
-            return {
-                'statusCode': 200,
-                'body': json.dumps({
-                    'message': 'Document record created successfully',
-                    'document_id': document_data['document_id'],
-                    'upload_url': upload_url
-                })
-            }
-            
-        elif operation == 'get':
-            document_id = event.get('document_id')
-            response = table.get_item(Key={'document_id': document_id})
-            document = response.get('Item')
-            
-            if document:
-                # Generate download URL
-                download_url = s3.generate_presigned_url(
-                    'get_object',
-                    Params={
-                        'Bucket': bucket_name,
-                        'Key': document['s3_key']
-                    },
-                    ExpiresIn=3600
-                )
-                document['download_url'] = download_url
-            
-            return {
-                'statusCode': 200,
-                'body': json.dumps(document)
-            }
-            
-        elif operation == 'list':
-            employee_id = event.get('employee_id')
-            response = table.scan()
-            documents = response.get('Items', [])
-            
-            if employee_id:
-                documents = [d for d in documents if d.get('employee_id') == employee_id]
-                
-            # Generate download URLs for all documents
-            for doc in documents:
-                doc['download_url'] = s3.generate_presigned_url(
-                    'get_object',
-                    Params={
-                        'Bucket': bucket_name,
-                        'Key': doc['s3_key']
-                    },
-                    ExpiresIn=3600
-                )
-                
-            return {
-                'statusCode': 200,
-                'body': json.dumps(documents)
-            }
-            
-        elif operation == 'delete':
-            document_id = event.get('document_id')
-            response = table.get_item(Key={'document_id': document_id})
-            document = response.get('Item')
-            
-            if document:
-                # Delete from S3
-                s3.delete_object(
-                    Bucket=bucket_name,
-                    Key=document['s3_key']
-                )
-                # Delete from DynamoDB
-                table.delete_item(Key={'document_id': document_id})
-            
-            return {
-                'statusCode': 200,
-                'body': json.dumps({'message': 'Document deleted successfully'})
-            }
-            
+        table.put_item(Item=document_data, ConditionExpression=Attr('document_id').not_exists())
+    except ClientError as e:
+        if not condition_failed(e):
+            raise
+
+    return {
+        'message': 'Document record created successfully',
+        'document_id': document_data['document_id'],
+        'upload_url': upload_url
+    }
+
+@router.operation('get')
+def get(event, tenant_id):
+    response = table.get_item(
+        Key={'document_id': event.get('document_id')},
+        **projection_kwargs(event.get('fields'), required=['s3_key', 'tenant_id'])
+    )
+    document = response.get('Item')
+    if not belongs_to(document, tenant_id):
+        return None
+    document['download_url'] = download_url(document)
+    return document
+
+@router.bulk('get')
+def get_many(events, tenant_id):
+    fields = sorted({f for e in events for f in (e.get('fields') or ())}) if all(
+        e.get('fields') for e in events) else None
+    ids = {e.get('document_id') for e in events if e.get('document_id')}
+    found = {
+        item['document_id']: item
+        for item in batch_get(dynamodb, table.name, [{'document_id': i} for i in ids],
+                              **projection_kwargs(fields, required=['document_id', 's3_key', 'tenant_id']))
+    }
+    results = []
+    for e in events:
+        document = found.get(e.get('document_id'))
+        if not belongs_to(document, tenant_id):
+            results.append(None)
+            continue
+        if e.get('fields'):
+            document = {k: v for k, v in document.items() if k in e['fields'] or k in ('s3_key', 'tenant_id')}
+        results.append(dict(document, download_url=download_url(document)))
+    return results
+
+@router.operation('list')
+def list_documents(event, tenant_id):
+    employee_id = event.get('employee_id')
+    if employee_id:
+        documents = query_all(table, **with_projection(
+            event.get('fields'),
+            required=['employee_id', 's3_key', 'tenant_id'],
+            IndexName='EmployeeDocumentIndex',
+            KeyConditionExpression=Key('employee_id').eq(employee_id)
+        ))
+        documents = [d for d in documents if belongs_to(d, tenant_id)]
+    else:
+        documents = query_tenant(
+            table, tenant_id, **projection_kwargs(event.get('fields'), required=['employee_id', 's3_key'])
+        )
+
+    # Generate download URLs for all documents
+    for doc in documents:
+        doc['download_url'] = download_url(doc)
+    return documents
+
+@router.operation('delete')
+def delete(event, tenant_id):
+    # One conditional delete returns the record, then its S3 object or blob reference goes
+    try:
+        response = table.delete_item(
+            Key={'document_id': event.get('document_id')},
+            ConditionExpression=Attr('document_id').exists() & tenant_condition(tenant_id),
+            ReturnValues='ALL_OLD'
+        )
+    except ClientError as e:
+        if not condition_failed(e):
+            raise
+    else:
+        if response['Attributes'].get('blob_id'):
+            blob_store.release(response['Attributes'])
         else:
-            return {
-                'statusCode': 400,
-                'body': json.dumps({'error': 'Invalid operation'})
-            }
-            
-    except Exception as e:
-        return {
-            'statusCode': 500,
-            'body': json.dumps({'error': str(e)})
-        }
+            s3.delete_object(
+                Bucket=bucket_name,
+                Key=response['Attributes']['s3_key']
+            )
+
+    return {'message': 'Document deleted successfully'}
@@ -1,83 +1,115 @@
-import json
-import boto3
 import uuid
 from datetime import datetime
+from boto3.dynamodb.conditions import Attr, Key
+from botocore.exceptions import ClientError
+from common import resilience
+from common.employees import EmployeeResolver
+from common.projection import projection_kwargs, with_projection
+from common.router import OperationError, Router
+from common.tenancy import belongs_to, query_tenant, stamp, tenant_condition
+
+# Created once per container and shared by every invocation and batch worker
+dynamodb = resilience.dynamodb_resource()
+table = dynamodb.Table('Employees')
+resolver = EmployeeResolver(dynamodb)
+router = Router()
+lambda_handler = router.lambda_handler
+
+def find_employee(employee_id, tenant_id, fields=None):
+    # Employees is keyed by email; employee_id is looked up through its index
+    items = table.query(**with_projection(
+        fields,
+        required=['tenant_id'],
+        IndexName='EmployeeIdIndex',
+        KeyConditionExpression=Key('employee_id').eq(employee_id)
+    )).get('Items', [])
+    return items[0] if items and belongs_to(items[0], tenant_id) else None
+
+def only(employee, fields):
+    if employee and fields:
+        return {k: v for k, v in employee.items() if k in fields}
+    return employee or None
+
+@router.operation('create')
+def create(event, tenant_id):
+    employee_data = dict(event.get('employee', {}))
+    employee_data['employee_id'] = str(uuid.uuid4())
+    employee_data['created_at'] = datetime.now().isoformat()
+    stamp('Employees', employee_data, tenant_id)
+
+    # An email already in use, in this company or another, is never overwritten
+    try:
+        table.put_item(
+            Item=employee_data,
+            ConditionExpression=Attr('email').not_exists()
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        raise OperationError(409, 'Email already exists')
+    return {
+        'message': 'Employee created successfully',
+        'employee_id': employee_data['employee_id']
+    }
+
+@router.operation('get')
+def get(event, tenant_id):
+    fields = event.get('fields')
+    return only(find_employee(event.get('employee_id'), tenant_id, fields), fields)
+
+@router.bulk('get')
+def get_many(events, tenant_id):
+    # Ids map to emails through the resolver's cache, then one BatchGetItem per 100
+    fields = {tuple(e.get('fields') or ()) for e in events}
+    wanted = list(fields.pop()) if len(fields) == 1 else None
+    found = resolver.resolve_many(
+        [e.get('employee_id') for e in events], wanted or None, tenant_id=tenant_id
+    )
+    return [only(found.get(e.get('employee_id')), e.get('fields')) for e in events]
+
+@router.operation('list')
+def list_employees(event, tenant_id):
+    return query_tenant(table, tenant_id, **projection_kwargs(event.get('fields')))
+
+@router.operation('update')
+def update(event, tenant_id):
+    employee = find_employee(event.get('employee_id'), tenant_id)
+    if employee is None:
+        raise OperationError(404, 'Employee not found')
+    # The key and tenant attributes are not updatable
+    updates = {
+        k: v for k, v in event.get('updates', {}).items()
+        if k not in ('email', 'tenant_id', 'tenant_shard')
+    }
+    if not updates:
+        raise OperationError(400, 'Nothing to update')
+
+    update_expression = 'SET '
+    expression_values = {}
+
+    for key, value in updates.items():
+        update_expression += f'#{key} = :{key}, '
+        expression_values[f':{key}'] = value
 
-def lambda_handler(event, context):
-    dynamodb = boto3.resource('dynamodb')
-    table = dynamodb.Table('Employees')
-    
     try:
-        operation = event.get('operation')
-        
-        if operation == 'create':
-            employee_data = event.get('employee', {})
-            employee_data['employee_id'] = str(uuid.uuid4())
-            employee_data['created_at'] = datetime.now().isoformat()
-            
-            table.put_item(Item=employee_data)
-            return {
-                'statusCode': 200,
-                'body': json.dumps({
-                    'message': 'Employee created successfully',
-                    'employee_id': employee_data['employee_id']
-                })
-            }
-            
-        elif operation == 'get':
-            employee_id = event.get('employee_id')
-            response = table.get_item(Key={'employee_id': employee_id})
-            return {
-                'statusCode': 200,
-                'body': json.dumps(response.get('Item'))
-            }
-            
-        elif operation == 'list':
-            response = table.scan()
-            return {
-                'statusCode': 200,
-                'body': json.dumps(response.get('Items', []))
-            }
-            
-        elif operation == 'update':
-            employee_id = event.get('employee_id')
-            updates = event.get('updates', {})
-            
-            update_expression = 'SET '
-            expression_values = {}
-            
-            for key, value in updates.items():
-                update_expression += f'#{key} = :{key}, '
-                expression_values[f':{key}'] = value
-            
-            table.update_item(
-                Key={'employee_id': employee_id},
-                UpdateExpression=update_expression[:-2],
-                ExpressionAttributeValues=expression_values,
-                ExpressionAttributeNames={f'#{k}': k for k in updates.keys()}
-            )
-            
-            return {
-                'statusCode': 200,
-                'body': json.dumps({'message': 'Employee updated successfully'})
-            }
-            
-        elif operation == 'delete':
-            employee_id = event.get('employee_id')
-            table.delete_item(Key={'employee_id': employee_id})
-            return {
-                'statusCode': 200,
-                'body': json.dumps({'message': 'Employee deleted successfully'})
-            }
-            
-        else:
-            return {
-                'statusCode': 400,
-                'body': json.dumps({'error': 'Invalid operation'})
-            }
-            
-    except Exception as e:
-        return {
-            'statusCode': 500,
-            'body': json.dumps({'error': str(e)})
-        }
+        table.update_item(
+            Key={'email': employee['email']},
+            UpdateExpression=update_expression[:-2],
+            ExpressionAttributeValues=expression_values,
+            ExpressionAttributeNames={f'#{k}': k for k in updates.keys()},
+            ConditionExpression=Attr('email').exists() & tenant_condition(tenant_id)
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        raise OperationError(404, 'Employee not found')
+
+    return {'message': 'Employee updated successfully'}
+
+@router.operation('delete')
+def delete(event, tenant_id):
+    employee = find_employee(event.get('employee_id'), tenant_id)
+    if employee:
+        resolver.forget(employee['employee_id'])
+        table.delete_item(Key={'email': employee['email']}, ConditionExpression=tenant_condition(tenant_id))
+    return {'message': 'Employee deleted successfully'}
@@ -1,88 +1,122 @@
-import json
-import boto3
-import uuid
+import os
+import sys
 from datetime import datetime
+from boto3.dynamodb.conditions import Attr, Key
+from botocore.exceptions import ClientError
+from common import resilience
+from common.conditions import condition_failed, idempotent_id
+from common.scan import batch_get, query_all
+from common.projection import projection_kwargs, with_projection
+from common.router import OperationError, Router
+from common.tenancy import belongs_to, query_tenant, stamp, tenant_condition
 
-def lambda_handler(event, context):
-    dynamodb = boto3.resource('dynamodb')
-    table = dynamodb.Table('LeaveRequests')
-    
+# Leave rollups are shared with the web app, which owns the holiday calendar they count with
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'web'))
+from leave_reports import REPORT_TABLE, LeaveReports
+
+# Created once per container and shared by every invocation and batch worker
+dynamodb = resilience.dynamodb_resource()
+table = dynamodb.Table('LeaveRequests')
+leave_reports = LeaveReports(dynamodb.Table(REPORT_TABLE))
+router = Router()
+lambda_handler = router.lambda_handler
+
+@router.operation('request')
+def request_leave(event, tenant_id):
+    request_data = dict(event.get('request', {}))
+    # A retry with the same idempotency_key names the same request and is not stored twice
+    request_data['request_id'] = idempotent_id(
+        event.get('idempotency_key'), tenant_id, request_data.get('employee_id'),
+        request_data.get('start_date'), request_data.get('end_date')
+    )
+    request_data['created_at'] = datetime.now().isoformat()
+    request_data['status'] = 'PENDING'
+    stamp('LeaveRequests', request_data, tenant_id)
     try:
-        operation = event.get('operation')
-        
-        if operation == 'request':
-            request_data = event.get('request', {})
-            request_data['request_id'] = str(uuid.uuid4())
-            request_data['created_at'] = datetime.now().isoformat()
-            request_data['status'] = 'PENDING'
-            table.put_item(Item=request_data)
-            return {
-                'statusCode': 200,
-                'body': json.dumps({
-                    'message': 'Leave request submitted successfully',
-                    'request_id': request_data['request_id']
-                })
-            }
-            
-        elif operation == 'get':
-            request_id = event.get('request_id')
-            response = table.get_item(Key={'request_id': request_id})
-            return {
-                'statusCode': 200,
-                'body': json.dumps(response.get('Item'))
-            }
-            
-        elif operation == 'list':
-            employee_id = event.get('employee_id')
-            response = table.scan()
-            requests = response.get('Items', [])
-            if employee_id:
-                requests = [r for r in requests if r.get('employee_id') == employee_id]
-            return {
-                'statusCode': 200,
-                'body': json.dumps(requests)
-            }
-            
-        elif operation == 'update_status':
-            request_id = event.get('request_id')
-            new_status = event.get('status')
-            approved_by = event.get('approved_by')
-            rejected_by = event.get('rejected_by')
-            
-            update_expression = 'SET #status = :status, updated_at = :updated_at'
-            expression_values = {
-                ':status': new_status,
-                ':updated_at': datetime.now().isoformat()
-            }
-            
-            # Add approver/rejecter information if provided
-            if approved_by:
-                update_expression += ', approved_by = :approved_by'
-                expression_values[':approved_by'] = approved_by
-            if rejected_by:
-                update_expression += ', rejected_by = :rejected_by'
-                expression_values[':rejected_by'] = rejected_by
-            
-            table.update_item(
-                Key={'request_id': request_id},
-                UpdateExpression=update_expression,
-                ExpressionAttributeNames={'#status': 'status'},
-                ExpressionAttributeValues=expression_values
-            )
-            
-            return {
-                'statusCode': 200,
-                'body': json.dumps({'message': 'Leave request status updated successfully'})
-            }
-            
-        else:
-            return {
-                'statusCode': 400,
-                'body': json.dumps({'error': 'Invalid operation'})
-            }
-            
-    except Exception as e:
-        return {
-            'statusCode': 500,
-            'body': json.dumps({'error': str(e)})
-        }
+        table.put_item(Item=request_data, ConditionExpression=Attr('request_id').not_exists())
+    except ClientError as e:
+        if not condition_failed(e):
+            raise
+    else:
+        leave_reports.record_committed(None, request_data)
+    return {
+        'message': 'Leave request submitted successfully',
+        'request_id': request_data['request_id']
+    }
+
+@router.operation('get')
+def get(event, tenant_id):
+    response = table.get_item(
+        Key={'request_id': event.get('request_id')},
+        **projection_kwargs(event.get('fields'), required=['tenant_id'])
+    )
+    item = response.get('Item')
+    return item if belongs_to(item, tenant_id) else None
+
+@router.bulk('get')
+def get_many(events, tenant_id):
+    fields = sorted({f for e in events for f in (e.get('fields') or ())}) if all(
+        e.get('fields') for e in events) else None
+    ids = {e.get('request_id') for e in events if e.get('request_id')}
+    found = {
+        item['request_id']: item
+        for item in batch_get(dynamodb, table.name, [{'request_id': i} for i in ids],
+                              **projection_kwargs(fields, required=['request_id', 'tenant_id']))
+    }
+    results = []
+    for e in events:
+        item = found.get(e.get('request_id'))
+        if item is not None and e.get('fields'):
+            item = {k: v for k, v in item.items() if k in e['fields'] or k == 'tenant_id'}
+        results.append(item if belongs_to(item, tenant_id) else None)
+    return results
+
+@router.operation('list')
+def list_requests(event, tenant_id):
+    employee_id = event.get('employee_id')
+    if employee_id:
+        requests = query_all(table, **with_projection(
+            event.get('fields'),
+            required=['tenant_id'],
+            IndexName='EmployeeLeaveIndex',
+            KeyConditionExpression=Key('employee_id').eq(employee_id)
+        ))
+        return [r for r in requests if belongs_to(r, tenant_id)]
+    return query_tenant(table, tenant_id, **projection_kwargs(event.get('fields')))
+
+@router.operation('update_status')
+def update_status(event, tenant_id):
+    approved_by = event.get('approved_by')
+    rejected_by = event.get('rejected_by')
+
+    update_expression = 'SET #status = :status, updated_at = :updated_at'
+    expression_values = {
+        ':status': event.get('status'),
+        ':updated_at': datetime.now().isoformat()
+    }
+
+    # Add approver/rejecter information if provided
+    if approved_by:
+        update_expression += ', approved_by = :approved_by'
+        expression_values[':approved_by'] = approved_by
+    if rejected_by:
+        update_expression += ', rejected_by = :rejected_by'
+        expression_values[':rejected_by'] = rejected_by
+
+    try:
+        previous = table.update_item(
+            Key={'request_id': event.get('request_id')},
+            UpdateExpression=update_expression,
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues=expression_values,
+            ConditionExpression=Attr('request_id').exists() & tenant_condition(tenant_id),
+            ReturnValues='ALL_OLD'  # The previous status decides the rollup change
+        )['Attributes']
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        raise OperationError(404, 'Leave request not found')
+    leave_reports.record_committed(previous, dict(previous, status=expression_values[':status'],
+                                                  updated_at=expression_values[':updated_at']))
+
+    return {'message': 'Leave request status updated successfully'}
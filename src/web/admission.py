@@ -0,0 +1,306 @@
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from functools import wraps
+
+from flask import Response, jsonify, make_response, request, session
+
+
+class Decision:
+    __slots__ = ('allowed', 'retry_after')
+
+    def __init__(self, allowed, retry_after=0):
+        self.allowed = allowed
+        self.retry_after = retry_after
+
+
+class AdmissionMetrics:
+    """Counters for every limiter decision, rendered in Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._decisions = defaultdict(int)
+        self._in_flight = {}
+
+    def record(self, limiter, outcome):
+        with self._lock:
+            self._decisions[(limiter, outcome)] += 1
+
+    def set_in_flight(self, limiter, value):
+        with self._lock:
+            self._in_flight[limiter] = value
+
+    def render(self):
+        with self._lock:
+            lines = [
+                '# HELP hrms_admission_decisions_total Admission decisions by limiter and outcome',
+                '# TYPE hrms_admission_decisions_total counter'
+            ]
+            for (limiter, outcome), count in sorted(self._decisions.items()):
+                lines.append(f'hrms_admission_decisions_total{{limiter="{limiter}",outcome="{outcome}"}} {count}')
+            lines += [
+                '# HELP hrms_admission_in_flight Requests currently holding a concurrency slot',
+                '# TYPE hrms_admission_in_flight gauge'
+            ]
+            for limiter, value in sorted(self._in_flight.items()):
+                lines.append(f'hrms_admission_in_flight{{limiter="{limiter}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = AdmissionMetrics()
+
+
+class TokenBucket:
+    """In-memory token buckets, one per key, refilled at ``rate`` tokens/second.
+
+    Buckets are kept in least recently used order; past ``max_keys`` the
+    oldest go first, which are the ones most likely to have refilled.
+    """
+
+    def __init__(self, rate, burst, max_keys=100000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _decide(self, key, consume):
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            if tokens < 1:
+                return Decision(False, (1 - tokens) / self.rate)
+            if consume:
+                self._buckets[key] = (tokens - 1, now)
+                self._buckets.move_to_end(key)
+                while len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+        return Decision(True)
+
+    def peek(self, key):
+        """Whether ``acquire`` would allow the key now, without taking a token."""
+        return self._decide(key, consume=False)
+
+    def acquire(self, key):
+        return self._decide(key, consume=True)
+
+
+class MemoryWindowBackend:
+    def __init__(self):
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def incr(self, key, window_start, ttl):
+        now = time.time()
+        with self._lock:
+            count, expires_at = self._counts.get((key, window_start), (0, now + ttl))
+            self._counts[(key, window_start)] = (count + 1, expires_at)
+            if len(self._counts) > 100000:
+                for k, (_, exp) in list(self._counts.items()):
+                    if exp < now:
+                        del self._counts[k]
+            return count + 1
+
+    def get(self, key, window_start):
+        with self._lock:
+            return self._counts.get((key, window_start), (0, 0))[0]
+
+
+class DynamoDBWindowBackend:
+    """Window counters shared by every worker through atomic ADD updates."""
+
+    def __init__(self, table):
+        self.table = table
+
+    def incr(self, key, window_start, ttl):
+        response = self.table.update_item(
+            Key={'limiter_key': f'{key}#{window_start}'},
+            UpdateExpression='ADD #c :one SET expires_at = if_not_exists(expires_at, :exp)',
+            ExpressionAttributeNames={'#c': 'count'},
+            ExpressionAttributeValues={':one': 1, ':exp': int(time.time() + ttl)},
+            ReturnValues='UPDATED_NEW'
+        )
+        return int(response['Attributes']['count'])
+
+    def get(self, key, window_start):
+        response = self.table.get_item(
+            Key={'limiter_key': f'{key}#{window_start}'},
+            ProjectionExpression='#c',
+            ExpressionAttributeNames={'#c': 'count'}
+        )
+        return int(response.get('Item', {}).get('count', 0))
+
+
+class SlidingWindowLimiter:
+    """Sliding-window counter: the previous window is weighted by its overlap."""
+
+    def __init__(self, limit, window, backend):
+        self.limit = limit
+        self.window = window
+        self.backend = backend
+
+    def _decide(self, key, consume):
+        now = time.time()
+        window_start = int(now // self.window) * self.window
+        elapsed = (now - window_start) / self.window
+        previous = self.backend.get(key, window_start - self.window)
+        if consume:
+            current = self.backend.incr(key, window_start, self.window * 2)
+        else:
+            current = self.backend.get(key, window_start) + 1
+        estimate = previous * (1 - elapsed) + current
+        if estimate <= self.limit:
+            return Decision(True)
+        return Decision(False, self.window * (1 - elapsed))
+
+    def peek(self, key):
+        """Whether ``acquire`` would allow the key now, without counting a request."""
+        return self._decide(key, consume=False)
+
+    def acquire(self, key):
+        return self._decide(key, consume=True)
+
+
+class ConcurrencyLimiter:
+    """Caps concurrent executions and sheds requests that queue too long."""
+
+    def __init__(self, name, max_concurrent, max_queue_wait):
+        self.name = name
+        self.max_queue_wait = max_queue_wait
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if not self._slots.acquire(timeout=self.max_queue_wait):
+            return False
+        with self._lock:
+            self._in_flight += 1
+            metrics.set_in_flight(self.name, self._in_flight)
+        return True
+
+    def release(self):
+        with self._lock:
+            self._in_flight -= 1
+            metrics.set_in_flight(self.name, self._in_flight)
+        self._slots.release()
+
+
+class TenantConcurrencyLimiter:
+    """One ConcurrencyLimiter per tenant, so a single tenant cannot hold
+    every slot of a shared limiter."""
+
+    def __init__(self, name, max_concurrent, max_queue_wait):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue_wait = max_queue_wait
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def for_tenant(self, tenant_id):
+        with self._lock:
+            limiter = self._limiters.get(tenant_id)
+            if limiter is None:
+                limiter = self._limiters[tenant_id] = ConcurrencyLimiter(
+                    f'{self.name}:{tenant_id}', self.max_concurrent, self.max_queue_wait
+                )
+            return limiter
+
+
+def client_ip():
+    # X-Forwarded-For is only honoured through ProxyFix for trusted proxies
+    return request.remote_addr or 'unknown'
+
+
+def too_many_requests(retry_after):
+    retry_after = max(1, math.ceil(retry_after))
+    if request.accept_mimetypes.best == 'application/json' or request.is_json:
+        response = make_response(jsonify({'status': 'error', 'message': 'Too many requests'}), 429)
+    else:
+        response = make_response('Too many requests, please retry shortly.', 429)
+    response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
+def rate_limited(name, per_ip=None, per_user=None, per_tenant=None, per_form_field=None, methods=None):
+    """Reject requests over their token bucket or sliding window with 429.
+
+    ``per_tenant`` caps a whole company's traffic on top of each user's.
+    ``per_form_field`` is a ``(field, limiter)`` pair, used by /login to limit
+    attempts per target account as well as per client. Every check is
+    peeked first, so a request one limiter rejects costs the others nothing.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if methods is None or request.method in methods:
+                checks = []
+                if per_ip:
+                    checks.append(('ip', per_ip, client_ip()))
+                if per_user and session.get('user_id'):
+                    checks.append(('user', per_user, session['user_id']))
+                if per_tenant and session.get('tenant_id'):
+                    checks.append(('tenant', per_tenant, session['tenant_id']))
+                if per_form_field and request.form.get(per_form_field[0]):
+                    field, limiter = per_form_field
+                    checks.append((field, limiter, request.form[field].strip().lower()))
+
+                for method in ('peek', 'acquire'):
+                    for scope, limiter, key in checks:
+                        decision = getattr(limiter, method)(f'{name}:{scope}:{key}')
+                        if not decision.allowed:
+                            metrics.record(f'{name}:{scope}', 'rejected')
+                            return too_many_requests(decision.retry_after)
+                for scope, _, _ in checks:
+                    metrics.record(f'{name}:{scope}', 'allowed')
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
+
+
+def _release(held):
+    for current in reversed(held):
+        current.release()
+
+
+def concurrency_limited(limiter, per_tenant=None):
+    """Hold a slot of ``limiter`` for the request, and first one of the
+    tenant's share in ``per_tenant`` (a TenantConcurrencyLimiter).
+
+    A streamed response keeps its slots until the body has been sent.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            held = []
+            limiters = [limiter]
+            if per_tenant and session.get('tenant_id'):
+                limiters.insert(0, per_tenant.for_tenant(session['tenant_id']))
+            try:
+                for current in limiters:
+                    if not current.acquire():
+                        metrics.record(current.name, 'shed')
+                        _release(held)
+                        return too_many_requests(current.max_queue_wait)
+                    metrics.record(current.name, 'admitted')
+                    held.append(current)
+                response = f(*args, **kwargs)
+            except BaseException:
+                _release(held)
+                raise
+            if isinstance(response, Response) and response.is_streamed:
+                response.call_on_close(lambda: _release(held))
+            else:
+                _release(held)
+            return response
+        return decorated_function
+    return decorator
+
+
+def window_backend(dynamodb):
+    if os.getenv('RATE_LIMIT_BACKEND', 'memory') == 'dynamodb':
+        return DynamoDBWindowBackend(dynamodb.Table(os.getenv('RATE_LIMIT_TABLE', 'RateLimits')))
+    return MemoryWindowBackend()
@@ -8,122 +8,257 @@ from flask import (
     url_for, 
     flash, 
     send_file, 
-    make_response
+    make_response,
+    Response,
+    stream_with_context,
+    g
 )
 import io
-import boto3
 import json
 import os
+import sys
 from functools import wraps
+from werkzeug.middleware.proxy_fix import ProxyFix
 from werkzeug.utils import secure_filename
 import requests
 from datetime import datetime, date, timedelta
 import uuid
+import time
+import threading
+import atexit
 from dotenv import load_dotenv
 import bcrypt
 from botocore.exceptions import ClientError
 from boto3.dynamodb.conditions import Key, Attr
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.scan import query_all
+from common.projection import projection_kwargs, with_projection
+import exports
+import bulk_documents
+import sessions
+import admission
+from holiday_calendar import get_calendar
+import leave_analytics
+from leave_index import INDEX_TTL, LeaveIndex
+import rendering
+from common.blobs import BLOB_TABLE, BlobStore
+from common.changefeed import ChangeConsumer, StreamPoller
+from common.conditions import condition_failed, failed_item, idempotent_id
+from common.employees import EmployeeResolver
+from common.tenancy import (
+    DEFAULT_TENANT, belongs_to, count_tenant, query_tenant, s3_prefix, stamp, tenant_condition
+)
+from common.single_table import CONVERTERS, SINGLE_TABLE_NAME, SingleTableStore
+from common import resilience
+from common.resilience import CircuitOpenError, describe_error
+from search import SearchIndex
+from document_cache import DocumentCache
+from archive import Archive
+from leave_reports import REPORT_TABLE, LeaveReports
+from audit import AUDIT_DIR, AUDIT_TABLE, AuditLog
+from notifications import OUTBOX_TABLE, Notifier, employee_recipient
+
 load_dotenv()
 
 app = Flask(__name__)
 app.secret_key = os.getenv('FLASK_SECRET_KEY')
 
-# Initialize AWS clients
-dynamodb = boto3.resource('dynamodb', region_name=os.getenv('AWS_REGION'))
-s3_client = boto3.client('s3', region_name=os.getenv('AWS_REGION'))
+# Behind N trusted proxies, take the client address from their X-Forwarded-For
+# entries; without any, the header is client controlled and ignored
+TRUSTED_PROXY_COUNT = int(os.getenv('TRUSTED_PROXY_COUNT', '0'))
+if TRUSTED_PROXY_COUNT:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=TRUSTED_PROXY_COUNT)
 
-# Template Filters
-@app.template_filter('format_date')
-def format_date(date_string):
-    try:
-        date_obj = datetime.fromisoformat(date_string)
-        return date_obj.strftime('%Y-%m-%d %H:%M:%S')
-    except:
-        return date_string
-
-@app.template_filter('time_ago')
-def time_ago(date_string):
-    """Convert a datetime string to a 'time ago' string (e.g., '2 hours ago')"""
-    try:
-        # Parse the ISO format datetime string
-        date_obj = datetime.fromisoformat(date_string)
-        now = datetime.now()
-        diff = now - date_obj
-
-        # Calculate the time difference
-        seconds = diff.total_seconds()
-        minutes = seconds // 60
-        hours = minutes // 60
-        days = diff.days
-
-        # Return appropriate string based on time difference
-        if days > 365:
-            years = days // 365
-            return f"{years} year{'s' if years != 1 else ''} ago"
-        if days > 30:
-            months = days // 30
-            return f"{months} month{'s' if months != 1 else ''} ago"
-        if days > 0:
-            return f"{days} day{'s' if days != 1 else ''} ago"
-        if hours > 0:
-            return f"{int(hours)} hour{'s' if int(hours) != 1 else ''} ago"
-        if minutes > 0:
-            return f"{int(minutes)} minute{'s' if int(minutes) != 1 else ''} ago"
-        return "just now"
-    except Exception as e:
-        print(f"Error in time_ago filter: {e}")
-        return date_string
+# Initialize AWS clients: per-operation retries, per-table/bucket breakers
+dynamodb = resilience.dynamodb_resource(region_name=os.getenv('AWS_REGION'))
+s3_client = resilience.s3_client(region_name=os.getenv('AWS_REGION'))
+
+# Server-side sessions; the cookie only carries a signed session id
+principals = sessions.init_sessions(app, dynamodb)
+
+# Interval index over LeaveRequests for overlap and staffing checks; cached
+# only while the change feed brings in other workers' writes
+leave_index = LeaveIndex(dynamodb.Table('LeaveRequests'),
+                         ttl=INDEX_TTL if os.getenv('CHANGEFEED_ENABLED') == '1' else 0)
+DEPARTMENT_MAX_ABSENT = int(os.getenv('DEPARTMENT_MAX_ABSENT', '0'))
+
+# employee_id -> Employees item, batched through EmployeeIdIndex
+employee_resolver = EmployeeResolver(dynamodb)
+
+# Change feed: keep per-process caches coherent with writes from other workers
+def _on_employee_changes(events):
+    for event in events:
+        for image in (event.old_image, event.new_image):
+            if image and image.get('email'):
+                principals.invalidate(image['email'])
+
+def _on_leave_changes(events):
+    for event in events:
+        image = dict(event.image)
+        if event.event_name == 'REMOVE':
+            image['status'] = 'REMOVED'
+        if image.get('request_id') and image.get('start_date') and image.get('end_date'):
+            leave_index.record(image)
+
+def _on_document_changes(events):
+    for event in events:
+        if event.event_name == 'REMOVE' and event.old_image and event.old_image.get('s3_key'):
+            document_cache.invalidate(event.old_image['s3_key'])
+
+# S3 document bytes for repeated downloads, in memory and on local disk
+document_cache = DocumentCache(s3_client, os.getenv('S3_BUCKET_NAME'))
+
+# Per department, per month leave rollups kept current on every status change
+leave_reports = LeaveReports(dynamodb.Table(REPORT_TABLE))
+
+# Closed leave years and old document metadata, read from S3 on demand
+archive = Archive(s3_client, os.getenv('S3_BUCKET_NAME'))
+
+# Who did what: buffered in memory, flushed in batches by a background thread
+audit_log = AuditLog(dynamodb.Table(AUDIT_TABLE), directory=AUDIT_DIR)
+atexit.register(audit_log.close)
+
+# Document bytes stored once per tenant and content; orphaned blobs collected in the background
+DOCUMENT_DEDUP = os.getenv('DOCUMENT_DEDUP_ENABLED') == '1'
+blob_store = BlobStore(dynamodb.Table(BLOB_TABLE), s3_client, os.getenv('S3_BUCKET_NAME'), background=DOCUMENT_DEDUP)
+atexit.register(blob_store.close)
+
+# Leave notifications: queued in memory here, delivered by notifications.py worker
+notifier = Notifier(dynamodb.Table(OUTBOX_TABLE))
+atexit.register(notifier.close)
+
+# Full-text search over employees and documents, built once then kept current
+search_index = SearchIndex()
+if search_index.is_empty():
+    threading.Thread(target=search_index.rebuild, args=(dynamodb,), daemon=True).start()
+
+change_consumer = ChangeConsumer()
+change_consumer.subscribe('Employees', _on_employee_changes)
+change_consumer.subscribe('LeaveRequests', _on_leave_changes)
+change_consumer.subscribe('Employees', search_index.apply_changes)
+change_consumer.subscribe('Documents', search_index.apply_changes)
+change_consumer.subscribe('Documents', _on_document_changes)
+
+# Optional single-table layout, mirrored from the three tables by the change feed.
+# Without the feed nothing keeps the mirror current, so reads stay on the three tables.
+single_table = None
+if os.getenv('SINGLE_TABLE_ENABLED') == '1' and os.getenv('CHANGEFEED_ENABLED') != '1':
+    print('SINGLE_TABLE_ENABLED needs CHANGEFEED_ENABLED=1 to keep the mirror current; '
+          'reading from the Employees, LeaveRequests and Documents tables instead')
+elif os.getenv('SINGLE_TABLE_ENABLED') == '1':
+    single_table = SingleTableStore(dynamodb.Table(SINGLE_TABLE_NAME))
+    for source_table in CONVERTERS:
+        change_consumer.subscribe(source_table, single_table.apply_changes)
+
+if os.getenv('CHANGEFEED_ENABLED') == '1':
+    StreamPoller(change_consumer, region=os.getenv('AWS_REGION'), start_position='LATEST',
+                 idle_sleep=float(os.getenv('CHANGEFEED_POLL_SECONDS', '1'))).start()
+
+# Admission control: rate limits for login and caps on scan-heavy routes
+login_ip_limiter = admission.TokenBucket(rate=1.0, burst=10)
+login_account_limiter = admission.SlidingWindowLimiter(
+    limit=int(os.getenv('LOGIN_ATTEMPTS_PER_WINDOW', '10')),
+    window=300,
+    backend=admission.window_backend(dynamodb)
+)
+user_limiter = admission.TokenBucket(rate=5.0, burst=30)
+tenant_limiter = admission.TokenBucket(
+    rate=float(os.getenv('TENANT_RATE_LIMIT', '50')),
+    burst=int(os.getenv('TENANT_RATE_BURST', '200'))
+)
+scan_limiter = admission.ConcurrencyLimiter(
+    'scan_routes',
+    max_concurrent=int(os.getenv('SCAN_ROUTE_CONCURRENCY', '4')),
+    max_queue_wait=float(os.getenv('SCAN_ROUTE_MAX_WAIT', '2.0'))
+)
+# Share of the scan slots one tenant may hold, so a busy company leaves room for the others
+tenant_scan_limiter = admission.TenantConcurrencyLimiter(
+    'scan_routes_tenant',
+    max_concurrent=int(os.getenv('SCAN_ROUTE_TENANT_CONCURRENCY', '2')),
+    max_queue_wait=float(os.getenv('SCAN_ROUTE_MAX_WAIT', '2.0'))
+)
+
+# Attributes each view reads, applied as ProjectionExpression
+EMPLOYEE_LIST_FIELDS = ['email', 'employee_id', 'name', 'department', 'position', 'is_admin', 'is_super_admin',
+                        'created_at', 'updated_at']
+EMPLOYEE_DETAIL_FIELDS = ['employee_id', 'email', 'name', 'department', 'position']
+EMPLOYEE_STATS_FIELDS = ['department', 'role']
+LEAVE_LIST_FIELDS = ['request_id', 'employee_id', 'employee_name', 'start_date', 'end_date',
+                     'days_requested', 'reason', 'status', 'created_at', 'updated_at']
+LEAVE_ACTIVITY_FIELDS = ['status', 'created_at', 'start_date', 'end_date']
+LEAVE_BALANCE_FIELDS = ['start_date', 'end_date']
+DOCUMENT_LIST_FIELDS = ['document_id', 'employee_id', 'employee_name', 'filename',
+                        'description', 'created_at', 'is_public']
+DOCUMENT_ACTIVITY_FIELDS = ['filename', 'created_at']
+
+# Template filters and fragment caching
+rendering.init_rendering(app)
 
 # Context processor for date
 @app.context_processor
 def inject_today():
-    return {'today': date.today()}
+    # Forms carry a fresh idempotency key so a resubmitted POST is recognised
+    return {'today': date.today(), 'idempotency_key': uuid.uuid4().hex}
 
 def get_upcoming_holidays():
     today = date.today()
-    current_year = today.year
-    next_year = current_year + 1
-    
-    holidays = [
-        # Current Year Holidays
-        {'name': 'Republic Day', 'date': date(current_year, 1, 26)},
-        {'name': 'Good Friday', 'date': date(current_year, 3, 29)},
-        {'name': 'Eid al-Fitr', 'date': date(current_year, 4, 11)},
-        {'name': 'Independence Day', 'date': date(current_year, 8, 15)},
-        {'name': 'Gandhi Jayanti', 'date': date(current_year, 10, 2)},
-        {'name': 'Diwali', 'date': date(current_year, 11, 1)},
-        {'name': 'Christmas Day', 'date': date(current_year, 12, 25)},
-        # Next Year Holidays
-        {'name': "New Year's Day", 'date': date(next_year, 1, 1)},
+    return [
+        {
+            'name': name,
+            'date': holiday_date.strftime('%B %d, %Y'),
+            'days_left': (holiday_date - today).days
+        }
+        for holiday_date, name in get_calendar().next_holidays(today, 4)
     ]
-    
-    upcoming = []
-    for holiday in holidays:
-        days_left = (holiday['date'] - today).days
-        if days_left >= 0:
-            upcoming.append({
-                'name': holiday['name'],
-                'date': holiday['date'].strftime('%B %d, %Y'),
-                'days_left': days_left
-            })
-    
-    return sorted(upcoming, key=lambda x: x['days_left'])[:4]
+
+def leave_days(start_date, end_date):
+    """Working days in an inclusive leave range, excluding weekends and holidays"""
+    return get_calendar().working_days(
+        date.fromisoformat(start_date),
+        date.fromisoformat(end_date)
+    )
+
+def _leave_duration(leave_req):
+    try:
+        return f"{leave_days(leave_req['start_date'], leave_req['end_date'])} days"
+    except (KeyError, ValueError) as e:
+        print(f"Error calculating duration: {e}")
+        return "Duration not available"
+
+# Durations are computed once per leave request version, not per render
+leave_durations = rendering.DisplayFields(_leave_duration)
+
+def current_tenant():
+    return session.get('tenant_id', DEFAULT_TENANT)
+
+def request_idempotency_key():
+    return request.headers.get('Idempotency-Key') or request.form.get('idempotency_key')
+
+def audit(action, target_type, target_id, **details):
+    audit_log.record(action, session.get('email'), target_type, target_id, current_tenant(), **details)
+
+def notify_decision(kind, leave_request):
+    notifier.enqueue(kind, current_tenant(), employee_recipient(leave_request['employee_id']), {
+        'request_id': leave_request['request_id'],
+        'start_date': leave_request.get('start_date'),
+        'end_date': leave_request.get('end_date'),
+        'decided_by': session.get('email')
+    })
 
 def get_employee_stats():
     try:
         table = dynamodb.Table('Employees')
-        response = table.scan()
-        employees = response.get('Items', [])
         
         stats = {
-            'total_count': len(employees),
+            'total_count': 0,
             'departments': {},
             'roles': {},
             'admin_count': 0
         }
         
-        for emp in employees:
+        for emp in query_tenant(table, current_tenant(), **projection_kwargs(EMPLOYEE_STATS_FIELDS)):
+            stats['total_count'] += 1
             dept = emp.get('department', 'Other')
             stats['departments'][dept] = stats['departments'].get(dept, 0) + 1
             
@@ -138,25 +273,28 @@ def get_employee_stats():
         print(f"Error getting employee stats: {e}")
         return None
 
+def leave_balance_from(leave_requests):
+    return 30 - sum(
+        leave_days(req['start_date'], req['end_date'])
+        for req in leave_requests if req.get('status') == 'APPROVED'
+    )
+
 def get_leave_balance(employee_id):
     try:
         table = dynamodb.Table('LeaveRequests')
-        response = table.scan(
-            FilterExpression='employee_id = :eid AND #status = :status',
+        items = query_all(table, **with_projection(
+            LEAVE_BALANCE_FIELDS,
+            IndexName='EmployeeLeaveIndex',
+            KeyConditionExpression='employee_id = :eid',
+            FilterExpression='#status = :status',
             ExpressionAttributeNames={'#status': 'status'},
             ExpressionAttributeValues={
                 ':eid': employee_id,
                 ':status': 'APPROVED'
             }
-        )
-        
-        total_days_taken = sum(
-            (datetime.strptime(req['end_date'], '%Y-%m-%d') - 
-             datetime.strptime(req['start_date'], '%Y-%m-%d')).days + 1
-            for req in response.get('Items', [])
-        )
+        ))
         
-        return 30 - total_days_taken
+        return leave_balance_from(items)
     except Exception as e:
         print(f"Error calculating leave balance: {e}")
         return 0
@@ -167,6 +305,12 @@ def hash_password(password):
 def check_password(password, hashed):
     return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
 
+@app.errorhandler(CircuitOpenError)
+def dependency_unavailable(e):
+    response = make_response(describe_error(e), 503)
+    response.headers['Retry-After'] = str(int(e.retry_after))
+    return response
+
 # Decorators
 def login_required(f):
     @wraps(f)
@@ -203,6 +347,8 @@ def index():
     return redirect(url_for('login'))
 
 @app.route('/login', methods=['GET', 'POST'])
+@admission.rate_limited('login', per_ip=login_ip_limiter,
+                        per_form_field=('email', login_account_limiter), methods=['POST'])
 def login():
     if request.method == 'POST':
         email = request.form['email']
@@ -215,24 +361,14 @@ def login():
             if 'Item' in response:
                 employee = response['Item']
                 if check_password(password, employee['password']):
-                    session['user_id'] = employee['employee_id']
-                    session['user_name'] = employee['name']
-                    session['email'] = employee['email']
-                    session['department'] = employee.get('department', 'General')
-                    session['position'] = employee.get('position', 'Employee')
-                    # Update role handling
-                    if employee.get('is_super_admin'):
-                        session['role'] = 'super_admin'
-                    elif employee.get('is_admin'):
-                        session['role'] = 'admin'
-                    else:
-                        session['role'] = 'employee'
+                    # Identity and role are served from the principal cache
+                    session.login(employee)
                     flash('Login successful!', 'success')
                     return redirect(url_for('dashboard'))
             
             flash('Invalid email or password', 'error')
         except Exception as e:
-            flash(f'Login error: {str(e)}', 'error')
+            flash(f'Login error: {describe_error(e)}', 'error')
         
     return render_template('login.html')
 
@@ -244,37 +380,57 @@ def logout():
 
 @app.route('/dashboard')
 @login_required
+@admission.rate_limited('dashboard', per_user=user_limiter, per_tenant=tenant_limiter)
+@admission.concurrency_limited(scan_limiter, per_tenant=tenant_scan_limiter)
 def dashboard():
     try:
         stats = {}
         
+        # One Query for the employee's leave and documents in the single table
+        overview = None
+        if single_table and not session.get('is_admin'):
+            overview = single_table.employee_overview(session['user_id'])
+        
         # Get document count
-        doc_table = dynamodb.Table('Documents')
-        doc_response = doc_table.scan(
-            FilterExpression='employee_id = :eid',
-            ExpressionAttributeValues={':eid': session['user_id']}
-        ) if not session.get('is_admin') else doc_table.scan()
-        stats['documents_count'] = len(doc_response.get('Items', []))
+        if overview:
+            documents_list = overview['documents']
+        else:
+            doc_table = dynamodb.Table('Documents')
+            if session.get('is_admin'):
+                documents_list = query_tenant(doc_table, current_tenant(), **projection_kwargs(DOCUMENT_ACTIVITY_FIELDS))
+            else:
+                documents_list = query_all(doc_table, **with_projection(
+                    DOCUMENT_ACTIVITY_FIELDS,
+                    IndexName='EmployeeDocumentIndex',
+                    KeyConditionExpression='employee_id = :eid',
+                    ExpressionAttributeValues={':eid': session['user_id']}
+                ))
+        stats['documents_count'] = len(documents_list)
         
         # Get employee count (admin only)
         if session.get('is_admin'):
-            emp_table = dynamodb.Table('Employees')
-            emp_response = emp_table.scan()
-            stats['employees_count'] = len(emp_response.get('Items', []))
+            stats['employees_count'] = count_tenant(dynamodb.Table('Employees'), current_tenant())
         
         # Get leave balance
-        stats['leave_balance'] = get_leave_balance(session['user_id'])
+        if overview:
+            stats['leave_balance'] = leave_balance_from(overview['leave_requests'])
+        else:
+            stats['leave_balance'] = get_leave_balance(session['user_id'])
         
         # Get recent activity
         activity = []
         
         # Get recent leave requests
-        leave_table = dynamodb.Table('LeaveRequests')
-        leave_response = leave_table.scan(
-            FilterExpression='employee_id = :eid',
-            ExpressionAttributeValues={':eid': session['user_id']}
-        )
-        for item in leave_response.get('Items', []):
+        if overview:
+            leave_items = overview['leave_requests']
+        else:
+            leave_items = query_all(dynamodb.Table('LeaveRequests'), **with_projection(
+                LEAVE_ACTIVITY_FIELDS,
+                IndexName='EmployeeLeaveIndex',
+                KeyConditionExpression='employee_id = :eid',
+                ExpressionAttributeValues={':eid': session['user_id']}
+            ))
+        for item in leave_items:
             activity.append({
                 'type': 'leave_request',
                 'status': item['status'],
@@ -283,7 +439,7 @@ def dashboard():
             })
             
         # Get recent document uploads
-        for doc in doc_response.get('Items', []):
+        for doc in documents_list:
             activity.append({
                 'type': 'document',
                 'date': doc['created_at'],
@@ -303,7 +459,7 @@ def dashboard():
                            stats=stats)
                            
     except Exception as e:
-        flash(f'Error loading dashboard: {str(e)}', 'error')
+        flash(f'Error loading dashboard: {describe_error(e)}', 'error')
         return render_template('dashboard.html',
                            user_name=session.get('user_name'),
                            is_admin=session.get('is_admin', False))
@@ -311,6 +467,8 @@ def dashboard():
 @app.route('/employees', methods=['GET', 'POST'])
 @login_required
 @admin_required
+@admission.rate_limited('employees', per_user=user_limiter, per_tenant=tenant_limiter)
+@admission.concurrency_limited(scan_limiter, per_tenant=tenant_scan_limiter)
 def employees():
     table = dynamodb.Table('Employees')
     
@@ -323,15 +481,9 @@ def employees():
                 flash('Only Super Admins can create admin accounts', 'error')
                 return redirect(url_for('employees'))
 
-            # Check if email exists
-            response = table.get_item(Key={'email': email})
-            if 'Item' in response:
-                flash('Email already exists', 'error')
-                return redirect(url_for('employees'))
-            
             employee_data = {
                 'email': email,
-                'employee_id': str(uuid.uuid4()),
+                'employee_id': idempotent_id(request_idempotency_key(), current_tenant(), session['email'], email),
                 'name': request.form['name'],
                 'password': hash_password(request.form['password']).decode('utf-8'),
                 'department': request.form['department'],
@@ -341,16 +493,34 @@ def employees():
                 'created_at': datetime.now().isoformat(),
                 'created_by': session['email']
             }
+            stamp('Employees', employee_data, current_tenant())
             
-            table.put_item(Item=employee_data)
+            # The condition replaces the existence check: one round trip, no race
+            try:
+                table.put_item(
+                    Item=employee_data,
+                    ConditionExpression=Attr('email').not_exists(),
+                    ReturnValuesOnConditionCheckFailure='ALL_OLD'
+                )
+            except ClientError as e:
+                if not condition_failed(e):
+                    raise
+                existing = failed_item(e) or {}
+                if existing.get('employee_id') != employee_data['employee_id']:
+                    flash('Email already exists', 'error')
+                    return redirect(url_for('employees'))
+                # Same idempotency key: this form was already submitted
+            else:
+                search_index.index_employee(employee_data)
+                audit('employee.create', 'employee', email, is_admin=employee_data['is_admin'],
+                      is_super_admin=employee_data['is_super_admin'])
             flash('Employee added successfully', 'success')
         except Exception as e:
-            flash(f'Error adding employee: {str(e)}', 'error')
+            flash(f'Error adding employee: {describe_error(e)}', 'error')
         
     # Retrieve all employees from DynamoDB
     try:
-        response = table.scan()
-        employees_list = response.get('Items', [])
+        employees_list = query_tenant(table, current_tenant(), **projection_kwargs(EMPLOYEE_LIST_FIELDS))
         
         # Process each employee to set their role
         for emp in employees_list:
@@ -368,7 +538,7 @@ def employees():
         ))
         
     except Exception as e:
-        flash(f'Error retrieving employees: {str(e)}', 'error')
+        flash(f'Error retrieving employees: {describe_error(e)}', 'error')
         employees_list = []
     
     return render_template('employees/list.html', 
@@ -399,6 +569,11 @@ def edit_employee(email):
                     expr_values[f':{field}'] = request.form[field]
                     expr_names[placeholder] = field
             
+            # Version stamp used by the employee list fragment cache
+            update_expr.append('#ua = :updated_at')
+            expr_values[':updated_at'] = datetime.now().isoformat()
+            expr_names['#ua'] = 'updated_at'
+            
             # Handle admin status updates
             if session.get('role') == 'super_admin':
                 is_admin = request.form.get('is_admin') == 'on'
@@ -421,25 +596,53 @@ def edit_employee(email):
                 expr_values[':password'] = hashed_password
                 expr_names['#pw'] = 'password'
             
-            update_expression = ' , '.join(update_expr)
+            update_expression = 'SET ' + ', '.join(update_expr[1:])
             
-            table.update_item(
-                Key={'email': email},
-                UpdateExpression=update_expression,
-                ExpressionAttributeValues=expr_values,
-                ExpressionAttributeNames=expr_names
+            try:
+                response = table.update_item(
+                    Key={'email': email},
+                    UpdateExpression=update_expression,
+                    ExpressionAttributeValues=expr_values,
+                    ExpressionAttributeNames=expr_names,
+                    ConditionExpression=Attr('email').exists() & tenant_condition(current_tenant()),
+                    ReturnValues='ALL_OLD'  # The audit record needs the previous role
+                )
+            except ClientError as e:
+                if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                    return jsonify({'status': 'error', 'message': 'Employee not found'}), 404
+                raise
+            previous = response['Attributes']
+            updated = dict(previous, **{
+                expr_names[name]: expr_values[value]
+                for name, value in (part.split(' = ') for part in update_expr[1:])
+            })
+            principals.invalidate(email)
+            search_index.index_employee(updated)
+            changed = sorted(
+                field for field in ('name', 'department', 'position', 'password')
+                if updated.get(field) != previous.get(field)
             )
+            if changed:
+                audit('employee.update', 'employee', email, fields=changed)
+            role_fields = ('is_admin', 'is_super_admin')
+            if any(bool(updated.get(f)) != bool(previous.get(f)) for f in role_fields):
+                audit('employee.role_change', 'employee', email,
+                      before={f: bool(previous.get(f)) for f in role_fields},
+                      after={f: bool(updated.get(f)) for f in role_fields})
             
             flash('Employee updated successfully', 'success')
             return jsonify({'status': 'success'})
             
         except Exception as e:
-            flash(f'Error updating employee: {str(e)}', 'error')
-            return jsonify({'status': 'error', 'message': str(e)}), 500
+            flash(f'Error updating employee: {describe_error(e)}', 'error')
+            return jsonify({'status': 'error', 'message': describe_error(e)}), 500
     
     try:
-        response = table.get_item(Key={'email': email})
-        if 'Item' in response:
+        response = table.get_item(
+            Key={'email': email},
+            **projection_kwargs(['name', 'email', 'department', 'position', 'is_admin', 'is_super_admin', 'tenant_id'])
+        )
+        if belongs_to(response.get('Item'), current_tenant()):
             return jsonify({
                 'status': 'success',
                 'employee': {
@@ -453,7 +656,7 @@ def edit_employee(email):
             })
         return jsonify({'status': 'error', 'message': 'Employee not found'}), 404
     except Exception as e:
-        return jsonify({'status': 'error', 'message': str(e)}), 500
+        return jsonify({'status': 'error', 'message': describe_error(e)}), 500
 
 @app.route('/employees/delete/<email>', methods=['POST'])
 @login_required
@@ -464,32 +667,33 @@ def delete_employee(email):
         
     try:
         table = dynamodb.Table('Employees')
-        response = table.get_item(Key={'email': email})
-        
-        if 'Item' not in response:
-            return jsonify({'status': 'error', 'message': 'Employee not found'}), 404
-            
+        condition = Attr('email').exists() & tenant_condition(current_tenant())
         # Only super admin can delete admins
-        if response['Item'].get('is_admin') and session.get('role') != 'super_admin':
+        if session.get('role') != 'super_admin':
+            condition = condition & (Attr('is_admin').not_exists() | Attr('is_admin').eq(False))
+        try:
+            response = table.delete_item(
+                Key={'email': email},
+                ConditionExpression=condition,
+                ReturnValues='ALL_OLD',
+                ReturnValuesOnConditionCheckFailure='ALL_OLD'
+            )
+        except ClientError as e:
+            if not condition_failed(e):
+                raise
+            if not belongs_to(failed_item(e), current_tenant()):
+                return jsonify({'status': 'error', 'message': 'Employee not found'}), 404
             return jsonify({'status': 'error', 'message': 'Only super admin can delete administrators'}), 403
             
-        table.delete_item(Key={'email': email})
+        principals.invalidate(email)
+        search_index.remove('employee', email)
+        audit('employee.delete', 'employee', email, is_admin=bool(response['Attributes'].get('is_admin')))
         flash('Employee deleted successfully', 'success')
         return jsonify({'status': 'success'})
         
     except Exception as e:
-        flash(f'Error deleting employee: {str(e)}', 'error')
-        return jsonify({'status': 'error', 'message': str(e)}), 500
-        
-    # Retrieve all employees from DynamoDB
-    try:
-        response = table.scan()
-        employees_list = response.get('Items', [])
-    except Exception as e:
-        flash(f'Error retrieving employees: {str(e)}', 'error')
-        employees_list = []
-    
-    return render_template('employees/list.html', employees=employees_list)
+        flash(f'Error deleting employee: {describe_error(e)}', 'error')
+        return jsonify({'status': 'error', 'message': describe_error(e)}), 500
 
 @app.route('/leave-requests', methods=['GET', 'POST'])
 @login_required
@@ -501,19 +705,39 @@ def leave_requests():
     
     if request.method == 'POST':
         try:
-            start_date = datetime.strptime(request.form['start_date'], '%Y-%m-%d')
-            end_date = datetime.strptime(request.form['end_date'], '%Y-%m-%d')
-            days_count = (end_date - start_date).days + 1
+            days_count = leave_days(request.form['start_date'], request.form['end_date'])
+            if days_count <= 0:
+                flash('The selected dates contain no working days.', 'error')
+                return redirect(url_for('leave_requests'))
             
             current_balance = get_leave_balance(session['user_id'])
             if days_count > current_balance:
                 flash(f'Insufficient leave balance. You have {current_balance} days remaining.', 'error')
                 return redirect(url_for('leave_requests'))
             
+            request_id = idempotent_id(request_idempotency_key(), current_tenant(), session['user_id'],
+                                       request.form['start_date'], request.form['end_date'])
+            conflicts = leave_index.employee_conflicts(session['user_id'], request.form['start_date'],
+                                                       request.form['end_date'])
+            if conflicts and set(conflicts) == {request_id}:
+                # A retry of a submission that already went through
+                flash('Leave request submitted successfully', 'success')
+                return redirect(url_for('leave_requests'))
+            if conflicts:
+                flash('You already have a pending or approved leave request overlapping these dates.', 'error')
+                return redirect(url_for('leave_requests'))
+            
+            if DEPARTMENT_MAX_ABSENT:
+                peak = leave_index.department_peak(session['department'], request.form['start_date'],
+                                                   request.form['end_date'], current_tenant())
+                if peak >= DEPARTMENT_MAX_ABSENT:
+                    flash(f'Note: {peak} people in {session["department"]} are already off during these dates.', 'error')
+            
             leave_data = {
-                'request_id': str(uuid.uuid4()),
+                'request_id': request_id,
                 'employee_id': session['user_id'],
                 'employee_name': session['user_name'],
+                'department': session['department'],
                 'start_date': request.form['start_date'],
                 'end_date': request.form['end_date'],
                 'days_requested': days_count,
@@ -521,51 +745,79 @@ def leave_requests():
                 'status': 'PENDING_ADMIN' if session.get('is_admin') else 'PENDING',
                 'created_at': datetime.now().isoformat()
             }
+            stamp('LeaveRequests', leave_data, current_tenant())
             
-            table.put_item(Item=leave_data)
+            try:
+                table.put_item(Item=leave_data, ConditionExpression=Attr('request_id').not_exists())
+            except ClientError as e:
+                # Same idempotency key as a submission still in flight: nothing more to do
+                if not condition_failed(e):
+                    raise
+            else:
+                leave_index.record(leave_data)
+                leave_reports.record_committed(None, leave_data)
+                # Admin leave goes to super admins, everyone else's to all admins
+                notifier.enqueue(
+                    'leave.submitted', current_tenant(),
+                    'super_admins' if leave_data['status'] == 'PENDING_ADMIN' else 'admins',
+                    {k: leave_data[k] for k in ('request_id', 'employee_name', 'start_date', 'end_date')}
+                )
             flash('Leave request submitted successfully', 'success')
         except Exception as e:
-            flash(f'Error submitting leave request: {str(e)}', 'error')
+            flash(f'Error submitting leave request: {describe_error(e)}', 'error')
         
         return redirect(url_for('leave_requests'))
     
+    year = request.args.get('year', type=int)
     try:
-        response = table.scan(
-            FilterExpression='employee_id = :eid',
-            ExpressionAttributeValues={':eid': session['user_id']}
-        )
-        requests_list = response.get('Items', [])
+        archive_years = archive.years('leave_requests', current_tenant())
+        if year in archive_years:
+            requests_list = archive.read('leave_requests', year, session['user_id'], current_tenant())
+        else:
+            year = None
+            requests_list = query_all(table, **with_projection(
+                LEAVE_LIST_FIELDS,
+                IndexName='EmployeeLeaveIndex',
+                KeyConditionExpression='employee_id = :eid',
+                ExpressionAttributeValues={':eid': session['user_id']}
+            ))
         requests_list.sort(key=lambda x: x['created_at'], reverse=True)
     except Exception as e:
-        flash(f'Error retrieving leave requests: {str(e)}', 'error')
-        requests_list = []
+        flash(f'Error retrieving leave requests: {describe_error(e)}', 'error')
+        requests_list, archive_years = [], []
     
     return render_template('leave/list.html',
                          requests=requests_list,
-                         leave_balance=get_leave_balance(session['user_id']))
+                         leave_balance=get_leave_balance(session['user_id']),
+                         archive_years=archive_years,
+                         archive_year=year)
 
 
 
 @app.route('/admin/leave-requests', methods=['GET', 'POST'])
 @login_required
 @admin_required
+@admission.rate_limited('admin_leave_requests', per_user=user_limiter, per_tenant=tenant_limiter)
+@admission.concurrency_limited(scan_limiter, per_tenant=tenant_scan_limiter)
 def admin_leave_requests():
     from flask import request
     table = dynamodb.Table('LeaveRequests')
-    employees_table = dynamodb.Table('Employees')
 
     try:
-        # Get all employees first
-        emp_response = employees_table.scan()
-        employees_dict = {}
-        for emp in emp_response.get('Items', []):
-            # Store by both email and employee_id
-            employees_dict[emp.get('email')] = emp
-            employees_dict[emp.get('employee_id', '')] = emp
-
-        # Get leave requests
-        response = table.scan()
-        leave_requests = response.get('Items', [])
+        # Get leave requests, from the archive for a closed year
+        year = request.args.get('year', type=int)
+        archive_years = archive.years('leave_requests', current_tenant())
+        if year in archive_years:
+            leave_requests = archive.read('leave_requests', year, tenant_id=current_tenant())
+        else:
+            year = None
+            leave_requests = query_tenant(table, current_tenant())
+
+        # Details of just the employees these requests belong to
+        employees_dict = employee_resolver.resolve_many(
+            {leave_req.get('employee_id') for leave_req in leave_requests},
+            EMPLOYEE_DETAIL_FIELDS, memo=g.setdefault('employee_memo', {}), tenant_id=current_tenant()
+        )
 
         pending_count = 0
         approved_count = 0
@@ -581,15 +833,7 @@ def admin_leave_requests():
             leave_req['position'] = employee.get('position', 'Position Not Available')
             leave_req['employee_email'] = employee.get('email', employee_id)
 
-            # Calculate days
-            try:
-                start_date = datetime.strptime(leave_req['start_date'], '%Y-%m-%d')
-                end_date = datetime.strptime(leave_req['end_date'], '%Y-%m-%d')
-                days = (end_date - start_date).days + 1
-                leave_req['duration'] = f"{days} days"
-            except Exception as e:
-                print(f"Error calculating duration: {e}")
-                leave_req['duration'] = "Duration not available"
+            leave_req['duration'] = leave_durations.get(leave_req.get('request_id'), leave_req)
 
             # Update counts
             if leave_req.get('status') == 'PENDING':
@@ -609,7 +853,9 @@ def admin_leave_requests():
                              requests=leave_requests,
                              pending_count=pending_count,
                              approved_count=approved_count,
-                             leave_balance=leave_balance)
+                             leave_balance=leave_balance,
+                             archive_years=archive_years,
+                             archive_year=year)
 
     except Exception as e:
         print(f"Error in admin_leave_requests: {e}")
@@ -620,48 +866,96 @@ def admin_leave_requests():
                              approved_count=0,
                              leave_balance=0)
 
+def decidable_condition():
+    """Only this tenant's pending requests can be decided; PENDING_ADMIN needs a super admin."""
+    statuses = ['PENDING', 'PENDING_ADMIN'] if session.get('role') == 'super_admin' else ['PENDING']
+    return Attr('request_id').exists() & tenant_condition(current_tenant()) & Attr('status').is_in(statuses)
+
+def decision_refused(error, verb):
+    """Response for a status change whose condition failed, from the item it returned."""
+    item = failed_item(error)
+    if not belongs_to(item, current_tenant()):
+        return jsonify({'status': 'error', 'message': 'Leave request not found'}), 404
+    if item.get('status') == 'PENDING_ADMIN':
+        return jsonify({'status': 'error', 'message': f'Only Super Admin can {verb} admin leave requests'}), 403
+    return jsonify({
+        'status': 'error',
+        'message': f"Leave request is already {str(item.get('status', '')).lower()}",
+        'conflict': 'already_decided'
+    }), 409
+
 @app.route('/leave-requests/approve/<request_id>', methods=['POST'])
 @login_required
 @admin_required
 def approve_leave(request_id):
     try:
         table = dynamodb.Table('LeaveRequests')
+        force = request.args.get('force') == 'true'
         
-        # Get the leave request
-        response = table.get_item(Key={'request_id': request_id})
-        if 'Item' not in response:
-            return jsonify({'status': 'error', 'message': 'Leave request not found'}), 404
+        # A super admin approving without a staffing check needs nothing from
+        # the item, so the conditional update below is the only round trip
+        if session.get('role') != 'super_admin' or (DEPARTMENT_MAX_ABSENT and not force):
+            response = table.get_item(Key={'request_id': request_id})
+            if not belongs_to(response.get('Item'), current_tenant()):
+                return jsonify({'status': 'error', 'message': 'Leave request not found'}), 404
+                
+            leave_request = response['Item']
+            
+            # Check if admin can approve
+            if session.get('role') != 'super_admin':
+                employee = employee_resolver.resolve(
+                    leave_request['employee_id'], ['is_admin'], memo=g.setdefault('employee_memo', {}),
+                    tenant_id=current_tenant()
+                )
+                if employee.get('is_admin'):
+                    return jsonify({'status': 'error', 'message': 'Only Super Admin can approve admin leave requests'}), 403
             
-        leave_request = response['Item']
+            # Check department staffing unless the admin explicitly overrides
+            if DEPARTMENT_MAX_ABSENT and leave_request.get('department') and not force:
+                peak = leave_index.department_peak(
+                    leave_request['department'], leave_request['start_date'], leave_request['end_date'],
+                    current_tenant()
+                )
+                if peak + 1 > DEPARTMENT_MAX_ABSENT:
+                    return jsonify({
+                        'status': 'error',
+                        'message': f"{peak} people in {leave_request['department']} are already off on some of these days",
+                        'conflict': 'department_staffing'
+                    }), 409
         
-        # Check if admin can approve
-        if session.get('role') != 'super_admin':
-            emp_table = dynamodb.Table('Employees')
-            emp_response = emp_table.get_item(
-                Key={'email': leave_request['employee_id']}  # Note: Using email as the key
+        # Update the leave request status; the condition settles races between admins
+        changes = {
+            'status': 'APPROVED',
+            'updated_at': datetime.now().isoformat(),
+            'approved_by': session.get('email')
+        }
+        try:
+            response = table.update_item(
+                Key={'request_id': request_id},
+                UpdateExpression='SET #status = :status, updated_at = :updated_at, approved_by = :approved_by',
+                ExpressionAttributeNames={'#status': 'status'},
+                ExpressionAttributeValues={f':{k}': v for k, v in changes.items()},
+                ConditionExpression=decidable_condition(),
+                ReturnValues='ALL_OLD',  # The previous status decides the rollup change
+                ReturnValuesOnConditionCheckFailure='ALL_OLD'
             )
-            if 'Item' in emp_response and emp_response['Item'].get('is_admin'):
-                return jsonify({'status': 'error', 'message': 'Only Super Admin can approve admin leave requests'}), 403
-        
-        # Update the leave request status
-        table.update_item(
-            Key={'request_id': request_id},
-            UpdateExpression='SET #status = :status, updated_at = :updated_at, approved_by = :approved_by',
-            ExpressionAttributeNames={'#status': 'status'},
-            ExpressionAttributeValues={
-                ':status': 'APPROVED',
-                ':updated_at': datetime.now().isoformat(),
-                ':approved_by': session.get('email')
-            },
-            ReturnValues='ALL_NEW'  # This will return the updated item
-        )
+        except ClientError as e:
+            if not condition_failed(e):
+                raise
+            return decision_refused(e, 'approve')
+        previous = response['Attributes']
+        leave_index.record(dict(previous, **changes))
+        leave_reports.record_committed(previous, dict(previous, **changes))
+        audit('leave.approve', 'leave_request', request_id, employee_id=previous.get('employee_id'),
+              previous_status=previous.get('status'), forced=force)
+        notify_decision('leave.approved', previous)
         
         flash('Leave request approved successfully', 'success')
         return jsonify({'status': 'success'})
         
     except Exception as e:
-        flash(f'Error approving leave request: {str(e)}', 'error')
-        return jsonify({'status': 'error', 'message': str(e)}), 500
+        flash(f'Error approving leave request: {describe_error(e)}', 'error')
+        return jsonify({'status': 'error', 'message': describe_error(e)}), 500
 
 @app.route('/leave-requests/reject/<request_id>', methods=['POST'])
 @login_required
@@ -669,26 +963,221 @@ def approve_leave(request_id):
 def reject_leave(request_id):
     try:
         table = dynamodb.Table('LeaveRequests')
-        table.update_item(
+        changes = {
+            'status': 'REJECTED',
+            'updated_at': datetime.now().isoformat(),
+            'rejected_by': session['email']
+        }
+        response = table.update_item(
             Key={'request_id': request_id},
             UpdateExpression='SET #status = :status, updated_at = :updated_at, rejected_by = :rejected_by',
             ExpressionAttributeNames={'#status': 'status'},
-            ExpressionAttributeValues={
-                ':status': 'REJECTED',
-                ':updated_at': datetime.now().isoformat(),
-                ':rejected_by': session['email']
-            }
+            ExpressionAttributeValues={f':{k}': v for k, v in changes.items()},
+            ConditionExpression=decidable_condition(),
+            ReturnValues='ALL_OLD',
+            ReturnValuesOnConditionCheckFailure='ALL_OLD'
         )
+        previous = response['Attributes']
+        leave_index.record(dict(previous, **changes))
+        leave_reports.record_committed(previous, dict(previous, **changes))
+        audit('leave.reject', 'leave_request', request_id, employee_id=previous.get('employee_id'),
+              previous_status=previous.get('status'))
+        notify_decision('leave.rejected', previous)
         flash('Leave request rejected successfully', 'success')
         return jsonify({'status': 'success'})
+    except ClientError as e:
+        if condition_failed(e):
+            return decision_refused(e, 'reject')
+        flash(f'Error rejecting leave request: {describe_error(e)}', 'error')
+        return jsonify({'status': 'error', 'message': describe_error(e)}), 500
+    except Exception as e:
+        flash(f'Error rejecting leave request: {describe_error(e)}', 'error')
+        return jsonify({'status': 'error', 'message': describe_error(e)}), 500
+
+_team_intervals = {}
+_team_interval_locks = {}
+TEAM_CALENDAR_TTL = int(os.getenv('TEAM_CALENDAR_CACHE_SECONDS', '60'))
+
+def load_team_intervals(tenant_id):
+    approved = query_tenant(
+        dynamodb.Table('LeaveRequests'),
+        tenant_id,
+        **with_projection(
+            ['employee_id', 'start_date', 'end_date'],
+            FilterExpression='#status = :status',
+            ExpressionAttributeNames={'#status': 'status'},
+            ExpressionAttributeValues={':status': 'APPROVED'}
+        )
+    )
+    employees_by_id = employee_resolver.resolve_many(
+        {item.get('employee_id') for item in approved}, ['employee_id', 'name', 'department'],
+        tenant_id=tenant_id
+    )
+    return {
+        'loaded_at': time.monotonic(),
+        'intervals': leave_analytics.LeaveIntervals.from_items(
+            approved,
+            {eid: emp.get('department', 'Unassigned') for eid, emp in employees_by_id.items()}
+        ),
+        'names': {eid: emp.get('name', eid) for eid, emp in employees_by_id.items()}
+    }
+
+def get_team_intervals(tenant_id):
+    """A tenant's approved leave as NumPy intervals, reloaded at most once per TTL
+
+    One thread reloads a tenant at a time; the others keep serving the
+    expired entry meanwhile, or wait for the first load.
+    """
+    entry = _team_intervals.get(tenant_id)
+    if entry is None or time.monotonic() - entry['loaded_at'] > TEAM_CALENDAR_TTL:
+        lock = _team_interval_locks.setdefault(tenant_id, threading.Lock())
+        if lock.acquire(blocking=entry is None):
+            try:
+                entry = _team_intervals.get(tenant_id)
+                if entry is None or time.monotonic() - entry['loaded_at'] > TEAM_CALENDAR_TTL:
+                    entry = _team_intervals[tenant_id] = load_team_intervals(tenant_id)
+            finally:
+                lock.release()
+    return entry['intervals'], entry['names']
+
+@app.route('/team-calendar')
+@login_required
+@admission.rate_limited('team_calendar', per_user=user_limiter, per_tenant=tenant_limiter)
+@admission.concurrency_limited(scan_limiter, per_tenant=tenant_scan_limiter)
+def team_calendar():
+    today = date.today()
+    try:
+        first_day = date.fromisoformat(request.args.get('start', today.replace(day=1).isoformat()))
+        last_day = date.fromisoformat(request.args.get('end', (first_day + timedelta(days=41)).isoformat()))
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'Dates must be YYYY-MM-DD'}), 400
+    if (last_day - first_day).days > 366:
+        return jsonify({'status': 'error', 'message': 'Range is limited to one year'}), 400
+
+    # Managers see their own department; admins may pick any
+    department = session.get('department')
+    if session.get('is_admin'):
+        department = request.args.get('department') or None
+    max_absent = request.args.get('max_absent', type=int)
+
+    try:
+        intervals, names = get_team_intervals(current_tenant())
+        payload = leave_analytics.team_calendar(intervals, first_day, last_day, department, max_absent)
     except Exception as e:
-        flash(f'Error rejecting leave request: {str(e)}', 'error')
-        return jsonify({'status': 'error', 'message': str(e)}), 500
+        print(f"Error building team calendar: {e}")
+        return jsonify({'status': 'error', 'message': describe_error(e)}), 500
 
+    payload['employees'] = {
+        names.get(eid, eid): ranges for eid, ranges in payload['employees'].items()
+    }
+    payload['holidays'] = [
+        {'date': d.isoformat(), 'name': name}
+        for d, name in get_calendar().next_holidays(first_day, 366)
+        if d <= last_day
+    ]
+    return jsonify({'status': 'success', 'department': department, **payload})
+
+@app.route('/admin/export/<dataset>')
+@login_required
+@admin_required
+@admission.rate_limited('export', per_user=user_limiter, per_tenant=tenant_limiter)
+@admission.concurrency_limited(scan_limiter, per_tenant=tenant_scan_limiter)
+def export_data(dataset):
+    if dataset not in exports.DATASETS:
+        return jsonify({'status': 'error', 'message': 'Unknown export'}), 404
+
+    if request.args.get('format') == 'xlsx':
+        # Checked before the response starts; a streamed body cannot turn into an error
+        if exports.Workbook is None:
+            return jsonify({'status': 'error', 'message': 'XLSX export is not available on this server'}), 501
+        return Response(
+            stream_with_context(exports.stream_xlsx(dynamodb, dataset, tenant_id=current_tenant())),
+            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+            headers={'Content-Disposition': f'attachment; filename={dataset}.xlsx'}
+        )
+
+    return Response(
+        stream_with_context(exports.stream_csv(dynamodb, dataset, current_tenant())),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename={dataset}.csv'}
+    )
+
+
+@app.route('/reports/leave')
+@login_required
+@admin_required
+@admission.rate_limited('reports', per_user=user_limiter, per_tenant=tenant_limiter)
+def leave_report():
+    year = request.args.get('year', date.today().year, type=int)
+    try:
+        report = leave_reports.report(year, request.args.get('department') or None, current_tenant())
+    except Exception as e:
+        print(f"Error building leave report: {e}")
+        return jsonify({'status': 'error', 'message': describe_error(e)}), 500
+    return jsonify(dict(report, status='success'))
+
+@app.route('/search')
+@login_required
+@admission.rate_limited('search', per_user=user_limiter, per_tenant=tenant_limiter)
+def search():
+    kinds = request.args.getlist('type') or None
+    limit = min(request.args.get('limit', 10, type=int), 50)
+    try:
+        results = search_index.search(
+            request.args.get('q', ''),
+            viewer_id=session['user_id'],
+            is_admin=session.get('is_admin', False),
+            kinds=kinds,
+            limit=limit,
+            tenant_id=current_tenant()
+        )
+    except Exception as e:
+        print(f"Error searching: {e}")
+        return jsonify({'status': 'error', 'message': 'Search failed'}), 500
+
+    for result in results:
+        if result['type'] == 'document':
+            result['url'] = url_for('download_document', document_id=result['id'])
+    return jsonify({'status': 'success', 'results': results})
+
+@app.route('/metrics')
+def admission_metrics():
+    token = os.getenv('METRICS_TOKEN')
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return make_response('Unauthorized', 401)
+    if not token and session.get('role') not in ['admin', 'super_admin']:
+        return make_response('Unauthorized', 401)
+    return Response(
+        admission.metrics.render() + resilience.default.render() + audit_log.render() + notifier.render() +
+        blob_store.render(),
+        mimetype='text/plain; version=0.0.4'
+    )
+
+
+@app.route('/admin/audit')
+@login_required
+@super_admin_required
+def audit_trail():
+    """Audit events of the current tenant, e.g. ?start=2024-05-01&end=2024-05-31&actor=..."""
+    end = request.args.get('end') or date.today().isoformat()
+    start = request.args.get('start') or (date.fromisoformat(end[:10]) - timedelta(days=7)).isoformat()
+    try:
+        events = audit_log.query(
+            current_tenant(), start, end,
+            actor=request.args.get('actor') or None,
+            action=request.args.get('action') or None,
+            limit=min(int(request.args.get('limit', '500')), 5000)
+        )
+    except ValueError:
+        return jsonify({'status': 'error', 'message': 'start and end must be ISO dates'}), 400
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': describe_error(e)}), 500
+    return jsonify({'status': 'success', 'events': events})
 
 
 @app.route('/documents', methods=['GET', 'POST'])
 @login_required
+@admission.rate_limited('documents', per_user=user_limiter, per_tenant=tenant_limiter)
 def documents():
     table = dynamodb.Table('Documents')
     
@@ -705,19 +1194,23 @@ def documents():
             
             if file:
                 filename = secure_filename(file.filename)
-                document_id = str(uuid.uuid4())
-                s3_key = f"{session['user_id']}/{document_id}/{filename}"
-                
-                # Upload to S3 with server-side encryption
-                s3_client.upload_fileobj(
-                    file,
-                    os.getenv('S3_BUCKET_NAME'),
-                    s3_key,
-                    ExtraArgs={
-                        'ServerSideEncryption': 'AES256',
-                        'ContentType': file.content_type
-                    }
-                )
+                document_id = idempotent_id(request_idempotency_key(), current_tenant(), session['user_id'], filename)
+                if DOCUMENT_DEDUP:
+                    # Hashed first; bytes already stored for this tenant are not sent again
+                    blob = blob_store.acquire(file, current_tenant(), file.content_type)
+                else:
+                    blob = {'s3_key': f"{s3_prefix(current_tenant())}{session['user_id']}/{document_id}/{filename}"}
+                    
+                    # Upload to S3 with server-side encryption
+                    s3_client.upload_fileobj(
+                        file,
+                        os.getenv('S3_BUCKET_NAME'),
+                        blob['s3_key'],
+                        ExtraArgs={
+                            'ServerSideEncryption': 'AES256',
+                            'ContentType': file.content_type
+                        }
+                    )
                 
                 document_data = {
                     'document_id': document_id,
@@ -725,33 +1218,62 @@ def documents():
                     'employee_name': session['user_name'],
                     'filename': filename,
                     'description': request.form.get('description', ''),
-                    's3_key': s3_key,
                     'created_at': datetime.now().isoformat(),
-                    'is_public': request.form.get('is_public') == 'on'
+                    'is_public': request.form.get('is_public') == 'on',
+                    **blob
                 }
+                stamp('Documents', document_data, current_tenant())
                 
-                table.put_item(Item=document_data)
+                # A retried upload rewrote the same S3 key, or took a second
+                # reference on the same blob; the record is kept as it was
+                try:
+                    table.put_item(Item=document_data, ConditionExpression=Attr('document_id').not_exists())
+                except ClientError as e:
+                    blob_store.release(document_data)
+                    if not condition_failed(e):
+                        raise
+                except Exception:
+                    blob_store.release(document_data)
+                    raise
+                else:
+                    search_index.index_document(document_data)
                 flash('Document uploaded successfully', 'success')
                 
         except Exception as e:
-            flash(f'Error uploading document: {str(e)}', 'error')
+            flash(f'Error uploading document: {describe_error(e)}', 'error')
             
         return redirect(url_for('documents'))
     
+    year = request.args.get('year', type=int)
+    archive_years = []
     try:
+        archive_years = archive.years('documents', current_tenant())
+        if year in archive_years:
+            # Archived documents are private: owners and admins only
+            documents_list = archive.read('documents', year, None if session.get('is_admin') else session['user_id'],
+                                          current_tenant())
+            for doc in documents_list:
+                doc['download_url'] = url_for('download_archived_document', year=year,
+                                              employee_id=doc['employee_id'], document_id=doc['document_id'])
+            return render_template('documents/list.html',
+                                 documents=documents_list,
+                                 is_admin=session.get('is_admin', False),
+                                 archive_years=archive_years,
+                                 archive_year=year)
+
         if session.get('is_admin'):
-            # Admins can see all documents
-            response = table.scan()
+            # Admins can see all of their company's documents
+            documents_list = query_tenant(table, current_tenant(), **projection_kwargs(DOCUMENT_LIST_FIELDS))
         else:
             # Regular employees see their own documents and public documents
-            response = table.scan(
+            documents_list = query_tenant(table, current_tenant(), **with_projection(
+                DOCUMENT_LIST_FIELDS,
                 FilterExpression='employee_id = :eid OR is_public = :pub',
                 ExpressionAttributeValues={
                     ':eid': session['user_id'],
                     ':pub': True
                 }
-            )
-        documents_list = response.get('Items', [])
+            ))
         
         # Generate download URLs for each document
         for doc in documents_list:
@@ -762,12 +1284,78 @@ def documents():
                 doc['download_url'] = '#'
             
     except Exception as e:
-        flash(f'Error retrieving documents: {str(e)}', 'error')
+        flash(f'Error retrieving documents: {describe_error(e)}', 'error')
         documents_list = []
     
     return render_template('documents/list.html',
                          documents=documents_list,
-                         is_admin=session.get('is_admin', False))
+                         is_admin=session.get('is_admin', False),
+                         archive_years=archive_years,
+                         archive_year=None)
+
+@app.route('/documents/bulk-upload', methods=['POST'])
+@login_required
+def bulk_upload_documents():
+    files = [f for f in request.files.getlist('files') if f and f.filename]
+    if not files:
+        return jsonify({'status': 'error', 'message': 'No files selected'}), 400
+
+    try:
+        results = bulk_documents.upload_documents(
+            s3_client,
+            dynamodb.Table('Documents'),
+            os.getenv('S3_BUCKET_NAME'),
+            files,
+            session['user_id'],
+            session['user_name'],
+            description=request.form.get('description', ''),
+            is_public=request.form.get('is_public') == 'on',
+            on_recorded=search_index.index_document,
+            tenant_id=current_tenant(),
+            idempotency_key=request_idempotency_key(),
+            blob_store=blob_store if DOCUMENT_DEDUP else None
+        )
+    except Exception as e:
+        return jsonify({'status': 'error', 'message': describe_error(e)}), 500
+
+    failed = sum(1 for r in results if r['status'] != 'success')
+    return jsonify({
+        'status': 'success' if not failed else 'partial',
+        'uploaded': len(results) - failed,
+        'failed': failed,
+        'results': results
+    }), 200 if failed < len(results) else 500
+
+@app.route('/documents/download-zip', methods=['POST'])
+@login_required
+def download_documents_zip():
+    document_ids = request.form.getlist('document_ids') or (request.get_json(silent=True) or {}).get('document_ids', [])
+    if not document_ids:
+        flash('No documents selected', 'error')
+        return redirect(url_for('documents'))
+
+    try:
+        documents_list = [
+            doc for doc in bulk_documents.get_documents(dynamodb, document_ids)
+            if belongs_to(doc, current_tenant())
+            and (doc['employee_id'] == session['user_id'] or session.get('is_admin') or doc.get('is_public'))
+        ]
+    except Exception as e:
+        print(f"Error loading documents for zip: {e}")
+        flash('Error accessing documents', 'error')
+        return redirect(url_for('documents'))
+
+    if not documents_list:
+        flash('Permission denied', 'error')
+        return redirect(url_for('documents'))
+
+    return Response(
+        stream_with_context(bulk_documents.stream_zip(
+            s3_client, os.getenv('S3_BUCKET_NAME'), documents_list
+        )),
+        mimetype='application/zip',
+        headers={'Content-Disposition': 'attachment; filename=documents.zip'}
+    )
 
 @app.route('/documents/download/<document_id>')
 @login_required
@@ -783,7 +1371,7 @@ def download_document(document_id):
         table = dynamodb.Table('Documents')
         response = table.get_item(Key={'document_id': document_id})
         
-        if 'Item' not in response:
+        if not belongs_to(response.get('Item'), current_tenant()):
             flash('Document not found', 'error')
             return redirect(url_for('documents'))
             
@@ -797,18 +1385,15 @@ def download_document(document_id):
             return redirect(url_for('documents'))
 
         try:
-            # Get the file from S3
-            s3_response = s3_client.get_object(
-                Bucket=os.getenv('S3_BUCKET_NAME'),
-                Key=document['s3_key']
-            )
-            
-            # Stream the file directly to the user
+            # Served from the local cache when possible, otherwise from S3
+            cached, source = document_cache.open(document['s3_key'])
             return send_file(
-                s3_response['Body'],
+                source,
                 download_name=document['filename'],
                 as_attachment=True,
-                mimetype=s3_response['ContentType']
+                mimetype=cached.content_type,
+                etag=cached.etag.strip('"') if cached.etag else False,
+                conditional=True
             )
             
         except Exception as e:
@@ -821,47 +1406,81 @@ def download_document(document_id):
         flash('Error accessing document', 'error')
         return redirect(url_for('documents'))
 
+@app.route('/documents/archive/<int:year>/<employee_id>/<document_id>')
+@login_required
+def download_archived_document(year, employee_id, document_id):
+    if employee_id != session['user_id'] and not session.get('is_admin'):
+        flash('Permission denied', 'error')
+        return redirect(url_for('documents'))
+    try:
+        document = archive.find('documents', year, employee_id, document_id, current_tenant())
+        if document is None:
+            flash('Document not found', 'error')
+            return redirect(url_for('documents', year=year))
+        cached, source = document_cache.open(document['s3_key'])
+        return send_file(
+            source,
+            download_name=document['filename'],
+            as_attachment=True,
+            mimetype=cached.content_type,
+            etag=cached.etag.strip('"') if cached.etag else False,
+            conditional=True
+        )
+    except Exception as e:
+        print(f"Error downloading archived document: {e}")
+        flash('Error accessing document from storage', 'error')
+        return redirect(url_for('documents', year=year))
+
 @app.route('/documents/delete/<document_id>', methods=['POST'])
 @login_required
 def delete_document(document_id):
     try:
         table = dynamodb.Table('Documents')
-        response = table.get_item(Key={'document_id': document_id})
+        condition = Attr('document_id').exists() & tenant_condition(current_tenant())
+        # Employees may only delete their own documents
+        if not session.get('is_admin'):
+            condition = condition & Attr('employee_id').eq(session['user_id'])
         
-        if 'Item' in response:
-            document = response['Item']
-            
-            # Check if user has permission to delete
-            if document['employee_id'] == session['user_id'] or session.get('is_admin'):
-                # Delete from S3
-                try:
-                    s3_client.delete_object(
-                        Bucket=os.getenv('S3_BUCKET_NAME'),
-                        Key=document['s3_key']
-                    )
-                except Exception as e:
-                    print(f"Error deleting from S3: {e}")
-                
-                # Delete from DynamoDB
-                table.delete_item(Key={'document_id': document_id})
-                
-                return jsonify({'status': 'success'})
-            else:
+        # Delete the record first: it names the S3 key, and no one can open a
+        # document whose record is gone
+        try:
+            response = table.delete_item(
+                Key={'document_id': document_id},
+                ConditionExpression=condition,
+                ReturnValues='ALL_OLD',
+                ReturnValuesOnConditionCheckFailure='ALL_OLD'
+            )
+        except ClientError as e:
+            if not condition_failed(e):
+                raise
+            if belongs_to(failed_item(e), current_tenant()):
                 return jsonify({'status': 'error', 'message': 'Permission denied'}), 403
+            return jsonify({'status': 'error', 'message': 'Document not found'}), 404
+        document = response['Attributes']
+        
+        try:
+            # Shared blobs lose a reference and are collected in the background
+            # once unreferenced; older documents own their object outright
+            if document.get('blob_id'):
+                blob_store.release(document)
+            else:
+                s3_client.delete_object(
+                    Bucket=os.getenv('S3_BUCKET_NAME'),
+                    Key=document['s3_key']
+                )
+        except Exception as e:
+            print(f"Error deleting from S3: {e}")
+        
+        search_index.remove('document', document_id)
+        document_cache.invalidate(document['s3_key'])
+        audit('document.delete', 'document', document_id, owner=document['employee_id'],
+              filename=document.get('filename'))
         
-        return jsonify({'status': 'error', 'message': 'Document not found'}), 404
+        return jsonify({'status': 'success'})
         
     except Exception as e:
         print(f"Error in delete_document: {e}")
-        return jsonify({'status': 'error', 'message': str(e)}), 500
-
-@app.template_filter('format_date')
-def format_date(date_string):
-    try:
-        date_obj = datetime.fromisoformat(date_string)
-        return date_obj.strftime('%Y-%m-%d %H:%M:%S')
-    except:
-        return date_string
+        return jsonify({'status': 'error', 'message': describe_error(e)}), 500
 
 if __name__ == '__main__':
     app.run(debug=True)
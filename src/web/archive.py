@@ -0,0 +1,256 @@
+import argparse
+import gzip
+import json
+import os
+import sys
+import threading
+import time
+import zlib
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from decimal import Decimal
+
+import boto3
+from boto3.dynamodb.conditions import Attr
+from botocore.exceptions import ClientError
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.scan import iter_pages
+from common.tenancy import DEFAULT_TENANT, s3_prefix, tenant_of
+
+ARCHIVE_PREFIX = os.getenv('ARCHIVE_PREFIX', 'archive')
+ARCHIVE_SHARDS = 16
+# Leave years stay hot until this many newer years have started
+LEAVE_KEEP_YEARS = int(os.getenv('ARCHIVE_LEAVE_KEEP_YEARS', '1'))
+DOCUMENT_KEEP_DAYS = int(os.getenv('ARCHIVE_DOCUMENT_DAYS', '730'))
+YEARS_TTL = 300
+CLOSED_STATUSES = ('APPROVED', 'REJECTED', 'CANCELLED')
+
+DATASETS = {
+    'leave_requests': {'table': 'LeaveRequests', 'id': 'request_id', 'date': 'start_date'},
+    'documents': {'table': 'Documents', 'id': 'document_id', 'date': 'created_at'}
+}
+
+
+def shard_for(employee_id):
+    return zlib.crc32(str(employee_id).encode('utf-8')) % ARCHIVE_SHARDS
+
+
+def _encode(value):
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, set):
+        return sorted(value)
+    raise TypeError(f'Cannot archive {type(value).__name__}')
+
+
+class Archive:
+    """Closed history kept in S3 as gzipped JSON Lines, off the hot tables.
+
+    Objects are partitioned by tenant, year and a hash of the employee id:
+    ``archive/[tenants/<tenant>/]<dataset>/year=<yyyy>/shard=<nn>.jsonl.gz``,
+    the tenant segment being left out for the default tenant. One employee's
+    year is a single small GET; a whole year is ARCHIVE_SHARDS GETs made in
+    parallel. Parsed partitions are cached by ETag-checked key, since they
+    only change when the archiver runs again. The bucket lifecycle moves the
+    prefix to cheaper storage classes as it ages.
+    """
+
+    def __init__(self, s3_client, bucket, prefix=ARCHIVE_PREFIX, cache_entries=64):
+        self.s3 = s3_client
+        self.bucket = bucket
+        self.prefix = prefix
+        self.cache_entries = cache_entries
+        self._cache = OrderedDict()
+        self._years = {}
+        self._lock = threading.Lock()
+
+    def _root(self, dataset, tenant_id):
+        return f'{self.prefix}/{s3_prefix(tenant_id)}{dataset}'
+
+    def _key(self, dataset, year, shard, tenant_id=DEFAULT_TENANT):
+        return f'{self._root(dataset, tenant_id)}/year={year}/shard={shard:02d}.jsonl.gz'
+
+    def _read(self, key):
+        with self._lock:
+            cached = self._cache.get(key)
+        params = {'Bucket': self.bucket, 'Key': key}
+        if cached:
+            params['IfNoneMatch'] = cached[0]
+        try:
+            response = self.s3.get_object(**params)
+        except ClientError as e:
+            code = e.response['Error']['Code']
+            if code in ('304', 'NotModified') and cached:
+                return cached[1]
+            if code in ('NoSuchKey', '404'):
+                return []
+            raise
+        with gzip.GzipFile(fileobj=response['Body']) as f:
+            items = [json.loads(line) for line in f if line.strip()]
+        with self._lock:
+            self._cache[key] = (response['ETag'], items)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_entries:
+                self._cache.popitem(last=False)
+        return items
+
+    def _write(self, key, items):
+        body = gzip.compress(
+            b''.join(json.dumps(item, default=_encode, sort_keys=True).encode('utf-8') + b'\n' for item in items)
+        )
+        self.s3.put_object(
+            Bucket=self.bucket,
+            Key=key,
+            Body=body,
+            ContentType='application/x-ndjson',
+            ContentEncoding='gzip',
+            ServerSideEncryption='AES256'
+        )
+        with self._lock:
+            self._cache.pop(key, None)
+
+    def years(self, dataset, tenant_id=DEFAULT_TENANT):
+        """Archived years of a tenant's dataset, newest first."""
+        with self._lock:
+            entry = self._years.get((tenant_id, dataset))
+            if entry and time.monotonic() - entry[0] < YEARS_TTL:
+                return entry[1]
+        response = self.s3.list_objects_v2(
+            Bucket=self.bucket, Prefix=f'{self._root(dataset, tenant_id)}/year=', Delimiter='/'
+        )
+        years = sorted(
+            (int(p['Prefix'].rstrip('/').rsplit('=', 1)[1]) for p in response.get('CommonPrefixes', [])),
+            reverse=True
+        )
+        with self._lock:
+            self._years[(tenant_id, dataset)] = (time.monotonic(), years)
+        return years
+
+    def read(self, dataset, year, employee_id=None, tenant_id=DEFAULT_TENANT):
+        """Archived items of one tenant's year, for one employee or everyone."""
+        if employee_id is not None:
+            return [
+                item for item in self._read(self._key(dataset, year, shard_for(employee_id), tenant_id))
+                if item.get('employee_id') == employee_id
+            ]
+        with ThreadPoolExecutor(max_workers=ARCHIVE_SHARDS) as pool:
+            shards = pool.map(lambda s: self._read(self._key(dataset, year, s, tenant_id)), range(ARCHIVE_SHARDS))
+            return [item for shard in shards for item in shard]
+
+    def find(self, dataset, year, employee_id, item_id, tenant_id=DEFAULT_TENANT):
+        id_field = DATASETS[dataset]['id']
+        for item in self.read(dataset, year, employee_id, tenant_id):
+            if item.get(id_field) == item_id:
+                return item
+        return None
+
+    def _merge(self, dataset, year, shard, items, tenant_id=DEFAULT_TENANT):
+        """Add items to a partition; re-archiving the same item is a no-op."""
+        id_field = DATASETS[dataset]['id']
+        key = self._key(dataset, year, shard, tenant_id)
+        merged = {item[id_field]: item for item in self._read(key)}
+        for item in items:
+            merged[item[id_field]] = item
+        self._write(key, sorted(merged.values(), key=lambda i: (i.get('employee_id', ''), i[id_field])))
+
+    def _move(self, dataset, table, candidates, on_archived=None):
+        spec = DATASETS[dataset]
+        partitions = defaultdict(list)
+        for item in candidates:
+            year = int(str(item[spec['date']])[:4])
+            partitions[(tenant_of(item), year, shard_for(item.get('employee_id', '')))].append(item)
+
+        moved = 0
+        for (tenant_id, year, shard), items in sorted(partitions.items()):
+            # Written to the archive first, so a failed run only leaves
+            # duplicates that the next run skips, never lost items
+            self._merge(dataset, year, shard, items, tenant_id)
+            with table.batch_writer() as batch:
+                for item in items:
+                    batch.delete_item(Key={spec['id']: item[spec['id']]})
+            if on_archived:
+                on_archived(items)
+            moved += len(items)
+        with self._lock:
+            self._years.clear()
+        return moved
+
+    def archive_leave_requests(self, dynamodb, today=None):
+        """Move closed leave requests of closed leave years out of LeaveRequests."""
+        today = today or date.today()
+        cutoff = f'{today.year - LEAVE_KEEP_YEARS}-01-01'
+        table = dynamodb.Table('LeaveRequests')
+        candidates = [
+            item
+            for page in iter_pages(
+                table,
+                FilterExpression=Attr('start_date').lt(cutoff) & Attr('status').is_in(list(CLOSED_STATUSES))
+            )
+            for item in page
+        ]
+        return self._move('leave_requests', table, candidates)
+
+    def archive_documents(self, dynamodb, today=None):
+        """Move metadata of old private documents out of Documents.
+
+        The files stay where they are, tagged ``archived=true`` so the bucket
+        lifecycle moves them to Glacier Instant Retrieval; downloads of
+        archived documents keep working.
+        """
+        today = today or date.today()
+        cutoff = (today - timedelta(days=DOCUMENT_KEEP_DAYS)).isoformat()
+        table = dynamodb.Table('Documents')
+        candidates = [
+            item
+            for page in iter_pages(
+                table,
+                FilterExpression=Attr('created_at').lt(cutoff) & Attr('is_public').ne(True)
+            )
+            for item in page
+        ]
+
+        def tag(items):
+            for item in items:
+                if item.get('blob_id'):
+                    # Shared with other documents, which may still be current
+                    continue
+                try:
+                    self.s3.put_object_tagging(
+                        Bucket=self.bucket,
+                        Key=item['s3_key'],
+                        Tagging={'TagSet': [{'Key': 'archived', 'Value': 'true'}]}
+                    )
+                except ClientError as e:
+                    print(f"Error tagging {item['s3_key']} as archived: {e}")
+
+        return self._move('documents', table, candidates, on_archived=tag)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Move closed HRMS history into the S3 archive')
+    parser.add_argument('command', choices=['run', 'years', 'show'])
+    parser.add_argument('--dataset', choices=sorted(DATASETS), default='leave_requests')
+    parser.add_argument('--year', type=int)
+    parser.add_argument('--employee-id')
+    parser.add_argument('--tenant', default=DEFAULT_TENANT)
+    args = parser.parse_args()
+
+    region = os.getenv('AWS_REGION')
+    archive = Archive(boto3.client('s3', region_name=region), os.getenv('S3_BUCKET_NAME'))
+    if args.command == 'run':
+        dynamodb = boto3.resource('dynamodb', region_name=region)
+        print(f'Archived {archive.archive_leave_requests(dynamodb)} leave requests')
+        print(f'Archived {archive.archive_documents(dynamodb)} documents')
+    elif args.command == 'years':
+        print(' '.join(str(y) for y in archive.years(args.dataset, args.tenant)) or 'No archived years')
+    else:
+        if args.year is None:
+            parser.error('show needs --year')
+        for item in archive.read(args.dataset, args.year, args.employee_id, args.tenant):
+            print(json.dumps(item, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
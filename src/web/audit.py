@@ -0,0 +1,369 @@
+import argparse
+import json
+import os
+import sys
+import threading
+import uuid
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+import boto3
+from boto3.dynamodb.conditions import Attr, Key
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.serialization import dumps
+from common.tenancy import DEFAULT_TENANT, scoped
+
+AUDIT_TABLE = os.getenv('AUDIT_TABLE', 'AuditLog')
+AUDIT_DIR = os.getenv('AUDIT_DIR')
+# none: leave it to the OS; flush: one fsync per flush; always: fsync every event
+AUDIT_FSYNC = os.getenv('AUDIT_FSYNC', 'flush')
+FLUSH_EVENTS = int(os.getenv('AUDIT_FLUSH_EVENTS', '100'))
+FLUSH_SECONDS = float(os.getenv('AUDIT_FLUSH_SECONDS', '2'))
+SEGMENT_BYTES = int(os.getenv('AUDIT_SEGMENT_MB', '64')) * 1024 * 1024
+# Without a segment directory, events the table refused are kept up to this many
+MAX_BUFFERED = int(os.getenv('AUDIT_MAX_BUFFERED', '10000'))
+FSYNC_MODES = ('none', 'flush', 'always')
+
+
+def _item(line):
+    """DynamoDB item for one serialized event; DynamoDB wants Decimal, not float."""
+    return json.loads(line, parse_float=Decimal)
+
+
+def _days(start, end):
+    day = date.fromisoformat(start[:10])
+    while day.isoformat() <= end[:10]:
+        yield day.isoformat()
+        day += timedelta(days=1)
+
+
+class SegmentLog:
+    """Append-only JSON-lines files, one or more per day.
+
+    Files are named ``audit-<day>-<n>.log`` and only ever appended to, so a
+    time-range read opens just the days it covers. A crash can at worst
+    leave a torn last line, which readers skip.
+    """
+
+    def __init__(self, directory, fsync=AUDIT_FSYNC, segment_bytes=SEGMENT_BYTES):
+        if fsync not in FSYNC_MODES:
+            raise ValueError(f'AUDIT_FSYNC must be one of {", ".join(FSYNC_MODES)}')
+        self.directory = directory
+        self.fsync = fsync
+        self.segment_bytes = segment_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._file = None
+        self._name = None
+
+    def segments(self):
+        return sorted(name for name in os.listdir(self.directory)
+                      if name.startswith('audit-') and name.endswith('.log'))
+
+    def _segment_for(self, day):
+        if self._name and self._name[6:16] == day and self._file.tell() < self.segment_bytes:
+            return self._file
+        if self._file:
+            self._file.close()
+        existing = [name for name in self.segments() if name[6:16] == day]
+        name = existing[-1] if existing else f'audit-{day}-0000.log'
+        if existing and os.path.getsize(os.path.join(self.directory, name)) >= self.segment_bytes:
+            name = f'audit-{day}-{int(name[17:21]) + 1:04d}.log'
+        self._name = name
+        self._file = open(os.path.join(self.directory, name), 'ab+')
+        if self._file.tell():
+            self._file.seek(-1, os.SEEK_END)
+            if self._file.read(1) != b'\n':
+                # Close off a line torn by a crash so the next event starts clean
+                self._file.write(b'\n')
+        return self._file
+
+    def append(self, lines, sync=None):
+        """Append serialized events, grouped into their day's segment."""
+        touched = set()
+        for line in lines:
+            f = self._segment_for(json.loads(line)['at'][:10])
+            f.write(line.encode('utf-8') + b'\n')
+            touched.add(f)
+        for f in touched:
+            f.flush()
+            if sync if sync is not None else self.fsync != 'none':
+                os.fsync(f.fileno())
+
+    def read(self, name, offset=0):
+        """Yield (line, end offset) for the complete lines of a segment after offset."""
+        with open(os.path.join(self.directory, name), 'rb') as f:
+            f.seek(offset)
+            for raw in f:
+                if not raw.endswith(b'\n'):
+                    return
+                offset += len(raw)
+                yield raw.decode('utf-8').rstrip('\n'), offset
+
+    def events(self, start, end):
+        days = set(_days(start, end))
+        for name in self.segments():
+            if name[6:16] not in days:
+                continue
+            for line, _ in self.read(name):
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    continue
+                if start <= event['at'] <= end:
+                    yield event
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = self._name = None
+
+
+class AuditLog:
+    """Buffered, append-only record of who did what.
+
+    ``record`` only appends to an in-memory buffer; a background thread
+    flushes it every ``flush_seconds`` or as soon as ``flush_events`` are
+    waiting. Events go to the AuditLog table with ``batch_writer``, to local
+    segment files, or to both. With both, the segments are a write-ahead
+    log: events reach disk first and are shipped to the table from a saved
+    cursor, so a crash or a table outage loses nothing that was fsynced and
+    the next start ships the rest. Shipping the same event twice rewrites
+    the same item.
+
+    ``fsync='always'`` appends and fsyncs each event to its segment inside
+    ``record`` - a local disk write per event, still no network round trip.
+
+    Table items are partitioned by tenant and day (``period``) and sorted by
+    time, and the ActorIndex sorts one person's actions the same way, so an
+    investigation reads only the days it asks for.
+    """
+
+    def __init__(self, table=None, directory=None, fsync=AUDIT_FSYNC, flush_events=FLUSH_EVENTS,
+                 flush_seconds=FLUSH_SECONDS, segment_bytes=SEGMENT_BYTES, start=True):
+        if table is None and directory is None:
+            raise ValueError('AuditLog needs a table, a segment directory or both')
+        self.table = table
+        self.segments = SegmentLog(directory, fsync, segment_bytes) if directory else None
+        self.flush_events = flush_events
+        self.flush_seconds = flush_seconds
+        self._buffer = []
+        self._lock = threading.Lock()
+        # Appends never wait for a slow table: shipping holds only _ship_lock
+        self._append_lock = threading.Lock()
+        self._ship_lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._closed = False
+        self._counters = {'recorded': 0, 'written': 0, 'dropped': 0, 'flush_errors': 0}
+        self._thread = None
+        if start:
+            self._thread = threading.Thread(target=self._run, name='audit-flush', daemon=True)
+            self._thread.start()
+
+    # Writing
+
+    def record(self, action, actor, target_type, target_id, tenant_id=DEFAULT_TENANT, **details):
+        at = datetime.now().isoformat(timespec='microseconds')
+        event_id = uuid.uuid4().hex
+        event = {
+            'period': scoped(tenant_id, at[:10]),
+            'sort': f'{at}#{event_id}',
+            'event_id': event_id,
+            'at': at,
+            'tenant_id': tenant_id,
+            'actor': actor or 'system',
+            'action': action,
+            'target_type': target_type,
+            'target_id': str(target_id)
+        }
+        if details:
+            event['details'] = details
+        line = dumps(event)
+
+        if self.segments and self.segments.fsync == 'always':
+            with self._append_lock:
+                self.segments.append([line], sync=True)
+            with self._lock:
+                self._counters['recorded'] += 1
+                self._counters['written'] += 1
+            return event_id
+
+        with self._lock:
+            self._buffer.append(line)
+            self._counters['recorded'] += 1
+            if len(self._buffer) >= self.flush_events:
+                self._wake.notify()
+        return event_id
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._closed and len(self._buffer) < self.flush_events:
+                    self._wake.wait(self.flush_seconds)
+                closed = self._closed
+            try:
+                self.flush()
+            except Exception:
+                with self._lock:
+                    self._counters['flush_errors'] += 1
+            if closed:
+                return
+
+    def flush(self):
+        """Write out everything recorded so far; safe to call from any thread."""
+        with self._ship_lock:
+            with self._lock:
+                lines, self._buffer = self._buffer, []
+            if self.segments:
+                if lines:
+                    with self._append_lock:
+                        self.segments.append(lines)
+                    self._count('written', len(lines))
+                if self.table is not None:
+                    self._ship()
+                return
+            if not lines:
+                return
+            try:
+                self._put([_item(line) for line in lines])
+            except Exception:
+                # Keep the events for the next flush, newest first to go if it is full
+                with self._lock:
+                    self._buffer = lines + self._buffer
+                    overflow = len(self._buffer) - MAX_BUFFERED
+                    if overflow > 0:
+                        del self._buffer[MAX_BUFFERED:]
+                        self._counters['dropped'] += overflow
+                raise
+            self._count('written', len(lines))
+
+    def _count(self, name, amount):
+        with self._lock:
+            self._counters[name] += amount
+
+    def _put(self, items):
+        with self.table.batch_writer(overwrite_by_pkeys=['period', 'sort']) as batch:
+            for item in items:
+                batch.put_item(Item=item)
+
+    # Write-ahead shipping from segments to the table
+
+    def _cursor_path(self):
+        return os.path.join(self.segments.directory, 'shipped.json')
+
+    def _load_cursor(self):
+        try:
+            with open(self._cursor_path(), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {'segment': '', 'offset': 0}
+
+    def _save_cursor(self, cursor):
+        tmp_path = f'{self._cursor_path()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(cursor, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._cursor_path())
+
+    def _ship(self):
+        cursor = self._load_cursor()
+        for name in self.segments.segments():
+            if name < cursor['segment']:
+                continue
+            offset = cursor['offset'] if name == cursor['segment'] else 0
+            items = []
+            end = offset
+            for line, end in self.segments.read(name, offset):
+                try:
+                    items.append(_item(line))
+                except ValueError:
+                    continue
+            if items:
+                self._put(items)
+            if (name, end) != (cursor['segment'], cursor['offset']):
+                cursor = {'segment': name, 'offset': end}
+                self._save_cursor(cursor)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._wake.notify()
+        if self._thread:
+            self._thread.join(timeout=30)
+        else:
+            self.flush()
+        if self.segments:
+            self.segments.close()
+
+    # Reading
+
+    def query(self, tenant_id, start, end, actor=None, action=None, limit=1000):
+        """Events of one tenant between two ISO timestamps, oldest first."""
+        self.flush()
+        end = end if len(end) > 10 else f'{end}T23:59:59.999999'
+        if self.table is None:
+            events = [
+                e for e in self.segments.events(start, end)
+                if e.get('tenant_id', DEFAULT_TENANT) == tenant_id
+                and (actor is None or e['actor'] == actor) and (action is None or e['action'] == action)
+            ]
+            return sorted(events, key=lambda e: e['sort'])[:limit]
+
+        sort_range = Key('sort').between(start, f'{end}\uffff')
+        filters = Attr('action').eq(action) if action else None
+        if actor:
+            tenant_filter = Attr('tenant_id').eq(tenant_id)
+            queries = [dict(IndexName='ActorIndex', KeyConditionExpression=Key('actor').eq(actor) & sort_range,
+                            FilterExpression=tenant_filter & filters if filters else tenant_filter)]
+        else:
+            queries = [
+                dict(KeyConditionExpression=Key('period').eq(scoped(tenant_id, day)) & sort_range,
+                     **({'FilterExpression': filters} if filters else {}))
+                for day in _days(start, end)
+            ]
+        events = []
+        for params in queries:
+            response = self.table.query(**params)
+            events.extend(response.get('Items', []))
+            while 'LastEvaluatedKey' in response and len(events) < limit:
+                response = self.table.query(ExclusiveStartKey=response['LastEvaluatedKey'], **params)
+                events.extend(response.get('Items', []))
+            if len(events) >= limit:
+                break
+        return events[:limit]
+
+    def render(self):
+        """Audit writer counters in Prometheus text format."""
+        with self._lock:
+            counters = dict(self._counters, buffered=len(self._buffer))
+        lines = ['# HELP hrms_audit_events Audit events by writer state', '# TYPE hrms_audit_events gauge']
+        for name, value in sorted(counters.items()):
+            lines.append(f'hrms_audit_events{{state="{name}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Search the HRMS audit trail')
+    parser.add_argument('--start', required=True, help='ISO date or timestamp')
+    parser.add_argument('--end', default=date.today().isoformat())
+    parser.add_argument('--actor')
+    parser.add_argument('--action')
+    parser.add_argument('--tenant', default=DEFAULT_TENANT)
+    parser.add_argument('--dir', default=AUDIT_DIR, help='Read local segments instead of the table')
+    parser.add_argument('--limit', type=int, default=1000)
+    args = parser.parse_args()
+
+    if args.dir:
+        log = AuditLog(directory=args.dir, start=False)
+    else:
+        dynamodb = boto3.resource('dynamodb', region_name=os.getenv('AWS_REGION'))
+        log = AuditLog(dynamodb.Table(AUDIT_TABLE), start=False)
+    for event in log.query(args.tenant, args.start, args.end, args.actor, args.action, args.limit):
+        details = dumps(event['details']) if event.get('details') else ''
+        print(f"{event['at']:<27} {event['actor']:<28} {event['action']:<18} "
+              f"{event['target_type']}:{event['target_id']} {details}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,209 @@
+import os
+import tempfile
+import threading
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from werkzeug.utils import secure_filename
+
+from common.conditions import idempotent_id
+from common.resilience import describe_error
+from common.tenancy import DEFAULT_TENANT, s3_prefix, stamp
+
+BULK_UPLOAD_WORKERS = int(os.getenv('BULK_UPLOAD_WORKERS', '8'))
+ZIP_FETCH_WORKERS = int(os.getenv('ZIP_FETCH_WORKERS', '4'))
+# Objects above this size spill from memory to a temporary file while queued
+ZIP_SPOOL_BYTES = 8 * 1024 * 1024
+ZIP_CHUNK_BYTES = 64 * 1024
+MAX_BATCH_GET = 100
+
+
+def upload_documents(s3_client, table, bucket, files, employee_id, employee_name,
+                     description='', is_public=False, on_recorded=None, tenant_id=DEFAULT_TENANT,
+                     idempotency_key=None, blob_store=None):
+    """Upload several files to S3 concurrently and record them in one batch.
+
+    Returns one result dict per file, in input order, with either the new
+    document_id or the error that stopped that file. ``on_recorded`` is
+    called with each Documents item once the batch write succeeded. With an
+    ``idempotency_key`` a retried batch derives the same document ids, so it
+    overwrites its own objects and records instead of adding copies.
+    With a ``blob_store`` the bytes are deduplicated per tenant and content,
+    and files a retried batch already recorded are not uploaded again.
+    """
+    def upload(position, file):
+        filename = secure_filename(file.filename or '')
+        if not filename:
+            return {'filename': file.filename, 'status': 'error', 'message': 'Invalid filename'}
+        document_id = idempotent_id(idempotency_key, tenant_id, employee_id, position, filename)
+        blob = {'s3_key': f"{s3_prefix(tenant_id)}{employee_id}/{document_id}/{filename}"}
+        try:
+            if blob_store:
+                # A replayed file must not take a second reference on its blob
+                if idempotency_key and 'Item' in table.get_item(
+                        Key={'document_id': document_id}, ProjectionExpression='document_id'):
+                    return {'filename': filename, 'status': 'success', 'document_id': document_id}
+                blob = blob_store.acquire(file, tenant_id, file.content_type)
+            else:
+                s3_client.upload_fileobj(
+                    file,
+                    bucket,
+                    blob['s3_key'],
+                    ExtraArgs={
+                        'ServerSideEncryption': 'AES256',
+                        'ContentType': file.content_type or 'application/octet-stream'
+                    }
+                )
+        except Exception as e:
+            print(f"Error uploading {filename} to {bucket}: {e}")
+            return {'filename': filename, 'status': 'error', 'message': describe_error(e)}
+        return {
+            'filename': filename,
+            'status': 'success',
+            'document_id': document_id,
+            'item': stamp('Documents', {
+                'document_id': document_id,
+                'employee_id': employee_id,
+                'employee_name': employee_name,
+                'filename': filename,
+                'description': description,
+                'created_at': datetime.now().isoformat(),
+                'is_public': is_public,
+                **blob
+            }, tenant_id)
+        }
+
+    with ThreadPoolExecutor(max_workers=BULK_UPLOAD_WORKERS) as pool:
+        results = list(pool.map(upload, range(len(files)), files))
+
+    uploaded = [r for r in results if 'item' in r]
+    if uploaded:
+        try:
+            with table.batch_writer() as batch:
+                for result in uploaded:
+                    batch.put_item(Item=result['item'])
+        except Exception as e:
+            print(f"Error recording bulk upload: {e}")
+            for result in uploaded:
+                result['status'] = 'error'
+                result['message'] = f'Uploaded but not recorded: {describe_error(e)}'
+                if blob_store:
+                    blob_store.release(result['item'])
+        else:
+            if on_recorded:
+                for result in uploaded:
+                    on_recorded(result['item'])
+
+    for result in results:
+        result.pop('item', None)
+    return results
+
+
+def get_documents(dynamodb, document_ids):
+    """Fetch Documents items by id with BatchGetItem, retrying unprocessed keys."""
+    document_ids = list(dict.fromkeys(document_ids))
+    items = []
+    for start in range(0, len(document_ids), MAX_BATCH_GET):
+        request = {
+            'Documents': {
+                'Keys': [{'document_id': d} for d in document_ids[start:start + MAX_BATCH_GET]]
+            }
+        }
+        while request:
+            response = dynamodb.batch_get_item(RequestItems=request)
+            items.extend(response.get('Responses', {}).get('Documents', []))
+            request = response.get('UnprocessedKeys') or None
+    order = {d: i for i, d in enumerate(document_ids)}
+    items.sort(key=lambda d: order[d['document_id']])
+    return items
+
+
+class _ChunkWriter:
+    """Write-only file object that collects zip output for the generator."""
+
+    def __init__(self):
+        self.chunks = deque()
+        self.offset = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.offset
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        while self.chunks:
+            yield self.chunks.popleft()
+
+
+def _archive_names(documents):
+    seen = {}
+    for doc in documents:
+        name = doc['filename']
+        count = seen.get(name, 0)
+        seen[name] = count + 1
+        if count:
+            base, ext = os.path.splitext(name)
+            name = f'{base} ({count}){ext}'
+        yield doc, name
+
+
+def stream_zip(s3_client, bucket, documents):
+    """Yield a zip archive of the given documents as it is produced.
+
+    A small pool fetches the next few S3 objects while the current one is
+    being compressed. Fetched objects are spooled, so only a bounded number
+    of them is ever held and large files go to disk instead of memory.
+    """
+    def fetch(doc):
+        spool = tempfile.SpooledTemporaryFile(max_size=ZIP_SPOOL_BYTES)
+        body = s3_client.get_object(Bucket=bucket, Key=doc['s3_key'])['Body']
+        for chunk in body.iter_chunks(ZIP_CHUNK_BYTES):
+            spool.write(chunk)
+        spool.seek(0)
+        return spool
+
+    out = _ChunkWriter()
+    stop = threading.Event()
+    with ThreadPoolExecutor(max_workers=ZIP_FETCH_WORKERS) as pool:
+        pending = deque()
+        entries = iter(_archive_names(documents))
+
+        def submit_next():
+            entry = next(entries, None)
+            if entry is not None and not stop.is_set():
+                pending.append((entry, pool.submit(fetch, entry[0])))
+
+        for _ in range(ZIP_FETCH_WORKERS):
+            submit_next()
+
+        try:
+            with zipfile.ZipFile(out, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+                while pending:
+                    (doc, name), future = pending.popleft()
+                    submit_next()
+                    try:
+                        spool = future.result()
+                    except Exception as e:
+                        print(f"Error fetching {doc['s3_key']} for zip: {e}")
+                        continue
+                    with spool, archive.open(name, 'w', force_zip64=True) as entry:
+                        while True:
+                            chunk = spool.read(ZIP_CHUNK_BYTES)
+                            if not chunk:
+                                break
+                            entry.write(chunk)
+                            yield from out.drain()
+                    yield from out.drain()
+            yield from out.drain()
+        finally:
+            stop.set()
+            for _, future in pending:
+                future.cancel()
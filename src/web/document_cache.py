@@ -0,0 +1,266 @@
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from botocore.exceptions import ClientError
+
+CACHE_DIR = os.getenv('DOCUMENT_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'hrms-document-cache'))
+MEMORY_BYTES = int(os.getenv('DOCUMENT_CACHE_MEMORY_MB', '64')) * 1024 * 1024
+DISK_BYTES = int(os.getenv('DOCUMENT_CACHE_DISK_MB', '2048')) * 1024 * 1024
+# Objects up to this size live in memory; larger ones go to the disk tier
+MEMORY_MAX_OBJECT = 256 * 1024
+# Entries are trusted this long before a conditional GET revalidates them
+REVALIDATE_SECONDS = int(os.getenv('DOCUMENT_CACHE_REVALIDATE_SECONDS', '300'))
+CHUNK_BYTES = 1024 * 1024
+
+
+class CachedObject:
+    """Metadata for one cached S3 object plus where its bytes are."""
+
+    __slots__ = ('key', 'etag', 'version_id', 'content_type', 'size', 'data', 'path', 'checked_at')
+
+    def __init__(self, key, etag, version_id, content_type, size, data=None, path=None):
+        self.key = key
+        self.etag = etag
+        self.version_id = version_id
+        self.content_type = content_type
+        self.size = size
+        self.data = data
+        self.path = path
+        self.checked_at = time.monotonic()
+
+    def source(self):
+        """What to hand to send_file: the opened file for the disk tier, else a buffer.
+
+        Raises FileNotFoundError when another process sharing the cache
+        directory evicted the file.
+        """
+        return open(self.path, 'rb') if self.path else io.BytesIO(self.data)
+
+
+class _Passthrough:
+    """An object too large to cache, streamed straight from S3."""
+
+    def __init__(self, key, response):
+        self.key = key
+        self.etag = response.get('ETag')
+        self.content_type = response.get('ContentType', 'application/octet-stream')
+        self.size = response.get('ContentLength')
+        self._body = response['Body']
+
+    def source(self):
+        return self._body
+
+
+class _LRU:
+    """Byte-bounded LRU of CachedObject; evicted entries go to ``on_evict``."""
+
+    def __init__(self, capacity, on_evict=None):
+        self.capacity = capacity
+        self.on_evict = on_evict
+        self.used = 0
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, entry):
+        # A replaced entry shares its storage with the new one; no eviction
+        replaced = self._entries.pop(entry.key, None)
+        if replaced is not None:
+            self.used -= replaced.size
+        self._entries[entry.key] = entry
+        self.used += entry.size
+        while self.used > self.capacity and len(self._entries) > 1:
+            _, evicted = self._entries.popitem(last=False)
+            self.used -= evicted.size
+            if self.on_evict:
+                self.on_evict(evicted)
+
+    def pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.used -= entry.size
+            if self.on_evict:
+                self.on_evict(entry)
+        return entry
+
+
+class DocumentCache:
+    """Two-tier cache of S3 document bytes for the download route.
+
+    Small objects are kept in a bounded in-memory LRU; larger ones are
+    written to CACHE_DIR under a size-bounded LRU and served from the file,
+    so send_file can use the server's sendfile support. Each entry remembers
+    the ETag and VersionId it was filled with. Within REVALIDATE_SECONDS it
+    is served without contacting S3; after that a conditional GET confirms
+    it (a 304 carries no body) or replaces it. Objects larger than a
+    quarter of the disk tier are streamed through uncached.
+    """
+
+    def __init__(self, s3_client, bucket, directory=CACHE_DIR, memory_bytes=MEMORY_BYTES,
+                 disk_bytes=DISK_BYTES, revalidate_seconds=REVALIDATE_SECONDS):
+        self.s3 = s3_client
+        self.bucket = bucket
+        self.directory = directory
+        self.revalidate_seconds = revalidate_seconds
+        self._memory = _LRU(memory_bytes)
+        self._disk = _LRU(disk_bytes, on_evict=self._unlink)
+        self._lock = threading.Lock()
+        self._fills = {}
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        os.makedirs(directory, exist_ok=True)
+        self._load_disk_index()
+
+    def _paths(self, key):
+        digest = hashlib.sha256(f'{self.bucket}/{key}'.encode('utf-8')).hexdigest()
+        base = os.path.join(self.directory, digest)
+        return base, f'{base}.json'
+
+    def _unlink(self, entry):
+        for path in self._paths(entry.key):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+    def _load_disk_index(self):
+        """Re-adopt files left by a previous process, oldest access first."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            meta_path = os.path.join(self.directory, name)
+            try:
+                with open(meta_path, 'r') as f:
+                    meta = json.load(f)
+                data_path = meta_path[:-len('.json')]
+                entry = CachedObject(meta['key'], meta['etag'], meta.get('version_id'),
+                                     meta['content_type'], os.path.getsize(data_path), path=data_path)
+                entries.append((os.path.getatime(data_path), entry))
+            except (OSError, ValueError, KeyError):
+                os.unlink(meta_path)
+        for _, entry in sorted(entries, key=lambda e: e[0]):
+            # Force a revalidation before first use after a restart
+            entry.checked_at = float('-inf')
+            self._disk.put(entry)
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._memory.get(key) or self._disk.get(key)
+            if entry is not None and entry.path and not os.path.exists(entry.path):
+                self._disk.pop(key)
+                entry = None
+            return entry
+
+    def get(self, key):
+        """Return a CachedObject (or pass-through) for ``key``, filling on a miss."""
+        entry = self._lookup(key)
+        if entry is not None and time.monotonic() - entry.checked_at < self.revalidate_seconds:
+            self.hits += 1
+            return entry
+
+        # One request per key talks to S3; concurrent callers wait for it
+        with self._lock:
+            fill = self._fills.get(key)
+            if fill is None:
+                fill = self._fills[key] = threading.Lock()
+        with fill:
+            entry = self._lookup(key)
+            if entry is not None and time.monotonic() - entry.checked_at < self.revalidate_seconds:
+                self.hits += 1
+                return entry
+            try:
+                return self._fetch(key, entry)
+            finally:
+                with self._lock:
+                    self._fills.pop(key, None)
+
+    def _fetch(self, key, stale):
+        params = {'Bucket': self.bucket, 'Key': key}
+        if stale is not None:
+            params['IfNoneMatch'] = stale.etag
+        try:
+            response = self.s3.get_object(**params)
+        except ClientError as e:
+            status = e.response.get('ResponseMetadata', {}).get('HTTPStatusCode')
+            if stale is not None and (status == 304 or e.response['Error']['Code'] in ('304', 'NotModified')):
+                self.revalidations += 1
+                stale.checked_at = time.monotonic()
+                return stale
+            raise
+
+        self.misses += 1
+        size = response['ContentLength']
+        if size > self._disk.capacity // 4:
+            return _Passthrough(key, response)
+
+        entry = CachedObject(
+            key,
+            response['ETag'],
+            response.get('VersionId'),
+            response.get('ContentType', 'application/octet-stream'),
+            size
+        )
+        if size <= MEMORY_MAX_OBJECT:
+            entry.data = response['Body'].read()
+            with self._lock:
+                self._disk.pop(key)
+                self._memory.put(entry)
+            return entry
+
+        data_path, meta_path = self._paths(key)
+        tmp_path = f'{data_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            for chunk in response['Body'].iter_chunks(CHUNK_BYTES):
+                f.write(chunk)
+        with open(meta_path, 'w') as f:
+            json.dump({'key': key, 'etag': entry.etag, 'version_id': entry.version_id,
+                       'content_type': entry.content_type}, f)
+        with self._lock:
+            self._memory.pop(key)
+            # Replacing the file leaves downloads of the old copy unaffected
+            os.replace(tmp_path, data_path)
+            entry.path = data_path
+            self._disk.put(entry)
+        return entry
+
+    def open(self, key):
+        """``get`` plus its opened source, for send_file.
+
+        Processes that share the cache directory evict each other's files;
+        one gone before it could be opened is dropped and streamed from S3.
+        An opened file stays readable whatever happens to its name.
+        """
+        entry = self.get(key)
+        try:
+            return entry, entry.source()
+        except FileNotFoundError:
+            self.invalidate(key)
+            entry = _Passthrough(key, self.s3.get_object(Bucket=self.bucket, Key=key))
+            return entry, entry.source()
+
+    def invalidate(self, key):
+        with self._lock:
+            self._memory.pop(key)
+            self._disk.pop(key)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'revalidations': self.revalidations,
+                'memory_bytes': self._memory.used,
+                'disk_bytes': self._disk.used
+            }
@@ -0,0 +1,169 @@
+import argparse
+import csv
+import io
+import os
+import sys
+import tempfile
+from collections import OrderedDict
+
+import boto3
+
+try:
+    from openpyxl import Workbook
+except ImportError:
+    Workbook = None
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.employees import EmployeeResolver
+from common.tenancy import DEFAULT_TENANT, iter_tenant_pages
+
+EMPLOYEE_COLUMNS = ['employee_id', 'email', 'name', 'department', 'position',
+                    'is_admin', 'is_super_admin', 'created_at', 'created_by']
+LEAVE_COLUMNS = ['request_id', 'employee_id', 'employee_name', 'employee_email',
+                 'department', 'start_date', 'end_date', 'days_requested',
+                 'reason', 'status', 'created_at', 'updated_at',
+                 'approved_by', 'rejected_by']
+DOCUMENT_COLUMNS = ['document_id', 'employee_id', 'employee_name', 'filename',
+                    'description', 's3_key', 'is_public', 'created_at']
+
+EXPORT_PAGE_SIZE = 1000
+LOOKUP_FIELDS = ['employee_id', 'email', 'name', 'department']
+EMPLOYEE_CACHE_SIZE = 10000
+
+
+class EmployeeLookup:
+    """Bounded cache of employee details keyed by employee_id.
+
+    Ids missing from the cache are resolved once per page through
+    EmployeeResolver, i.e. a batched read instead of a query per id.
+    """
+
+    def __init__(self, dynamodb, tenant_id=DEFAULT_TENANT, max_size=EMPLOYEE_CACHE_SIZE):
+        self.resolver = EmployeeResolver(dynamodb)
+        self.tenant_id = tenant_id
+        self.max_size = max_size
+        self._cache = OrderedDict()
+
+    def resolve(self, employee_ids):
+        employees = self.resolver.resolve_many(employee_ids, LOOKUP_FIELDS, memo=self._cache,
+                                               tenant_id=self.tenant_id)
+        while len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+        return employees
+
+
+def iter_employee_rows(dynamodb, tenant_id):
+    table = dynamodb.Table('Employees')
+    for page in iter_tenant_pages(
+        table,
+        tenant_id,
+        Limit=EXPORT_PAGE_SIZE,
+        ProjectionExpression=', '.join(f'#{i}' for i in range(len(EMPLOYEE_COLUMNS))),
+        ExpressionAttributeNames={f'#{i}': c for i, c in enumerate(EMPLOYEE_COLUMNS)}
+    ):
+        yield from page
+
+
+def iter_leave_rows(dynamodb, tenant_id):
+    table = dynamodb.Table('LeaveRequests')
+    lookup = EmployeeLookup(dynamodb, tenant_id)
+    for page in iter_tenant_pages(table, tenant_id, Limit=EXPORT_PAGE_SIZE):
+        employees = lookup.resolve({item.get('employee_id') for item in page})
+        for item in page:
+            employee = employees.get(item.get('employee_id'), {})
+            item['employee_name'] = employee.get('name', item.get('employee_name', ''))
+            item['employee_email'] = employee.get('email', '')
+            item['department'] = employee.get('department', '')
+            yield item
+
+
+def iter_document_rows(dynamodb, tenant_id):
+    table = dynamodb.Table('Documents')
+    for page in iter_tenant_pages(table, tenant_id, Limit=EXPORT_PAGE_SIZE):
+        yield from page
+
+
+DATASETS = {
+    'employees': (EMPLOYEE_COLUMNS, iter_employee_rows),
+    'leave_requests': (LEAVE_COLUMNS, iter_leave_rows),
+    'documents': (DOCUMENT_COLUMNS, iter_document_rows),
+}
+
+
+def stream_csv(dynamodb, dataset, tenant_id=DEFAULT_TENANT):
+    """Yield CSV text for a tenant's dataset, one chunk per row, header first."""
+    columns, iter_rows = DATASETS[dataset]
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction='ignore')
+
+    writer.writeheader()
+    yield buffer.getvalue()
+
+    for row in iter_rows(dynamodb, tenant_id):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(row)
+        yield buffer.getvalue()
+
+
+def stream_xlsx(dynamodb, dataset, chunk_size=64 * 1024, tenant_id=DEFAULT_TENANT):
+    """Yield an XLSX workbook for a tenant's dataset.
+
+    openpyxl's write-only mode keeps rows out of memory, but a zip archive
+    cannot be emitted before it is complete, so the workbook is spooled to a
+    temporary file and streamed from there.
+    """
+    if Workbook is None:
+        raise RuntimeError('XLSX export needs openpyxl (pip install openpyxl)')
+    columns, iter_rows = DATASETS[dataset]
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(dataset)
+    sheet.append(columns)
+    for row in iter_rows(dynamodb, tenant_id):
+        sheet.append([_cell(row.get(c)) for c in columns])
+
+    with tempfile.TemporaryFile() as f:
+        workbook.save(f)
+        f.seek(0)
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+def _cell(value):
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export HRMS data as CSV or XLSX')
+    parser.add_argument('dataset', choices=sorted(DATASETS))
+    parser.add_argument('--format', choices=['csv', 'xlsx'], default='csv')
+    parser.add_argument('-o', '--output', help='Output file (defaults to stdout)')
+    parser.add_argument('--tenant', default=DEFAULT_TENANT)
+    args = parser.parse_args()
+
+    dynamodb = boto3.resource('dynamodb', region_name=os.getenv('AWS_REGION'))
+
+    if args.format == 'xlsx':
+        if not args.output:
+            parser.error('--output is required for xlsx exports')
+        with open(args.output, 'wb') as f:
+            for chunk in stream_xlsx(dynamodb, args.dataset, tenant_id=args.tenant):
+                f.write(chunk)
+        return
+
+    out = open(args.output, 'w', newline='') if args.output else sys.stdout
+    try:
+        for chunk in stream_csv(dynamodb, args.dataset, args.tenant):
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+import json
+import os
+from bisect import bisect_left, bisect_right
+from datetime import date
+from functools import lru_cache
+
+HOLIDAY_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'holidays')
+DEFAULT_REGION = os.getenv('HOLIDAY_REGION', 'IN')
+
+
+class HolidayCalendar:
+    """Sorted holiday index with O(1) working-day counts.
+
+    Holidays are kept as sorted date ordinals, so "next N holidays" is a
+    bisect. For the years covered by the data file a prefix-sum array holds
+    the number of working days before each day, and a range count is the
+    difference of two entries. Ranges outside the covered years fall back to
+    weekday arithmetic and count only weekends as non-working.
+    """
+
+    def __init__(self, region, holidays, weekend=(5, 6)):
+        self.region = region
+        self.weekend = frozenset(weekend)
+        holidays = sorted(holidays)
+        self._ordinals = [d.toordinal() for d, _ in holidays]
+        self._names = [name for _, name in holidays]
+
+        if holidays:
+            self._first = date(holidays[0][0].year, 1, 1).toordinal()
+            self._last = date(holidays[-1][0].year, 12, 31).toordinal()
+        else:
+            self._first = self._last = 0
+
+        holiday_set = set(self._ordinals)
+        prefix = [0]
+        for ordinal in range(self._first, self._last + 1):
+            working = (date.fromordinal(ordinal).weekday() not in self.weekend
+                       and ordinal not in holiday_set)
+            prefix.append(prefix[-1] + working)
+        self._prefix = prefix
+
+    @classmethod
+    def load(cls, region):
+        path = os.path.join(HOLIDAY_DATA_DIR, f'{region}.json')
+        with open(path, 'r') as f:
+            data = json.load(f)
+        holidays = [(date.fromisoformat(h['date']), h['name']) for h in data['holidays']]
+        return cls(region, holidays, data.get('weekend', (5, 6)))
+
+    def next_holidays(self, from_date, count):
+        """Return up to ``count`` (date, name) pairs on or after ``from_date``."""
+        start = bisect_left(self._ordinals, from_date.toordinal())
+        return [
+            (date.fromordinal(self._ordinals[i]), self._names[i])
+            for i in range(start, min(start + count, len(self._ordinals)))
+        ]
+
+    def is_holiday(self, day):
+        ordinal = day.toordinal()
+        i = bisect_left(self._ordinals, ordinal)
+        return i < len(self._ordinals) and self._ordinals[i] == ordinal
+
+    def is_working_day(self, day):
+        return day.weekday() not in self.weekend and not self.is_holiday(day)
+
+    def working_days(self, start, end):
+        """Count working days in the inclusive range ``start``..``end``."""
+        first, last = start.toordinal(), end.toordinal()
+        if last < first:
+            return 0
+        if self._first <= first and last <= self._last:
+            return self._prefix[last - self._first + 1] - self._prefix[first - self._first]
+        return self._weekdays_between(first, last) - self._weekday_holidays_between(first, last)
+
+    def _weekdays_between(self, first, last):
+        days = last - first + 1
+        full_weeks, remainder = divmod(days, 7)
+        count = full_weeks * (7 - len(self.weekend))
+        start_weekday = date.fromordinal(first).weekday()
+        for offset in range(remainder):
+            if (start_weekday + offset) % 7 not in self.weekend:
+                count += 1
+        return count
+
+    def _weekday_holidays_between(self, first, last):
+        lo = bisect_left(self._ordinals, first)
+        hi = bisect_right(self._ordinals, last)
+        return sum(
+            1 for ordinal in self._ordinals[lo:hi]
+            if date.fromordinal(ordinal).weekday() not in self.weekend
+        )
+
+
+@lru_cache(maxsize=None)
+def get_calendar(region=None):
+    """Load and cache the calendar for a region, once per process."""
+    return HolidayCalendar.load(region or DEFAULT_REGION)
@@ -0,0 +1,149 @@
+from datetime import date
+
+import numpy as np
+
+WEEKDAY_NAMES = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+
+
+class LeaveIntervals:
+    """Approved leave as parallel NumPy arrays of inclusive day intervals.
+
+    ``start`` and ``end`` are ``datetime64[D]``; ``employee`` and
+    ``department`` are integer codes into ``employee_ids`` and
+    ``departments``. Every query below is interval arithmetic on whole
+    arrays, so cost grows with the number of intervals plus the number of
+    days asked about, not their product.
+    """
+
+    def __init__(self, start, end, employee, department, employee_ids, departments):
+        self.start = start
+        self.end = end
+        self.employee = employee
+        self.department = department
+        self.employee_ids = employee_ids
+        self.departments = departments
+
+    @classmethod
+    def from_items(cls, items, departments_by_employee=None):
+        departments_by_employee = departments_by_employee or {}
+        items = [i for i in items if i.get('start_date') and i.get('end_date')]
+        start = np.array([i['start_date'] for i in items], dtype='datetime64[D]')
+        end = np.array([i['end_date'] for i in items], dtype='datetime64[D]')
+        employee_ids, employee = np.unique(
+            np.array([i.get('employee_id', '') for i in items], dtype=object).astype(str),
+            return_inverse=True
+        )
+        departments, department = np.unique(
+            np.array([
+                departments_by_employee.get(i.get('employee_id'), 'Unassigned')
+                for i in items
+            ], dtype=object).astype(str),
+            return_inverse=True
+        )
+        return cls(start, end, employee, department, employee_ids, departments)
+
+    def __len__(self):
+        return len(self.start)
+
+    def _select(self, department=None):
+        if department is None:
+            return np.ones(len(self), dtype=bool)
+        matches = np.flatnonzero(self.departments == department)
+        if not len(matches):
+            return np.zeros(len(self), dtype=bool)
+        return self.department == matches[0]
+
+    def absent_per_day(self, first_day, last_day, department=None):
+        """Headcount absent on each day of ``first_day``..``last_day``.
+
+        Each interval adds +1 at its (clipped) start and -1 after its end in a
+        difference array; a cumulative sum turns that into daily counts. An
+        employee with two overlapping leaves is counted twice; ``overlapping()``
+        finds those.
+        """
+        first = np.datetime64(first_day, 'D')
+        last = np.datetime64(last_day, 'D')
+        days = int((last - first).astype(int)) + 1
+        if days <= 0:
+            return np.zeros(0, dtype=np.int64)
+
+        mask = self._select(department) & (self.end >= first) & (self.start <= last)
+        lo = (np.maximum(self.start[mask], first) - first).astype(np.int64)
+        hi = (np.minimum(self.end[mask], last) - first).astype(np.int64) + 1
+
+        diff = np.zeros(days + 1, dtype=np.int64)
+        np.add.at(diff, lo, 1)
+        np.add.at(diff, hi, -1)
+        return np.cumsum(diff[:-1])
+
+    def working_day_durations(self, weekend=(5, 6), holidays=()):
+        """Working days in every interval, via numpy.busday_count."""
+        weekmask = [0 if d in weekend else 1 for d in range(7)]
+        return np.busday_count(
+            self.start,
+            self.end + np.timedelta64(1, 'D'),
+            weekmask=weekmask,
+            holidays=np.array(list(holidays), dtype='datetime64[D]')
+        )
+
+    def overlapping(self):
+        """Boolean mask of intervals that overlap an earlier one of the same employee.
+
+        Intervals are sorted by (employee, start). Adding a per-employee offset
+        to the end dates makes a single running maximum respect group
+        boundaries, so the check stays vectorized.
+        """
+        if not len(self):
+            return np.zeros(0, dtype=bool)
+        order = np.lexsort((self.start, self.employee))
+        emp = self.employee[order].astype(np.int64)
+        start = self.start[order].astype(np.int64)
+        end = self.end[order].astype(np.int64)
+
+        span = int(max(end.max(), start.max()) - min(end.min(), start.min())) + 2
+        base = min(end.min(), start.min())
+        offset = emp * span
+        running_end = np.maximum.accumulate(end - base + offset)
+
+        overlaps = np.zeros(len(order), dtype=bool)
+        same_employee = emp[1:] == emp[:-1]
+        overlaps[1:] = same_employee & (start[1:] - base + offset[1:] <= running_end[:-1])
+
+        result = np.zeros(len(order), dtype=bool)
+        result[order] = overlaps
+        return result
+
+    def staffing_conflicts(self, first_day, last_day, department, max_absent):
+        """Days on which more than ``max_absent`` people of a department are off."""
+        absent = self.absent_per_day(first_day, last_day, department)
+        days = np.flatnonzero(absent > max_absent)
+        first = np.datetime64(first_day, 'D')
+        return [(str(first + int(d)), int(absent[d])) for d in days]
+
+    def who_is_off(self, first_day, last_day, department=None):
+        """Per-employee leave intervals clipped to the window, for a calendar grid."""
+        first = np.datetime64(first_day, 'D')
+        last = np.datetime64(last_day, 'D')
+        mask = self._select(department) & (self.end >= first) & (self.start <= last)
+        result = {}
+        for emp, s, e in zip(self.employee[mask],
+                             np.maximum(self.start[mask], first),
+                             np.minimum(self.end[mask], last)):
+            result.setdefault(str(self.employee_ids[emp]), []).append([str(s), str(e)])
+        return result
+
+
+def team_calendar(intervals, first_day, last_day, department=None, max_absent=None):
+    """Assemble the team-calendar payload for a date window."""
+    absent = intervals.absent_per_day(first_day, last_day, department)
+    first = np.datetime64(first_day, 'D')
+    days = [first + i for i in range(len(absent))]
+    payload = {
+        'days': [str(d) for d in days],
+        'weekdays': [WEEKDAY_NAMES[date.fromisoformat(str(d)).weekday()] for d in days],
+        'absent': absent.tolist(),
+        'employees': intervals.who_is_off(first_day, last_day, department),
+    }
+    if department is not None and max_absent is not None:
+        payload['conflicts'] = intervals.staffing_conflicts(first_day, last_day, department, max_absent)
+    return payload
@@ -0,0 +1,251 @@
+import os
+import threading
+import time
+from bisect import bisect_right, insort
+from datetime import date
+
+from boto3.dynamodb.conditions import Attr, Key
+
+from common.tenancy import DEFAULT_TENANT, DEPARTMENT_INDEX, scoped, tenant_of
+
+ACTIVE_STATUSES = ('PENDING', 'PENDING_ADMIN', 'APPROVED')
+INDEX_TTL = int(os.getenv('LEAVE_INDEX_CACHE_SECONDS', '300'))
+# Day window covered by the department trees; leave outside it is ignored
+WINDOW_START = date(2020, 1, 1).toordinal()
+WINDOW_DAYS = 1 << 14
+
+
+def _ordinal(value):
+    return date.fromisoformat(value).toordinal() if isinstance(value, str) else value.toordinal()
+
+
+class EmployeeIntervals:
+    """One employee's active leave, sorted by start with a running max of ends.
+
+    ``overlaps`` answers "does anything intersect this range" with one bisect
+    over the starts and one lookup in the prefix maximum of the ends.
+    """
+
+    def __init__(self):
+        self._intervals = []
+        self._starts = []
+        self._max_end = []
+
+    def _rebuild(self):
+        self._starts = [i[0] for i in self._intervals]
+        running = float('-inf')
+        self._max_end = []
+        for _, end, _ in self._intervals:
+            running = max(running, end)
+            self._max_end.append(running)
+
+    def add(self, start, end, request_id):
+        insort(self._intervals, (start, end, request_id))
+        self._rebuild()
+
+    def remove(self, request_id):
+        before = len(self._intervals)
+        self._intervals = [i for i in self._intervals if i[2] != request_id]
+        if len(self._intervals) != before:
+            self._rebuild()
+
+    def overlaps(self, start, end):
+        i = bisect_right(self._starts, end)
+        return i > 0 and self._max_end[i - 1] >= start
+
+    def conflicting(self, start, end):
+        i = bisect_right(self._starts, end)
+        return [r for s, e, r in self._intervals[:i] if e >= start]
+
+
+class DepartmentAbsence:
+    """Segment tree with lazy range add and range max over day ordinals.
+
+    Adding an approved leave adds one to every day it covers; ``peak``
+    returns the largest headcount off on any day of a range. Both are
+    O(log days).
+    """
+
+    def __init__(self, size=WINDOW_DAYS):
+        self.size = size
+        self._max = [0] * (2 * size)
+        self._lazy = [0] * (2 * size)
+        self._members = {}
+
+    def _update(self, node, lo, hi, left, right, delta):
+        if right < lo or hi < left:
+            return
+        if left <= lo and hi <= right:
+            self._max[node] += delta
+            self._lazy[node] += delta
+            return
+        mid = (lo + hi) // 2
+        self._update(2 * node, lo, mid, left, right, delta)
+        self._update(2 * node + 1, mid + 1, hi, left, right, delta)
+        self._max[node] = max(self._max[2 * node], self._max[2 * node + 1]) + self._lazy[node]
+
+    def _query(self, node, lo, hi, left, right):
+        if right < lo or hi < left:
+            return float('-inf')
+        if left <= lo and hi <= right:
+            return self._max[node]
+        mid = (lo + hi) // 2
+        return self._lazy[node] + max(
+            self._query(2 * node, lo, mid, left, right),
+            self._query(2 * node + 1, mid + 1, hi, left, right)
+        )
+
+    def _clip(self, start, end):
+        return max(start - WINDOW_START, 0), min(end - WINDOW_START, self.size - 1)
+
+    def add(self, start, end, request_id):
+        if request_id in self._members:
+            return
+        left, right = self._clip(start, end)
+        if left <= right:
+            self._update(1, 0, self.size - 1, left, right, 1)
+        self._members[request_id] = (start, end)
+
+    def remove(self, request_id):
+        interval = self._members.pop(request_id, None)
+        if interval:
+            left, right = self._clip(*interval)
+            if left <= right:
+                self._update(1, 0, self.size - 1, left, right, -1)
+
+    def peak(self, start, end):
+        left, right = self._clip(start, end)
+        if left > right:
+            return 0
+        return max(0, self._query(1, 0, self.size - 1, left, right))
+
+
+class LeaveIndex:
+    """Per-employee and per-department interval indexes over LeaveRequests.
+
+    A key is loaded on first use with a Query (EmployeeLeaveIndex for an
+    employee, TenantDepartmentLeaveIndex for a tenant's department, since
+    department names repeat across companies), then kept in sync by
+    the app's own writes through ``record``. Entries are reloaded after
+    LEAVE_INDEX_CACHE_SECONDS to pick up writes from other workers.
+
+    Queries run outside the lock. One thread loads a key while others wait
+    for it, or keep reading the expired entry; writes recorded during the
+    load are replayed onto the result before it is swapped in. With
+    ``ttl=0`` nothing is cached and every check queries DynamoDB, which is
+    what callers without the change feed need: they never see other
+    workers' writes.
+    """
+
+    def __init__(self, table, ttl=INDEX_TTL):
+        self.table = table
+        self.ttl = ttl
+        self._employees = {}
+        self._departments = {}
+        self._loading = {}
+        self._lock = threading.Lock()
+
+    def _query(self, **kwargs):
+        response = self.table.query(**kwargs)
+        items = response.get('Items', [])
+        while 'LastEvaluatedKey' in response:
+            response = self.table.query(ExclusiveStartKey=response['LastEvaluatedKey'], **kwargs)
+            items.extend(response.get('Items', []))
+        return items
+
+    def _cached(self, cache, key, load, apply):
+        """The entry for ``key``, loaded outside the lock by one thread at a time."""
+        if self.ttl <= 0:
+            return load(key)
+        while True:
+            with self._lock:
+                entry = cache.get(key)
+                if entry and time.monotonic() - entry[0] < self.ttl:
+                    return entry[1]
+                loading = self._loading.get((id(cache), key))
+                if loading is None:
+                    loading = self._loading[(id(cache), key)] = (threading.Event(), [])
+                    break
+                if entry:
+                    return entry[1]
+            loading[0].wait()
+        try:
+            value = load(key)
+            with self._lock:
+                for leave_request in loading[1]:
+                    apply(value, leave_request)
+                cache[key] = (time.monotonic(), value)
+            return value
+        finally:
+            with self._lock:
+                del self._loading[(id(cache), key)]
+            loading[0].set()
+
+    def _load_employee(self, employee_id):
+        intervals = EmployeeIntervals()
+        for item in self._query(
+            IndexName='EmployeeLeaveIndex',
+            KeyConditionExpression=Key('employee_id').eq(employee_id),
+            FilterExpression=Attr('status').is_in(list(ACTIVE_STATUSES)),
+            ProjectionExpression='request_id, start_date, end_date'
+        ):
+            intervals.add(_ordinal(item['start_date']), _ordinal(item['end_date']), item['request_id'])
+        return intervals
+
+    def _load_department(self, department):
+        # ``department`` is tenant-qualified, see tenancy.scoped
+        absence = DepartmentAbsence()
+        for item in self._query(
+            IndexName=DEPARTMENT_INDEX,
+            KeyConditionExpression=Key('tenant_department').eq(department)
+            & Key('start_date').gte(date.fromordinal(WINDOW_START).isoformat()),
+            FilterExpression=Attr('status').eq('APPROVED'),
+            ProjectionExpression='request_id, start_date, end_date'
+        ):
+            absence.add(_ordinal(item['start_date']), _ordinal(item['end_date']), item['request_id'])
+        return absence
+
+    @staticmethod
+    def _apply_employee(intervals, leave_request):
+        request_id = leave_request['request_id']
+        intervals.remove(request_id)
+        if leave_request.get('status') in ACTIVE_STATUSES:
+            intervals.add(_ordinal(leave_request['start_date']), _ordinal(leave_request['end_date']), request_id)
+
+    @staticmethod
+    def _apply_department(absence, leave_request):
+        request_id = leave_request['request_id']
+        if leave_request.get('status') == 'APPROVED':
+            absence.add(_ordinal(leave_request['start_date']), _ordinal(leave_request['end_date']), request_id)
+        else:
+            absence.remove(request_id)
+
+    def employee_conflicts(self, employee_id, start_date, end_date):
+        """Request ids of the employee's pending or approved leave overlapping the range."""
+        start, end = _ordinal(start_date), _ordinal(end_date)
+        intervals = self._cached(self._employees, employee_id, self._load_employee, self._apply_employee)
+        with self._lock:
+            if not intervals.overlaps(start, end):
+                return []
+            return intervals.conflicting(start, end)
+
+    def department_peak(self, department, start_date, end_date, tenant_id=DEFAULT_TENANT):
+        """Most people of a department on approved leave on any day of the range."""
+        absence = self._cached(self._departments, scoped(tenant_id, department),
+                               self._load_department, self._apply_department)
+        with self._lock:
+            return absence.peak(_ordinal(start_date), _ordinal(end_date))
+
+    def record(self, leave_request):
+        """Apply a LeaveRequests write to the loaded indexes and to those being loaded."""
+        keys = ((self._employees, leave_request.get('employee_id'), self._apply_employee),
+                (self._departments, scoped(tenant_of(leave_request), leave_request.get('department')),
+                 self._apply_department))
+        with self._lock:
+            for cache, key, apply in keys:
+                entry = cache.get(key)
+                if entry:
+                    apply(entry[1], leave_request)
+                loading = self._loading.get((id(cache), key))
+                if loading:
+                    loading[1].append(leave_request)
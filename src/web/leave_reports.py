@@ -0,0 +1,229 @@
+import argparse
+import json
+import os
+import sys
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+import boto3
+from boto3.dynamodb.conditions import Key
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.tenancy import DEFAULT_TENANT, iter_tenant_pages, scoped, tenant_of
+from holiday_calendar import get_calendar
+
+REPORT_TABLE = os.getenv('LEAVE_REPORT_TABLE', 'LeaveReports')
+PENDING_STATUSES = ('PENDING', 'PENDING_ADMIN')
+DECIDED_STATUSES = ('APPROVED', 'REJECTED')
+COUNTERS = ('pending', 'approved', 'rejected', 'days_taken', 'decisions', 'decision_seconds')
+
+
+def _month_days(start_date, end_date):
+    """Working days of an inclusive range, split by calendar month."""
+    start = date.fromisoformat(str(start_date))
+    end = date.fromisoformat(str(end_date))
+    calendar = get_calendar()
+    days = {}
+    while start <= end:
+        month_end = (start.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+        segment_end = min(month_end, end)
+        count = calendar.working_days(start, segment_end)
+        if count:
+            days[start.strftime('%Y-%m')] = count
+        start = segment_end + timedelta(days=1)
+    return days
+
+
+def _contribution(item):
+    """What one leave request adds to the rollups in its current status."""
+    status = item.get('status')
+    department = item.get('department') or 'Unassigned'
+    month = str(item['start_date'])[:7]
+    deltas = defaultdict(lambda: defaultdict(int))
+    if status in PENDING_STATUSES:
+        deltas[(month, department)]['pending'] += 1
+    elif status == 'APPROVED':
+        deltas[(month, department)]['approved'] += 1
+        for day_month, count in _month_days(item['start_date'], item['end_date']).items():
+            deltas[(day_month, department)]['days_taken'] += count
+    elif status == 'REJECTED':
+        deltas[(month, department)]['rejected'] += 1
+    return deltas
+
+
+def _decision_seconds(old_item, new_item):
+    try:
+        created = datetime.fromisoformat(str(old_item['created_at']))
+        decided = datetime.fromisoformat(str(new_item['updated_at']))
+    except (KeyError, ValueError):
+        return None
+    return max(int((decided - created).total_seconds()), 0)
+
+
+class LeaveReports:
+    """Per department, per month leave counters kept as small aggregate items.
+
+    Items live in LeaveReports keyed by ``period`` (the year, prefixed with
+    the tenant outside the default tenant) and ``bucket``
+    (``YYYY-MM#department``). Every status change of a leave request applies
+    the difference between its old and new contribution with atomic ADD
+    updates, so a year's report is a single Query over at most
+    12 x departments items instead of a scan of the request history.
+    """
+
+    def __init__(self, table):
+        self.table = table
+
+    def _add(self, tenant_id, month, department, counters):
+        counters = {k: v for k, v in counters.items() if v}
+        if not counters:
+            return
+        names = {f'#c{i}': name for i, name in enumerate(counters)}
+        values = {f':v{i}': value for i, value in enumerate(counters.values())}
+        values.update({':department': department, ':month': month})
+        self.table.update_item(
+            Key={'period': scoped(tenant_id, month[:4]), 'bucket': f'{month}#{department}'},
+            UpdateExpression='SET #d = :department, #m = :month ADD ' + ', '.join(
+                f'#c{i} :v{i}' for i in range(len(counters))
+            ),
+            ExpressionAttributeNames=dict(names, **{'#d': 'department', '#m': 'month'}),
+            ExpressionAttributeValues=values
+        )
+
+    def record_transition(self, old_item, new_item):
+        """Apply a leave request write; ``old_item`` is None for a new request."""
+        if old_item and new_item and old_item.get('status') == new_item.get('status'):
+            return
+        totals = defaultdict(lambda: defaultdict(int))
+        for item, sign in ((old_item, -1), (new_item, 1)):
+            if item:
+                for key, counters in _contribution(item).items():
+                    for name, value in counters.items():
+                        totals[key][name] += sign * value
+
+        if old_item and old_item.get('status') in PENDING_STATUSES and new_item.get('status') in DECIDED_STATUSES:
+            seconds = _decision_seconds(old_item, new_item)
+            if seconds is not None:
+                key = (str(new_item['start_date'])[:7], new_item.get('department') or 'Unassigned')
+                totals[key]['decisions'] += 1
+                totals[key]['decision_seconds'] += seconds
+
+        tenant_id = tenant_of(new_item or old_item)
+        for (month, department), counters in totals.items():
+            self._add(tenant_id, month, department, counters)
+
+    def record_committed(self, old_item, new_item):
+        """``record_transition`` for a leave write that is already committed.
+
+        A failure is logged rather than raised, so the caller still reports
+        the saved change; ``leave_reports.py rebuild`` repairs the rollups.
+        """
+        try:
+            self.record_transition(old_item, new_item)
+        except Exception as e:
+            print(f"Error updating leave rollups for {(new_item or old_item).get('request_id')}: {e}")
+
+    def report(self, year, department=None, tenant_id=DEFAULT_TENANT):
+        """Monthly rows and per-department totals for one tenant's year."""
+        items = []
+        params = {'KeyConditionExpression': Key('period').eq(scoped(tenant_id, year))}
+        while True:
+            response = self.table.query(**params)
+            items.extend(response.get('Items', []))
+            if 'LastEvaluatedKey' not in response:
+                break
+            params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        if department:
+            items = [i for i in items if i.get('department') == department]
+
+        rows = []
+        totals = defaultdict(lambda: defaultdict(int))
+        for item in sorted(items, key=lambda i: i['bucket']):
+            row = {'month': item['month'], 'department': item['department']}
+            for name in COUNTERS:
+                row[name] = int(item.get(name, 0))
+                totals[item['department']][name] += row[name]
+            rows.append(_with_latency(row))
+        return {
+            'year': int(year),
+            'months': rows,
+            'departments': [
+                _with_latency(dict(counters, department=name)) for name, counters in sorted(totals.items())
+            ]
+        }
+
+    def rebuild(self, dynamodb, year=None, tenant_id=DEFAULT_TENANT):
+        """Recompute one tenant's rollups from LeaveRequests (for backfills and repairs).
+
+        Existing rollup items of the affected years are replaced; run it
+        while approvals are quiet, since concurrent updates would be lost.
+        Years already moved to the archive keep the rollups they have.
+        """
+        totals = defaultdict(lambda: defaultdict(int))
+        for page in iter_tenant_pages(dynamodb.Table('LeaveRequests'), tenant_id):
+            for item in page:
+                if year and not str(item['start_date'])[:4] <= str(year) <= str(item['end_date'])[:4]:
+                    continue
+                for key, counters in _contribution(item).items():
+                    for name, value in counters.items():
+                        totals[key][name] += value
+                if item.get('status') in DECIDED_STATUSES and item.get('updated_at'):
+                    seconds = _decision_seconds(item, item)
+                    if seconds is not None:
+                        key = (str(item['start_date'])[:7], item.get('department') or 'Unassigned')
+                        totals[key]['decisions'] += 1
+                        totals[key]['decision_seconds'] += seconds
+
+        years = {str(year)} if year else {month[:4] for month, _ in totals}
+        with self.table.batch_writer() as batch:
+            for period in years:
+                for item in self.table.query(
+                    KeyConditionExpression=Key('period').eq(scoped(tenant_id, period))
+                ).get('Items', []):
+                    batch.delete_item(Key={'period': item['period'], 'bucket': item['bucket']})
+        with self.table.batch_writer(overwrite_by_pkeys=['period', 'bucket']) as batch:
+            for (month, department), counters in totals.items():
+                if month[:4] not in years:
+                    continue
+                item = {'period': scoped(tenant_id, month[:4]), 'bucket': f'{month}#{department}',
+                        'month': month, 'department': department}
+                item.update({name: Decimal(value) for name, value in counters.items() if value})
+                batch.put_item(Item=item)
+        return len(totals)
+
+
+def _with_latency(row):
+    decisions = row.get('decisions', 0)
+    row['avg_decision_hours'] = round(row.get('decision_seconds', 0) / decisions / 3600, 1) if decisions else None
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description='HRMS leave utilization reports')
+    parser.add_argument('command', choices=['show', 'rebuild'])
+    parser.add_argument('--year', type=int, default=date.today().year)
+    parser.add_argument('--department')
+    parser.add_argument('--tenant', default=DEFAULT_TENANT)
+    parser.add_argument('--json', action='store_true', help='Print the raw report as JSON')
+    args = parser.parse_args()
+
+    dynamodb = boto3.resource('dynamodb', region_name=os.getenv('AWS_REGION'))
+    reports = LeaveReports(dynamodb.Table(REPORT_TABLE))
+    if args.command == 'rebuild':
+        print(f'Rebuilt {reports.rebuild(dynamodb, args.year, args.tenant)} rollup items for {args.year}')
+        return
+
+    report = reports.report(args.year, args.department, args.tenant)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"{'month':<8} {'department':<24} {'days':>6} {'appr':>5} {'rej':>5} {'pend':>5} {'avg h':>6}")
+    for row in report['months']:
+        hours = '' if row['avg_decision_hours'] is None else row['avg_decision_hours']
+        print(f"{row['month']:<8} {row['department']:<24} {row['days_taken']:>6} {row['approved']:>5} "
+              f"{row['rejected']:>5} {row['pending']:>5} {hours:>6}")
+
+
+if __name__ == '__main__':
+    main()
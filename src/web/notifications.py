@@ -0,0 +1,424 @@
+import argparse
+import os
+import smtplib
+import sys
+import threading
+import time
+import uuid
+import zlib
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+
+import boto3
+import requests
+from boto3.dynamodb.conditions import Attr, Key
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.employees import EmployeeResolver
+from common.projection import projection_kwargs
+from common.tenancy import query_tenant, tenant_of
+
+OUTBOX_TABLE = os.getenv('NOTIFICATION_OUTBOX_TABLE', 'NotificationOutbox')
+# Outbox partitions; every recipient's notifications land in one of them
+OUTBOX_SHARDS = int(os.getenv('NOTIFICATION_SHARDS', '4'))
+CHANNEL_NAMES = [c.strip() for c in os.getenv('NOTIFY_CHANNELS', 'smtp').split(',') if c.strip()]
+FLUSH_EVENTS = int(os.getenv('NOTIFY_FLUSH_EVENTS', '25'))
+FLUSH_SECONDS = float(os.getenv('NOTIFY_FLUSH_SECONDS', '1'))
+MAX_BUFFERED = int(os.getenv('NOTIFY_MAX_BUFFERED', '10000'))
+MAX_ATTEMPTS = int(os.getenv('NOTIFY_MAX_ATTEMPTS', '6'))
+RETRY_BASE_SECONDS = float(os.getenv('NOTIFY_RETRY_BASE_SECONDS', '30'))
+WORKER_BATCH = int(os.getenv('NOTIFY_WORKER_BATCH', '500'))
+# Group recipients, expanded per tenant by the worker: name -> employee flag
+GROUPS = {'admins': 'is_admin', 'super_admins': 'is_super_admin'}
+
+SUBJECTS = {
+    'leave.approved': 'Your leave from {start_date} to {end_date} was approved',
+    'leave.rejected': 'Your leave from {start_date} to {end_date} was rejected',
+    'leave.submitted': '{employee_name} requested leave from {start_date} to {end_date}'
+}
+
+
+def employee_recipient(employee_id):
+    return f'employee:{employee_id}'
+
+
+def _shard(recipient):
+    return str(zlib.crc32(recipient.encode('utf-8')) % OUTBOX_SHARDS)
+
+
+def _now():
+    return datetime.now().isoformat(timespec='seconds')
+
+
+def outbox_item(kind, tenant_id, recipient, data, channels=None, shard=None):
+    return {
+        'notification_id': uuid.uuid4().hex,
+        'tenant_id': tenant_id,
+        'recipient': recipient,
+        'queue_shard': shard if shard is not None else _shard(recipient),
+        'due_at': _now(),
+        'kind': kind,
+        'data': {k: str(v) for k, v in (data or {}).items() if v is not None},
+        'channels': list(channels or CHANNEL_NAMES),
+        'attempts': 0,
+        'created_at': _now()
+    }
+
+
+def subject(notification):
+    template = SUBJECTS.get(notification['kind'], notification['kind'])
+    try:
+        return template.format(**notification.get('data', {}))
+    except KeyError:
+        return notification['kind']
+
+
+class Notifier:
+    """Producer side: queue notifications without touching the request path.
+
+    ``enqueue`` appends to an in-memory buffer; a background thread moves
+    the buffer into the outbox table with ``batch_writer`` every
+    ``flush_seconds`` or once ``flush_events`` are waiting. An approval
+    therefore costs a list append, and delivery happens in the worker.
+    Notifications still in the buffer when the process dies are lost, so
+    the flush interval bounds what a crash can drop.
+    """
+
+    def __init__(self, table, flush_events=FLUSH_EVENTS, flush_seconds=FLUSH_SECONDS, start=True):
+        self.table = table
+        self.flush_events = flush_events
+        self.flush_seconds = flush_seconds
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        self._counters = {'enqueued': 0, 'stored': 0, 'dropped': 0, 'flush_errors': 0}
+        self._thread = None
+        if start:
+            self._thread = threading.Thread(target=self._run, name='notify-flush', daemon=True)
+            self._thread.start()
+
+    def enqueue(self, kind, tenant_id, recipient, data=None):
+        item = outbox_item(kind, tenant_id, recipient, data)
+        with self._lock:
+            self._buffer.append(item)
+            self._counters['enqueued'] += 1
+            if len(self._buffer) >= self.flush_events:
+                self._wake.notify()
+        return item['notification_id']
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._closed and len(self._buffer) < self.flush_events:
+                    self._wake.wait(self.flush_seconds)
+                closed = self._closed
+            try:
+                self.flush()
+            except Exception:
+                with self._lock:
+                    self._counters['flush_errors'] += 1
+            if closed:
+                return
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                items, self._buffer = self._buffer, []
+            if not items:
+                return
+            try:
+                with self.table.batch_writer() as batch:
+                    for item in items:
+                        batch.put_item(Item=item)
+            except Exception:
+                with self._lock:
+                    self._buffer = items + self._buffer
+                    overflow = len(self._buffer) - MAX_BUFFERED
+                    if overflow > 0:
+                        del self._buffer[MAX_BUFFERED:]
+                        self._counters['dropped'] += overflow
+                raise
+            with self._lock:
+                self._counters['stored'] += len(items)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._wake.notify()
+        if self._thread:
+            self._thread.join(timeout=30)
+        else:
+            self.flush()
+
+    def render(self):
+        with self._lock:
+            counters = dict(self._counters, buffered=len(self._buffer))
+        lines = ['# HELP hrms_notifications Notification producer counters',
+                 '# TYPE hrms_notifications gauge']
+        for name, value in sorted(counters.items()):
+            lines.append(f'hrms_notifications{{state="{name}"}} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+# Delivery channels
+
+class Channel:
+    """One way of reaching a person. ``send`` raises when delivery failed."""
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def send(self, address, notifications):
+        raise NotImplementedError
+
+
+class SmtpChannel(Channel):
+    """Mail through an SMTP relay; by default a local stand-in on port 1025."""
+
+    def __init__(self, host=None, port=None, sender=None):
+        self.host = host or os.getenv('SMTP_HOST', 'localhost')
+        self.port = int(port or os.getenv('SMTP_PORT', '1025'))
+        self.sender = sender or os.getenv('NOTIFY_FROM', 'hrms@localhost')
+        self._smtp = None
+
+    def open(self):
+        if self._smtp is None:
+            self._smtp = smtplib.SMTP(self.host, self.port, timeout=10)
+
+    def close(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except smtplib.SMTPException:
+                pass
+            self._smtp = None
+
+    def send(self, address, notifications):
+        message = EmailMessage()
+        message['From'] = self.sender
+        message['To'] = address['email']
+        if len(notifications) == 1:
+            message['Subject'] = subject(notifications[0])
+        else:
+            message['Subject'] = f'{len(notifications)} HRMS updates'
+        message.set_content('\n'.join(f'- {subject(n)}' for n in notifications) + '\n')
+        try:
+            self.open()
+            self._smtp.send_message(message)
+        except (smtplib.SMTPException, OSError):
+            # Next send reconnects
+            self._smtp = None
+            raise
+
+
+class WebhookChannel(Channel):
+    """POST each recipient's batch as JSON to NOTIFY_WEBHOOK_URL."""
+
+    def __init__(self, url=None, timeout=5):
+        self.url = url or os.getenv('NOTIFY_WEBHOOK_URL')
+        self.timeout = timeout
+        self._session = requests.Session()
+
+    def send(self, address, notifications):
+        if not self.url:
+            raise RuntimeError('NOTIFY_WEBHOOK_URL is not set')
+        response = self._session.post(self.url, timeout=self.timeout, json={
+            'recipient': address,
+            'notifications': [
+                {'id': n['notification_id'], 'kind': n['kind'], 'subject': subject(n),
+                 'data': n.get('data', {}), 'created_at': n['created_at']}
+                for n in notifications
+            ]
+        })
+        response.raise_for_status()
+
+
+CHANNELS = {'smtp': SmtpChannel, 'webhook': WebhookChannel}
+
+
+def register_channel(name, factory):
+    CHANNELS[name] = factory
+
+
+# Worker
+
+class DeliveryWorker:
+    """Consumer side: drain due outbox items, coalesced per recipient.
+
+    Each pass reads up to ``batch`` due items per shard from DueIndex.
+    Items addressed to a group (all admins of a tenant) are fanned out into
+    one item per member first. The rest are grouped by recipient, so someone with five pending
+    updates gets one message per channel, not five. Delivered items are
+    deleted in a batch; failed channels are retried with exponential
+    backoff and after MAX_ATTEMPTS the item is parked as ``dead``, which
+    drops it out of DueIndex. Run at most one worker per shard.
+    """
+
+    def __init__(self, dynamodb, channels=None, shards=None, batch=WORKER_BATCH):
+        self.dynamodb = dynamodb
+        self.table = dynamodb.Table(OUTBOX_TABLE)
+        self.channels = channels if channels is not None else {name: CHANNELS[name]() for name in CHANNEL_NAMES}
+        self.shards = list(shards) if shards is not None else list(range(OUTBOX_SHARDS))
+        self.batch = batch
+        self.resolver = EmployeeResolver(dynamodb)
+        self.stats = {'passes': 0, 'notifications': 0, 'messages': 0, 'failures': 0, 'dead': 0, 'fanned_out': 0}
+
+    def _due(self, shard):
+        response = self.table.query(
+            IndexName='DueIndex',
+            KeyConditionExpression=Key('queue_shard').eq(str(shard)) & Key('due_at').lte(_now()),
+            Limit=self.batch
+        )
+        return response.get('Items', [])
+
+    def _members(self, tenant_id, group, cache):
+        if (tenant_id, group) not in cache:
+            cache[tenant_id, group] = query_tenant(
+                self.dynamodb.Table('Employees'), tenant_id,
+                FilterExpression=Attr(GROUPS[group]).eq(True),
+                **projection_kwargs(['employee_id'])
+            )
+        return cache[tenant_id, group]
+
+    def _fan_out(self, items):
+        """Replace group items by one item per member of the group in that tenant.
+
+        The copies stay in the group item's shard, which this worker owns, so
+        the worker of the members' own shards never picks them up as well.
+        """
+        members = {}
+        expanded = []
+        with self.table.batch_writer() as batch:
+            for item in items:
+                if item['recipient'] not in GROUPS:
+                    expanded.append(item)
+                    continue
+                for member in self._members(item['tenant_id'], item['recipient'], members):
+                    copy = outbox_item(item['kind'], item['tenant_id'], employee_recipient(member['employee_id']),
+                                       item.get('data'), item['channels'], shard=item['queue_shard'])
+                    batch.put_item(Item=copy)
+                    # Stored first, so a crash mid-pass delivers from the copies
+                    expanded.append(copy)
+                    self.stats['fanned_out'] += 1
+                batch.delete_item(Key={'notification_id': item['notification_id']})
+        return expanded
+
+    def _addresses(self, items):
+        ids = {item['recipient'].split(':', 1)[1] for item in items}
+        found = self.resolver.resolve_many(ids, ['email', 'name'])
+        return {
+            (tenant_of(employee), employee_recipient(eid)):
+                {'employee_id': eid, 'email': employee['email'], 'name': employee.get('name')}
+            for eid, employee in found.items() if employee.get('email')
+        }
+
+    def _retry(self, item, remaining, error):
+        attempts = int(item.get('attempts', 0)) + 1
+        if attempts >= MAX_ATTEMPTS:
+            self.stats['dead'] += 1
+            self.table.update_item(
+                Key={'notification_id': item['notification_id']},
+                UpdateExpression='SET #state = :dead, channels = :channels, attempts = :attempts, '
+                                 'last_error = :error REMOVE queue_shard',
+                ExpressionAttributeNames={'#state': 'state'},
+                ExpressionAttributeValues={':dead': 'dead', ':channels': remaining,
+                                           ':attempts': attempts, ':error': error[:500]}
+            )
+            return
+        delay = RETRY_BASE_SECONDS * (2 ** (attempts - 1))
+        self.table.update_item(
+            Key={'notification_id': item['notification_id']},
+            UpdateExpression='SET channels = :channels, attempts = :attempts, due_at = :due, last_error = :error',
+            ExpressionAttributeValues={
+                ':channels': remaining, ':attempts': attempts, ':error': error[:500],
+                ':due': (datetime.now() + timedelta(seconds=delay)).isoformat(timespec='seconds')
+            }
+        )
+
+    def run_once(self):
+        """Deliver everything due now; returns how many notifications were handled."""
+        self.stats['passes'] += 1
+        items = [item for shard in self.shards for item in self._due(shard)]
+        items = self._fan_out(items)
+        if not items:
+            return 0
+        addresses = self._addresses(items)
+        groups = {}
+        for item in items:
+            groups.setdefault((item['tenant_id'], item['recipient']), []).append(item)
+
+        delivered = []
+        for channel in self.channels.values():
+            try:
+                channel.open()
+            except Exception:
+                pass
+        try:
+            for recipient, group in groups.items():
+                address = addresses.get(recipient)
+                if address is None:
+                    # The employee is gone, or not in this tenant; nobody left to tell
+                    delivered.extend(group)
+                    continue
+                failed = {}
+                for name in {c for item in group for c in item['channels']}:
+                    pending = [item for item in group if name in item['channels']]
+                    try:
+                        self.channels[name].send(address, pending)
+                        self.stats['messages'] += 1
+                    except Exception as e:
+                        self.stats['failures'] += 1
+                        failed[name] = f'{name}: {e}'
+                for item in group:
+                    remaining = [c for c in item['channels'] if c in failed]
+                    if remaining:
+                        self._retry(item, remaining, '; '.join(failed[c] for c in remaining))
+                    else:
+                        delivered.append(item)
+        finally:
+            for channel in self.channels.values():
+                channel.close()
+
+        with self.table.batch_writer() as batch:
+            for item in delivered:
+                batch.delete_item(Key={'notification_id': item['notification_id']})
+        self.stats['notifications'] += len(delivered)
+        return len(items)
+
+    def run(self, idle_seconds=2.0, stop=None):
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            try:
+                handled = self.run_once()
+            except Exception as e:
+                print(f'Notification pass failed: {e}')
+                handled = 0
+            if not handled:
+                stop.wait(idle_seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Deliver queued HRMS notifications')
+    parser.add_argument('--shards', help='Comma separated outbox shards this worker owns (default: all)')
+    parser.add_argument('--once', action='store_true', help='Deliver what is due and exit')
+    parser.add_argument('--idle', type=float, default=2.0, help='Seconds to wait when nothing is due')
+    args = parser.parse_args()
+
+    dynamodb = boto3.resource('dynamodb', region_name=os.getenv('AWS_REGION'))
+    shards = [int(s) for s in args.shards.split(',')] if args.shards else None
+    worker = DeliveryWorker(dynamodb, shards=shards)
+    if args.once:
+        began = time.perf_counter()
+        handled = worker.run_once()
+        print(f'{handled} notifications in {time.perf_counter() - began:.2f}s: {worker.stats}')
+        return
+    worker.run(args.idle)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from functools import lru_cache
+
+from jinja2 import nodes
+from jinja2.ext import Extension
+
+FRAGMENT_CACHE_SIZE = int(os.getenv('FRAGMENT_CACHE_SIZE', '20000'))
+
+
+@lru_cache(maxsize=65536)
+def parse_timestamp(value):
+    """Parse an ISO timestamp once; repeated values come from the cache."""
+    if not isinstance(value, str):
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return None
+
+
+@lru_cache(maxsize=65536)
+def format_date(date_string):
+    date_obj = parse_timestamp(date_string)
+    if date_obj is None:
+        return date_string
+    return date_obj.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _plural(count, unit):
+    return f"{count} {unit}{'s' if count != 1 else ''} ago"
+
+
+def time_ago(date_string):
+    """Convert a datetime string to a 'time ago' string (e.g., '2 hours ago')"""
+    date_obj = parse_timestamp(date_string)
+    if date_obj is None:
+        return date_string
+
+    diff = datetime.now() - date_obj
+    seconds = diff.total_seconds()
+    minutes = int(seconds // 60)
+    hours = int(minutes // 60)
+    days = diff.days
+
+    if days > 365:
+        return _plural(days // 365, 'year')
+    if days > 30:
+        return _plural(days // 30, 'month')
+    if days > 0:
+        return _plural(days, 'day')
+    if hours > 0:
+        return _plural(hours, 'hour')
+    if minutes > 0:
+        return _plural(minutes, 'minute')
+    return "just now"
+
+
+def item_version(item):
+    return item.get('updated_at') or item.get('created_at') or ''
+
+
+class DisplayFields:
+    """Memoize derived display values per (item id, item version).
+
+    A leave request's duration only changes when the item is written, so it
+    is computed once per version instead of on every listing.
+    """
+
+    def __init__(self, compute, max_entries=50000):
+        self.compute = compute
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, item_id, item):
+        key = (item_id, item_version(item))
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+                return value
+        value = self.compute(item)
+        with self._lock:
+            self._entries[key] = value
+            if len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+
+class FragmentCache:
+    def __init__(self, max_entries=FRAGMENT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class FragmentCacheExtension(Extension):
+    """``{% cache 'name', item.id, item.updated_at %}...{% endcache %}``
+
+    Renders the block once per distinct key and serves later renders from a
+    bounded in-process LRU. The key must include everything the block's
+    output depends on, such as the item version and any per-viewer flags.
+    """
+
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=FragmentCache())
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        parts = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            parts.append(parser.parse_expression())
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        return nodes.CallBlock(
+            self.call_method('_render_cached', [nodes.Tuple(parts, 'load')]),
+            [], [], body
+        ).set_lineno(lineno)
+
+    def _render_cached(self, key, caller):
+        cache = self.environment.fragment_cache
+        value = cache.get(key)
+        if value is None:
+            value = caller()
+            cache.set(key, value)
+        return value
+
+
+def init_rendering(app):
+    """Register the memoized template filters and the fragment cache tag."""
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    app.add_template_filter(format_date, 'format_date')
+    app.add_template_filter(time_ago, 'time_ago')
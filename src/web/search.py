@@ -0,0 +1,216 @@
+import argparse
+import os
+import re
+import sqlite3
+import sys
+import threading
+
+import boto3
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from common.projection import projection_kwargs
+from common.scan import iter_pages
+from common.tenancy import DEFAULT_TENANT, tenant_of
+
+SEARCH_INDEX_PATH = os.getenv('SEARCH_INDEX_PATH', 'search_index.db')
+EMPLOYEE_FIELDS = ['employee_id', 'email', 'name', 'department', 'position', 'tenant_id']
+DOCUMENT_FIELDS = ['document_id', 'employee_id', 'employee_name', 'filename', 'description', 'is_public', 'created_at',
+                   'tenant_id']
+
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+
+class SearchIndex:
+    """Full-text index of employees and documents in an SQLite FTS5 table.
+
+    Rows carry the fields needed to render a result and to filter by tenant
+    and visibility, so a search never goes back to DynamoDB. Prefix indexes for
+    2-4 characters keep typeahead queries on the index rather than a scan of
+    the term list. FTS5 cannot index its UNINDEXED columns, so ``entry_keys``
+    maps each item to its rowid and writes delete by rowid, not by a scan.
+    """
+
+    def __init__(self, path=SEARCH_INDEX_PATH):
+        self.path = path
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        with self._connection() as conn:
+            conn.execute('PRAGMA journal_mode=WAL')
+            columns = [row[1] for row in conn.execute('PRAGMA table_info(entries)')]
+            if columns and 'tenant' not in columns:
+                # Index built before tenancy; dropped so it is rebuilt
+                conn.execute('DROP TABLE entries')
+                conn.execute('DROP TABLE IF EXISTS entry_keys')
+            conn.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS entries USING fts5(
+                    tenant UNINDEXED,
+                    kind UNINDEXED,
+                    item_id UNINDEXED,
+                    owner UNINDEXED,
+                    is_public UNINDEXED,
+                    title,
+                    subtitle,
+                    body,
+                    tokenize = 'unicode61 remove_diacritics 2',
+                    prefix = '2 3 4'
+                )
+            """)
+            created = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'entry_keys'"
+            ).fetchone() is None
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS entry_keys (
+                    kind TEXT NOT NULL,
+                    item_id TEXT NOT NULL,
+                    tenant TEXT NOT NULL,
+                    entry_rowid INTEGER NOT NULL,
+                    PRIMARY KEY (kind, item_id, tenant)
+                ) WITHOUT ROWID
+            """)
+            if created:
+                # Index written before the key table existed
+                conn.execute('INSERT INTO entry_keys SELECT kind, item_id, tenant, rowid FROM entries')
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _delete(self, conn, kind, item_id):
+        rowids = conn.execute(
+            'SELECT entry_rowid FROM entry_keys WHERE kind = ? AND item_id = ?', (kind, item_id)
+        ).fetchall()
+        conn.executemany('DELETE FROM entries WHERE rowid = ?', rowids)
+        conn.execute('DELETE FROM entry_keys WHERE kind = ? AND item_id = ?', (kind, item_id))
+
+    def _upsert(self, tenant, kind, item_id, owner, is_public, title, subtitle, body):
+        with self._write_lock, self._connection() as conn:
+            self._delete(conn, kind, item_id)
+            cursor = conn.execute(
+                'INSERT INTO entries (tenant, kind, item_id, owner, is_public, title, subtitle, body) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (tenant, kind, item_id, owner, int(bool(is_public)), title, subtitle, body)
+            )
+            conn.execute('INSERT INTO entry_keys VALUES (?, ?, ?, ?)', (kind, item_id, tenant, cursor.lastrowid))
+
+    def index_employee(self, employee):
+        self._upsert(
+            tenant_of(employee),
+            'employee',
+            employee['email'],
+            employee.get('employee_id', ''),
+            False,
+            employee.get('name', ''),
+            employee['email'],
+            f"{employee.get('department', '')} {employee.get('position', '')}"
+        )
+
+    def index_document(self, document):
+        self._upsert(
+            tenant_of(document),
+            'document',
+            document['document_id'],
+            document.get('employee_id', ''),
+            document.get('is_public'),
+            document.get('filename', ''),
+            document.get('employee_name', ''),
+            document.get('description', '')
+        )
+
+    def remove(self, kind, item_id):
+        with self._write_lock, self._connection() as conn:
+            self._delete(conn, kind, item_id)
+
+    def is_empty(self):
+        return self._connection().execute('SELECT 1 FROM entries LIMIT 1').fetchone() is None
+
+    def search(self, query, viewer_id, is_admin=False, kinds=None, limit=10, tenant_id=DEFAULT_TENANT):
+        """Prefix search; every query term must match the start of some word.
+
+        Only the viewer's tenant is searched. Employees are only returned to
+        admins. Documents are returned when they are public, owned by the
+        viewer, or the viewer is an admin.
+        """
+        terms = _TOKEN.findall(query or '')
+        if not terms:
+            return []
+        match = ' '.join(f'"{t}"*' for t in terms)
+
+        sql = ['SELECT kind, item_id, title, subtitle, body FROM entries WHERE entries MATCH ? AND tenant = ?']
+        params = [match, tenant_id]
+        kinds = [k for k in (kinds or ['employee', 'document']) if is_admin or k != 'employee']
+        if not kinds:
+            return []
+        sql.append(f"AND kind IN ({', '.join('?' for _ in kinds)})")
+        params.extend(kinds)
+        if not is_admin:
+            sql.append("AND (is_public = 1 OR owner = ?)")
+            params.append(viewer_id)
+        sql.append('ORDER BY bm25(entries, 0, 0, 0, 0, 0, 10.0, 5.0, 1.0) LIMIT ?')
+        params.append(limit)
+
+        rows = self._connection().execute(' '.join(sql), params).fetchall()
+        return [
+            {'type': kind, 'id': item_id, 'title': title, 'subtitle': subtitle, 'detail': body}
+            for kind, item_id, title, subtitle, body in rows
+        ]
+
+    def rebuild(self, dynamodb):
+        """Reindex both tables from DynamoDB, page by page.
+
+        Rows are upserted in place and only entries that existed before the
+        rebuild and were not seen again are dropped, so writes indexed while
+        the rebuild runs are kept.
+        """
+        stale = set(self._connection().execute('SELECT kind, item_id FROM entry_keys').fetchall())
+        for page in iter_pages(dynamodb.Table('Employees'), **projection_kwargs(EMPLOYEE_FIELDS)):
+            for employee in page:
+                self.index_employee(employee)
+                stale.discard(('employee', employee['email']))
+        for page in iter_pages(dynamodb.Table('Documents'), **projection_kwargs(DOCUMENT_FIELDS)):
+            for document in page:
+                self.index_document(document)
+                stale.discard(('document', document['document_id']))
+        for kind, item_id in stale:
+            self.remove(kind, item_id)
+        with self._write_lock, self._connection() as conn:
+            conn.execute("INSERT INTO entries(entries) VALUES ('optimize')")
+
+    def apply_changes(self, events):
+        """Change-feed handler for the Employees and Documents streams."""
+        for event in events:
+            image = event.image or {}
+            if event.table == 'Employees' and image.get('email'):
+                if event.event_name == 'REMOVE':
+                    self.remove('employee', image['email'])
+                else:
+                    self.index_employee(image)
+            elif event.table == 'Documents' and image.get('document_id'):
+                if event.event_name == 'REMOVE':
+                    self.remove('document', image['document_id'])
+                else:
+                    self.index_document(image)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Manage the HRMS search index')
+    parser.add_argument('command', choices=['rebuild', 'query'])
+    parser.add_argument('terms', nargs='*')
+    parser.add_argument('--tenant', default=DEFAULT_TENANT)
+    args = parser.parse_args()
+
+    index = SearchIndex()
+    if args.command == 'rebuild':
+        index.rebuild(boto3.resource('dynamodb', region_name=os.getenv('AWS_REGION')))
+        print(f'Search index rebuilt at {index.path}')
+    else:
+        for result in index.search(' '.join(args.terms), viewer_id=None, is_admin=True, limit=20,
+                                   tenant_id=args.tenant):
+            print(f"{result['type']:<9} {result['title']:<40} {result['subtitle']}")
+
+
+if __name__ == '__main__':
+    main()
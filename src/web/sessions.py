@@ -0,0 +1,296 @@
+import json
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+
+from flask.sessions import SessionInterface, SessionMixin
+from itsdangerous import BadSignature, Signer
+from werkzeug.datastructures import CallbackDict
+
+from common.projection import projection_kwargs
+from common.tenancy import tenant_of
+
+SESSION_LIFETIME = timedelta(hours=int(os.getenv('SESSION_LIFETIME_HOURS', '12')))
+PRINCIPAL_TTL = int(os.getenv('PRINCIPAL_CACHE_SECONDS', '60'))
+PRINCIPAL_FIELDS = ['employee_id', 'email', 'name', 'department', 'position', 'is_admin', 'is_super_admin',
+                    'tenant_id']
+
+# Session keys answered by the cached principal instead of stored data
+PRINCIPAL_KEYS = ('user_id', 'user_name', 'email', 'department', 'position', 'role', 'is_admin', 'tenant_id')
+
+
+def role_for(employee):
+    if employee.get('is_super_admin'):
+        return 'super_admin'
+    if employee.get('is_admin'):
+        return 'admin'
+    return 'employee'
+
+
+class Principal:
+    """The few employee attributes a request needs to authorize itself."""
+
+    __slots__ = ('user_id', 'user_name', 'email', 'department', 'position', 'role', 'tenant_id', 'loaded_at')
+
+    def __init__(self, employee):
+        self.user_id = employee['employee_id']
+        self.user_name = employee['name']
+        self.email = employee['email']
+        self.department = employee.get('department', 'General')
+        self.position = employee.get('position', 'Employee')
+        self.role = role_for(employee)
+        self.tenant_id = tenant_of(employee)
+        self.loaded_at = time.monotonic()
+
+    @property
+    def is_admin(self):
+        return self.role in ('admin', 'super_admin')
+
+
+class PrincipalCache:
+    """Per-process LRU of principals keyed by email.
+
+    Entries are dropped when the employee record is edited or deleted in this
+    process and expire after PRINCIPAL_TTL seconds, which bounds how long other
+    workers keep serving a stale role.
+    """
+
+    def __init__(self, loader, max_entries=10000, ttl=PRINCIPAL_TTL):
+        self.loader = loader
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, email):
+        now = time.monotonic()
+        with self._lock:
+            principal = self._entries.get(email)
+            if principal is not None and now - principal.loaded_at < self.ttl:
+                self._entries.move_to_end(email)
+                return principal
+
+        employee = self.loader(email)
+        principal = Principal(employee) if employee else None
+        with self._lock:
+            if principal is None:
+                self._entries.pop(email, None)
+            else:
+                self.put(principal)
+        return principal
+
+    def put(self, principal):
+        self._entries[principal.email] = principal
+        self._entries.move_to_end(principal.email)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def prime(self, employee):
+        with self._lock:
+            self.put(Principal(employee))
+
+    def invalidate(self, email):
+        with self._lock:
+            self._entries.pop(email, None)
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    """Session whose identity keys are resolved from the principal cache.
+
+    Only the principal's email and small per-session values such as flashed
+    messages are stored. ``session['role']`` and friends are read from the
+    cached principal, so role changes reach live sessions.
+    """
+
+    def __init__(self, initial=None, sid=None, new=False, principals=None):
+        def on_update(self):
+            self.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.new = new
+        self.modified = False
+        self._principals = principals
+        self._principal = None
+        self._principal_loaded = False
+        self.replaced_sid = None
+
+    @property
+    def principal(self):
+        if not self._principal_loaded:
+            email = dict.get(self, 'principal')
+            if email and self._principals is not None:
+                self._principal = self._principals.get(email)
+            self._principal_loaded = True
+        return self._principal
+
+    def _principal_value(self, key):
+        principal = self.principal
+        if principal is None:
+            raise KeyError(key)
+        return getattr(principal, key)
+
+    def __getitem__(self, key):
+        if key in PRINCIPAL_KEYS:
+            return self._principal_value(key)
+        return super().__getitem__(key)
+
+    def __contains__(self, key):
+        if key in PRINCIPAL_KEYS:
+            return self.principal is not None
+        return super().__contains__(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def login(self, employee):
+        # A fresh id on login prevents session fixation
+        if not self.new:
+            self.replaced_sid = self.sid
+        self.sid = secrets.token_urlsafe(32)
+        self.new = True
+        self.clear()
+        self['principal'] = employee['email']
+        self._principals.prime(employee)
+        self._principal_loaded = False
+
+    def clear(self):
+        super().clear()
+        self._principal = None
+        self._principal_loaded = True
+
+
+class MemorySessionStore:
+    """Bounded in-process LRU store; sessions do not survive a restart."""
+
+    def __init__(self, max_entries=100000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, sid):
+        with self._lock:
+            entry = self._entries.get(sid)
+            if entry is None:
+                return None
+            data, expires_at = entry
+            if expires_at < time.time():
+                del self._entries[sid]
+                return None
+            self._entries.move_to_end(sid)
+            return dict(data)
+
+    def save(self, sid, data, expires_at):
+        with self._lock:
+            self._entries[sid] = (dict(data), expires_at)
+            self._entries.move_to_end(sid)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, sid):
+        with self._lock:
+            self._entries.pop(sid, None)
+
+
+class DynamoDBSessionStore:
+    """Sessions table keyed by session_id with an expires_at TTL attribute."""
+
+    def __init__(self, table):
+        self.table = table
+
+    def load(self, sid):
+        response = self.table.get_item(Key={'session_id': sid})
+        item = response.get('Item')
+        # TTL deletion is lazy, so expired items can still be returned
+        if not item or int(item.get('expires_at', 0)) < time.time():
+            return None
+        return json.loads(item['data'])
+
+    def save(self, sid, data, expires_at):
+        self.table.put_item(Item={
+            'session_id': sid,
+            'data': json.dumps(data, separators=(',', ':')),
+            'expires_at': int(expires_at)
+        })
+
+    def delete(self, sid):
+        self.table.delete_item(Key={'session_id': sid})
+
+
+class ServerSessionInterface(SessionInterface):
+    """Keep session data server side; the cookie only carries a signed id."""
+
+    def __init__(self, store, principals):
+        self.store = store
+        self.principals = principals
+
+    def _signer(self, app):
+        return Signer(app.secret_key, salt='hrms-session')
+
+    def open_session(self, app, request):
+        cookie = request.cookies.get(self.get_cookie_name(app))
+        if cookie:
+            try:
+                sid = self._signer(app).unsign(cookie).decode('utf-8')
+            except BadSignature:
+                sid = None
+            if sid:
+                data = self.store.load(sid)
+                if data is not None:
+                    return ServerSession(data, sid=sid, principals=self.principals)
+        return ServerSession(sid=secrets.token_urlsafe(32), new=True, principals=self.principals)
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if session.replaced_sid:
+            self.store.delete(session.replaced_sid)
+
+        if not session:
+            if session.modified:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+
+        # Unchanged sessions are not rewritten, so most requests cost one read
+        if not session.modified and not session.new:
+            return
+
+        expires_at = time.time() + SESSION_LIFETIME.total_seconds()
+        self.store.save(session.sid, dict(session), expires_at)
+        response.set_cookie(
+            name,
+            self._signer(app).sign(session.sid.encode('utf-8')).decode('utf-8'),
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app)
+        )
+
+
+def init_sessions(app, dynamodb):
+    """Install the server-side session interface selected by SESSION_BACKEND."""
+    employees = dynamodb.Table('Employees')
+
+    def load_employee(email):
+        response = employees.get_item(Key={'email': email}, **projection_kwargs(PRINCIPAL_FIELDS))
+        return response.get('Item')
+
+    if os.getenv('SESSION_BACKEND', 'memory') == 'dynamodb':
+        store = DynamoDBSessionStore(dynamodb.Table(os.getenv('SESSION_TABLE', 'Sessions')))
+    else:
+        store = MemorySessionStore()
+
+    principals = PrincipalCache(load_employee)
+    app.permanent_session_lifetime = SESSION_LIFETIME
+    app.session_interface = ServerSessionInterface(store, principals)
+    return principals